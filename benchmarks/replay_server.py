@@ -0,0 +1,238 @@
+"""
+The purpose of this python file is to stand in for the Open-Meteo and Groq APIs so the dashboard's code paths can be
+timed offline.
+
+Open-Meteo requests (GET /v1/forecast) are answered with FlatBuffers responses in the same size-prefixed format
+as the real API. In record mode they are fetched from the real API and saved under recordings/, keyed by their
+query. In replay mode the saved response is served, and a request that was never recorded gets a synthetic
+response with the same variables, time range and number of locations. Groq requests (POST /openai/v1/responses)
+get a canned summary, either whole or as server-sent events when "stream" is set. Both can be given an artificial
+latency so network cost can be simulated.
+
+Run on its own with:
+    python benchmarks/replay_server.py --port 8765 [--record] [--forecast-latency 0.05] [--groq-latency 0.3]
+then point the dashboard at it with OPEN_METEO_URL=http://127.0.0.1:8765/v1/forecast and
+GROQ_URL=http://127.0.0.1:8765/openai/v1/responses
+"""
+
+import argparse, hashlib, json, math, threading, time
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import parse_qsl, urlencode, urlsplit
+
+import flatbuffers
+import numpy as np
+import requests
+
+RECORDINGS = Path(__file__).parent / 'recordings'
+UPSTREAM_FORECAST = "https://api.open-meteo.com/v1/forecast"
+CANNED_SUMMARY = ("Expect a mild, mostly dry day with a light breeze. Temperatures peak in the early afternoon, "
+                  "so a light jacket is enough in the morning and evening. There is a small chance of a shower "
+                  "late in the day, so carrying an umbrella is sensible if you will be out after 6pm.")
+
+# Fields (vtable slots) of the Open-Meteo FlatBuffers schema used by the dashboard
+_RESPONSE_LATITUDE, _RESPONSE_LONGITUDE, _RESPONSE_ELEVATION, _RESPONSE_GENERATION_TIME = 0, 1, 2, 3
+_RESPONSE_UTC_OFFSET, _RESPONSE_TIMEZONE = 6, 7
+_RESPONSE_SECTIONS = {"current": 9, "daily": 10, "hourly": 11}
+_SECTION_TIME, _SECTION_TIME_END, _SECTION_INTERVAL, _SECTION_VARIABLES = 0, 1, 2, 3
+_VARIABLE_VALUE, _VARIABLE_VALUES = 2, 3
+
+def _query_values(query, name):
+    # Values of a query parameter sent either as repeated keys or as one comma separated value
+    return [value for key, values in query if key == name for value in values.split(",") if value]
+
+def _time_range(section, query):
+    # (start, end, interval) in Unix seconds for the requested section, end exclusive
+    if section == "current":
+        now = int(time.time()) // 900 * 900
+        return now, now + 900, 900
+    if section == "hourly":
+        start = datetime.fromisoformat(_query_values(query, "start_hour")[0]).replace(tzinfo=timezone.utc)
+        end = datetime.fromisoformat(_query_values(query, "end_hour")[0]).replace(tzinfo=timezone.utc) + timedelta(hours=1)
+        return int(start.timestamp()), int(end.timestamp()), 3600
+    start = datetime.fromisoformat(_query_values(query, "start_date")[0]).replace(tzinfo=timezone.utc)
+    end = datetime.fromisoformat(_query_values(query, "end_date")[0]).replace(tzinfo=timezone.utc) + timedelta(days=1)
+    return int(start.timestamp()), int(end.timestamp()), 86400
+
+def _synthetic_values(name, times, seed):
+    # Smooth daily cycle with some noise - percentages stay within 0-100 and amounts are never negative
+    rng = np.random.default_rng(seed)
+    cycle = np.sin((times % 86400) / 86400 * 2 * math.pi - math.pi / 2)
+    if any(part in name for part in ("humidity", "cloud", "probability")):
+        values = np.clip(60 + 30 * cycle + rng.normal(0, 8, len(times)), 0, 100)
+    elif "direction" in name:
+        values = (220 + 40 * cycle + rng.normal(0, 20, len(times))) % 360
+    elif any(part in name for part in ("precipitation", "rain", "showers", "snowfall")):
+        values = np.maximum(rng.gamma(0.4, 1.5, len(times)) - 0.4, 0)
+    elif "wind" in name:
+        values = np.abs(9 + 4 * cycle + rng.normal(0, 2, len(times)))
+    else:
+        values = 12 + 6 * cycle + rng.normal(0, 1, len(times))
+    return values.astype(np.float32)
+
+def _build_section(builder, section, variables, start, end, interval, seed):
+    times = np.arange(start, end, interval, dtype=np.int64)
+    variable_offsets = []
+    for pos, name in enumerate(variables):
+        values = _synthetic_values(name, times, seed + pos)
+        values_offset = None if section == "current" else builder.CreateNumpyVector(values)
+        builder.StartObject(4)
+        if values_offset is None:
+            builder.PrependFloat32Slot(_VARIABLE_VALUE, float(values[0]), 0.0)
+        else:
+            builder.PrependUOffsetTRelativeSlot(_VARIABLE_VALUES, values_offset, 0)
+        variable_offsets.append(builder.EndObject())
+
+    builder.StartVector(4, len(variable_offsets), 4)
+    for offset in reversed(variable_offsets):
+        builder.PrependUOffsetTRelative(offset)
+    variables_vector = builder.EndVector()
+
+    builder.StartObject(4)
+    builder.PrependInt64Slot(_SECTION_TIME, start, 0)
+    builder.PrependInt64Slot(_SECTION_TIME_END, end, 0)
+    builder.PrependInt32Slot(_SECTION_INTERVAL, interval, 0)
+    builder.PrependUOffsetTRelativeSlot(_SECTION_VARIABLES, variables_vector, 0)
+    return builder.EndObject()
+
+def synthetic_forecast(query):
+    # FlatBuffers body for a forecast query - one size-prefixed WeatherApiResponse per requested location
+    latitudes = [float(value) for value in _query_values(query, "latitude")]
+    longitudes = [float(value) for value in _query_values(query, "longitude")]
+    section = next(name for name in ("daily", "hourly", "current") if _query_values(query, name))
+    variables = _query_values(query, section)
+    start, end, interval = _time_range(section, query)
+
+    body = bytearray()
+    for lat, lon in zip(latitudes, longitudes):
+        builder = flatbuffers.Builder(1024)
+        seed = int(abs(lat * 1000) + abs(lon * 10))
+        section_offset = _build_section(builder, section, variables, start, end, interval, seed)
+        timezone_offset = builder.CreateString("GMT")
+        builder.StartObject(16)
+        builder.PrependFloat32Slot(_RESPONSE_LATITUDE, lat, 0.0)
+        builder.PrependFloat32Slot(_RESPONSE_LONGITUDE, lon, 0.0)
+        builder.PrependFloat32Slot(_RESPONSE_ELEVATION, 10.0, 0.0)
+        builder.PrependFloat32Slot(_RESPONSE_GENERATION_TIME, 0.5, 0.0)
+        builder.PrependInt32Slot(_RESPONSE_UTC_OFFSET, 0, 0)
+        builder.PrependUOffsetTRelativeSlot(_RESPONSE_TIMEZONE, timezone_offset, 0)
+        builder.PrependUOffsetTRelativeSlot(_RESPONSE_SECTIONS[section], section_offset, 0)
+        builder.FinishSizePrefixed(builder.EndObject())
+        body += builder.Output()
+    return bytes(body)
+
+def recording_path(query):
+    # Recordings are keyed by the query without the format parameter, in a stable order
+    key = urlencode(sorted((key, value) for key, value in query if key != "format"))
+    return RECORDINGS / f"{hashlib.sha256(key.encode('utf-8')).hexdigest()[:32]}.fb"
+
+class ReplayHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status, body, content_type, headers=()):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in headers:
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        if not url.path.endswith("/forecast"):
+            return self._send(404, b'{"error": true, "reason": "Not found"}', "application/json")
+        query = parse_qsl(url.query)
+        time.sleep(self.server.forecast_latency)
+
+        path = recording_path(query)
+        if path.exists():
+            body = path.read_bytes()
+        elif self.server.record:
+            upstream = requests.get(self.server.upstream_forecast, params=query, timeout=30)
+            if not upstream.ok:
+                return self._send(upstream.status_code, upstream.content, "application/json")
+            body = upstream.content
+            path.parent.mkdir(parents=True, exist_ok=True)
+            path.write_bytes(body)
+        else:
+            body = synthetic_forecast(query)
+        self.server.count("forecast")
+        self._send(200, body, "application/octet-stream")
+
+    def do_POST(self):
+        request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        if not urlsplit(self.path).path.endswith("/responses"):
+            return self._send(404, b'{"error": {"message": "Not found"}}', "application/json")
+        time.sleep(self.server.groq_latency)
+        self.server.count("groq")
+        rate_limit_headers = [("x-ratelimit-limit-tokens", "1000000"), ("x-ratelimit-remaining-tokens", "1000000"),
+                              ("x-ratelimit-reset-tokens", "1s")]
+
+        if not request.get("stream"):
+            body = json.dumps({"output": [{"type": "reasoning"},
+                                          {"type": "message", "content": [{"type": "output_text", "text": CANNED_SUMMARY}]}]})
+            return self._send(200, body.encode("utf-8"), "application/json", rate_limit_headers)
+
+        # Streamed responses are sent word by word as server-sent events, with the latency spread over the words
+        words = CANNED_SUMMARY.split(" ")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Connection", "close")
+        for name, value in rate_limit_headers:
+            self.send_header(name, value)
+        self.end_headers()
+        for pos, word in enumerate(words):
+            delta = word if pos == 0 else " " + word
+            event = {"type": "response.output_text.delta", "delta": delta}
+            self.wfile.write(f"data: {json.dumps(event)}\n\n".encode("utf-8"))
+            self.wfile.flush()
+            time.sleep(self.server.groq_latency / len(words))
+        self.wfile.write(b'data: {"type": "response.completed"}\n\ndata: [DONE]\n\n')
+        self.close_connection = True
+
+class ReplayServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, port=0, record=False, forecast_latency=0.0, groq_latency=0.0, upstream_forecast=UPSTREAM_FORECAST):
+        super().__init__(("127.0.0.1", port), ReplayHandler)
+        self.record = record
+        self.forecast_latency = forecast_latency
+        self.groq_latency = groq_latency
+        self.upstream_forecast = upstream_forecast
+        self.requests = {"forecast": 0, "groq": 0}
+        self._lock = threading.Lock()
+
+    def count(self, kind):
+        with self._lock:
+            self.requests[kind] += 1
+
+    @property
+    def base_url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+    def start(self):
+        threading.Thread(target=self.serve_forever, name="replay-server", daemon=True).start()
+        return self
+
+def main():
+    parser = argparse.ArgumentParser(description="Local stand-in for the Open-Meteo and Groq APIs")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--record", action="store_true", help="fetch unrecorded forecasts from the real API and save them")
+    parser.add_argument("--forecast-latency", type=float, default=0.0, help="seconds added to every forecast response")
+    parser.add_argument("--groq-latency", type=float, default=0.0, help="seconds added to every Groq response")
+    args = parser.parse_args()
+
+    server = ReplayServer(args.port, args.record, args.forecast_latency, args.groq_latency)
+    print(f"Open-Meteo: {server.base_url}/v1/forecast\nGroq: {server.base_url}/openai/v1/responses")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,165 @@
+"""
+The purpose of this python file is to time the dashboard's hot paths offline and write the results as JSON.
+
+A replay server (see replay_server.py) is started in-process and the Open-Meteo/Groq URLs are pointed at it before
+the dashboard modules are imported, so no live network is needed. Each benchmark is run a number of times and its
+min/median/mean/max wall time is reported:
+    - cold start: load_cities, load_countries and load_mapping with their Streamlit caches cleared
+    - fetch: request + FlatBuffers to DataFrame for each graph type, and a multi-location batch
+    - figures: every cached figure builder for the hourly and daily data
+    - prompt: the AI prompt's data section and a full (streamed) summary through the Groq client
+
+Run with:
+    python benchmarks/run_benchmarks.py --output results.json [--baseline previous.json --tolerance 0.25]
+With a baseline, any benchmark whose median is slower than the baseline's by more than the tolerance is reported
+and the exit code is 1, so it can gate a deployment.
+"""
+
+import argparse, json, os, platform, statistics, sys, time
+from datetime import date, datetime, timedelta
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from replay_server import ReplayServer
+
+REPEAT = 5
+HOURLY_DAYS = 75
+DAILY_DAYS = 75
+BATCH_LOCATIONS = 20
+
+def measure(function, repeat, setup=None):
+    # Wall times (seconds) of 'repeat' calls, with 'setup' run untimed before each call
+    times = []
+    for _ in range(repeat):
+        if setup:
+            setup()
+        start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start)
+    return times
+
+def summarise(group, name, times):
+    return {
+        "group": group,
+        "name": name,
+        "repeat": len(times),
+        "min": min(times),
+        "median": statistics.median(times),
+        "mean": statistics.fmean(times),
+        "max": max(times)
+    }
+
+def run(repeat, forecast_latency, groq_latency):
+    server = ReplayServer(forecast_latency=forecast_latency, groq_latency=groq_latency).start()
+    os.environ["OPEN_METEO_URL"] = f"{server.base_url}/v1/forecast"
+    os.environ["GROQ_URL"] = f"{server.base_url}/openai/v1/responses"
+
+    # Imported only now so the wrappers pick up the replay server's URLs
+    import dashboard, forecast_data, prompt_builder, summary_cache
+    import weatherAPI_wrapper as wAPI
+    from groqAI_wrapper import AI
+    from rate_limiter import RateLimiter
+
+    results = []
+
+    # Cold start - the Streamlit caches are cleared so every call does the real work
+    for loader in (dashboard.load_cities, dashboard.load_countries, dashboard.load_mapping):
+        results.append(summarise("cold_start", loader.__name__, measure(loader, repeat, setup=loader.clear)))
+
+    mapping = dashboard.load_mapping()
+    today = date.today()
+    hourly_start = datetime.combine(today, datetime.min.time())
+    requests_by_type = {
+        "Current": (dashboard.HOURLY_CURRENT_OPTIONS, None, None),
+        "Hourly": (dashboard.HOURLY_CURRENT_OPTIONS, hourly_start.isoformat(),
+                   (hourly_start + timedelta(days=HOURLY_DAYS) - timedelta(hours=1)).isoformat()),
+        "Daily": (dashboard.DAILY_OPTIONS, today.isoformat(), (today + timedelta(days=DAILY_DAYS - 1)).isoformat())
+    }
+
+    # Fetch to DataFrame - request, FlatBuffers parsing and DataFrame building, without the forecast cache
+    dataframes = {}
+    for graph_type, (data, start, end) in requests_by_type.items():
+        config = forecast_data.build_weather_config(data, graph_type, mapping, start, end)
+        def fetch():
+            response = wAPI.set_config(latitude=51.51, longitude=-0.13, **config)
+            dataframes[graph_type] = forecast_data.convert_weatherAPI_response(response, data, graph_type)
+        results.append(summarise("fetch", graph_type.lower(), measure(fetch, repeat)))
+
+    data, start, end = requests_by_type["Hourly"]
+    config = forecast_data.build_weather_config(data, "Hourly", mapping, start, end)
+    locations = [(50 + pos * 0.5, -5 + pos * 0.5) for pos in range(BATCH_LOCATIONS)]
+    results.append(summarise("fetch", f"hourly_batch_{BATCH_LOCATIONS}",
+                             measure(lambda: wAPI.set_batch_config(locations, **config), repeat)))
+
+    # Figures - the builders are called directly so the figure cache doesn't hide the cost
+    for chart, builder in dashboard.FIGURE_BUILDERS.items():
+        graph_type = chart.split("_")[0].capitalize()
+        if graph_type not in dataframes:
+            continue
+        results.append(summarise("figures", chart, measure(lambda: builder(dataframes[graph_type]), repeat)))
+
+    # Prompt construction and a full summary through the Groq client
+    for graph_type in ("Hourly", "Daily"):
+        results.append(summarise("prompt", f"data_section_{graph_type.lower()}",
+                                 measure(lambda: prompt_builder.build_data_section(dataframes[graph_type]), repeat)))
+
+    AI._API_FILE = {"GROQ_API_KEY": "replay"}
+    # Generous limits so the client-side rate limiter never queues the benchmark's requests
+    AI._LIMITER = RateLimiter({AI._NORMAL_MODEL: (100000, 100000000), AI._FALLBACK_MODEL: (100000, 100000000)})
+    def clear_summaries():
+        AI._SUMMARY_CACHE = summary_cache.SummaryCache()
+    results.append(summarise("prompt", "summary_streamed",
+                             measure(lambda: "".join(AI.stream_API("Going for a walk", "London", "United Kingdom", dataframes["Hourly"])),
+                                     repeat, setup=clear_summaries)))
+    results.append(summarise("prompt", "summary",
+                             measure(lambda: AI.call_API("Going for a walk", "London", "United Kingdom", dataframes["Hourly"]),
+                                     repeat, setup=clear_summaries)))
+
+    server.shutdown()
+    return {
+        "created": datetime.now().isoformat(timespec="seconds"),
+        "environment": {"python": platform.python_version(), "platform": platform.platform()},
+        "config": {"repeat": repeat, "forecast_latency": forecast_latency, "groq_latency": groq_latency,
+                   "hourly_days": HOURLY_DAYS, "daily_days": DAILY_DAYS, "batch_locations": BATCH_LOCATIONS},
+        "replayed_requests": server.requests,
+        "results": results
+    }
+
+def regressions(report, baseline, tolerance):
+    # Benchmarks whose median got slower than the baseline's by more than the tolerance (a fraction)
+    previous = {(result["group"], result["name"]): result["median"] for result in baseline["results"]}
+    slower = []
+    for result in report["results"]:
+        before = previous.get((result["group"], result["name"]))
+        if before and result["median"] > before * (1 + tolerance):
+            slower.append({"group": result["group"], "name": result["name"], "baseline_median": before,
+                           "median": result["median"], "change": result["median"] / before - 1})
+    return slower
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline benchmarks of the dashboard's hot paths")
+    parser.add_argument("--repeat", type=int, default=REPEAT)
+    parser.add_argument("--forecast-latency", type=float, default=0.0, help="seconds the replay server adds to forecasts")
+    parser.add_argument("--groq-latency", type=float, default=0.0, help="seconds the replay server adds to Groq responses")
+    parser.add_argument("--output", type=Path, help="write the JSON report here instead of stdout")
+    parser.add_argument("--baseline", type=Path, help="earlier JSON report to compare medians against")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed slowdown against the baseline (0.25 = 25%%)")
+    args = parser.parse_args()
+
+    report = run(args.repeat, args.forecast_latency, args.groq_latency)
+    if args.baseline:
+        report["regressions"] = regressions(report, json.loads(args.baseline.read_text()), args.tolerance)
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        args.output.write_text(output)
+    else:
+        print(output)
+
+    if report.get("regressions"):
+        for slower in report["regressions"]:
+            print(f"Regression: {slower['group']}/{slower['name']} is {slower['change']:.0%} slower", file=sys.stderr)
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
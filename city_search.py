@@ -0,0 +1,90 @@
+"""
+The purpose of this python file is to search the gazetteer for cities server-side, so that the dashboard only sends a few
+dozen candidates to the browser instead of every city in a country.
+
+Prefix matches come from a sorted array of case-folded names, and when there are not enough of them the
+remaining candidates are filled in with trigram fuzzy matches (so typos such as "Londn" still find London).
+Results are ranked by population.
+"""
+
+import heapq
+from bisect import bisect_left
+from collections import defaultdict
+from threading import Lock
+
+TOP_K = 25
+
+def _normalise(text):
+    return " ".join(text.casefold().split())
+
+def _trigrams(text):
+    # Pad with spaces so that the start and end of a word also count as trigrams
+    padded = f"  {text} "
+    return {padded[pos:pos+3] for pos in range(len(padded) - 2)}
+
+class _CountryIndex:
+    # Search structures for the cities of a single country
+    def __init__(self, cities, country_code):
+        rows = cities.country_index(country_code)
+        self.names = list(rows)
+        self.population = [int(cities.population[row]) for row in rows.values()]
+
+        # Sorted-prefix array of (case-folded name, position in self.names)
+        self.folded = sorted((_normalise(name), pos) for pos, name in enumerate(self.names))
+        self.folded_keys = [folded for folded, _ in self.folded]
+
+        # Trigram -> positions in self.names
+        self.trigrams = defaultdict(list)
+        self.trigram_counts = []
+        for pos, name in enumerate(self.names):
+            grams = _trigrams(_normalise(name))
+            self.trigram_counts.append(len(grams))
+            for gram in grams:
+                self.trigrams[gram].append(pos)
+
+    def prefix(self, query):
+        start = bisect_left(self.folded_keys, query)
+        end = bisect_left(self.folded_keys, query + "\U0010ffff")
+        return [pos for _, pos in self.folded[start:end]]
+
+    def fuzzy(self, query, k, exclude):
+        # Score each candidate by the Dice coefficient of shared trigrams, breaking ties by population
+        query_grams = _trigrams(query)
+        shared = defaultdict(int)
+        for gram in query_grams:
+            for pos in self.trigrams.get(gram, ()):
+                shared[pos] += 1
+        scored = ((2 * count / (len(query_grams) + self.trigram_counts[pos]), self.population[pos], pos)
+                  for pos, count in shared.items() if pos not in exclude)
+        return [pos for _, _, pos in heapq.nlargest(k, scored)]
+
+class CitySearch:
+    # Per-country indexes are built lazily, as most sessions only ever look at a handful of countries
+    def __init__(self, cities):
+        self._cities = cities
+        self._indexes = {}
+        self._lock = Lock()
+
+    def _get_index(self, country_code):
+        index = self._indexes.get(country_code)
+        if index is None:
+            with self._lock:
+                index = self._indexes.get(country_code)
+                if index is None:
+                    index = self._indexes[country_code] = _CountryIndex(self._cities, country_code)
+        return index
+
+    def search(self, query, country_code, k=TOP_K):
+        # Return up to k city names for the query, prefix matches first and then fuzzy matches
+        # An empty query returns the k most populous cities of the country
+        index = self._get_index(country_code)
+        query = _normalise(query or "")
+        population = index.population.__getitem__
+
+        if not query:
+            return [index.names[pos] for pos in heapq.nlargest(k, range(len(index.names)), key=population)]
+
+        matches = heapq.nlargest(k, index.prefix(query), key=population)
+        if len(matches) < k:
+            matches += index.fuzzy(query, k - len(matches), set(matches))
+        return [index.names[pos] for pos in matches]
@@ -0,0 +1,51 @@
+"""
+The purpose of this python file is to merge the forecasts of several cities into one table for the comparison view.
+
+The per-city DataFrames are stacked into a single long-format frame with one row per city, time and variable
+(City, Date, Variable, Value), so any variable can be charted for every city with one filter and the cities can be
+ranked with one groupby, however many cities are compared. Amounts (precipitation, rain, showers, snowfall) are
+ranked by their total over the period, everything else by its mean.
+"""
+
+import numpy as np
+import pandas as pd
+
+def long_format(labels, dataframes):
+    # One row per (City, Date, Variable) - Date is left out for current data, which has no time axis
+    frames = []
+    for label, dataframe in zip(labels, dataframes):
+        if dataframe is None or dataframe.empty:
+            continue
+        id_vars = ['Date'] if 'Date' in dataframe.columns else []
+        frame = dataframe.melt(id_vars=id_vars, var_name='Variable', value_name='Value')
+        frame.insert(0, 'City', label)
+        frames.append(frame)
+    if not frames:
+        return pd.DataFrame(columns=['City', 'Variable', 'Value'])
+
+    comparison = pd.concat(frames, ignore_index=True)
+    # Categoricals keep the frame small and make the filters/groupbys on them cheap
+    comparison['City'] = pd.Categorical(comparison['City'], categories=list(dict.fromkeys(labels)))
+    comparison['Variable'] = pd.Categorical(comparison['Variable'], categories=list(dict.fromkeys(comparison['Variable'])))
+    comparison['Value'] = comparison['Value'].astype(np.float32)
+    return comparison
+
+def is_amount(variable):
+    # Amounts add up over time (e.g. rain), rather than being a level (e.g. temperature or probability)
+    return variable in ('Precipitation', 'Rain Sum', 'Showers Sum', 'Snowfall Sum')
+
+def variable_rows(comparison, variable):
+    return comparison[comparison['Variable'] == variable]
+
+def rank_cities(comparison, variable):
+    # City x variable table of totals (amounts) or means (everything else), ranked by 'variable' from highest
+    grouped = comparison.groupby(['City', 'Variable'], observed=True)['Value']
+    table = pd.concat([grouped.sum(), grouped.mean()], axis=1, keys=['total', 'mean'])
+    amounts = table.index.get_level_values('Variable').map(is_amount).to_numpy(dtype=bool)
+    table = pd.Series(np.where(amounts, table['total'], table['mean']), index=table.index).unstack('Variable')
+
+    table = table.sort_values(variable, ascending=False, na_position='last')
+    table.columns = [f"{column} ({'total' if is_amount(column) else 'mean'})" for column in table.columns]
+    table.index = pd.Index(table.index.astype(str), name='City')
+    table.insert(0, 'Rank', np.arange(1, len(table) + 1))
+    return table
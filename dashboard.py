@@ -1,18 +1,37 @@
 import streamlit as st
-import weatherAPI_wrapper as wAPI
-import json
+from streamlit.runtime.scriptrunner import get_script_run_ctx
+import fetch_pool
+import forecast_data
+import forecast_client
+import summary_cache
+import downsample
+import comparison
+from metrics import metrics
+import gazetteer
+from city_search import CitySearch
+from spatial_index import SpatialIndex
+from prefetch_scheduler import PrefetchScheduler
+from time_index import TimeIndex
+import json, hashlib, os
 from os import name as os_name
-from datetime import date, datetime
+from datetime import date, datetime, timedelta
 from dateutil.relativedelta import relativedelta
 from pathlib import Path
 from groqAI_wrapper import AI
 import plotly.graph_objects as go
 from plotly.subplots import make_subplots
 import pandas as pd
+import numpy as np
 
 # Constants
 MAIN_PROPORTION = 0.65
 AI_PROPORTION = 0.35
+# Figures kept across reruns and sessions (a few datasets' worth of charts)
+FIGURE_CACHE_ENTRIES = 64
+# Most cities that can be compared at once
+MAX_COMPARE_CITIES = 20
+# The debug panel is shown with ?debug=1 in the URL, or for every session when DASHBOARD_DEBUG is set
+DEBUG = bool(os.environ.get("DASHBOARD_DEBUG"))
 
 HOURLY_CURRENT_OPTIONS = [
     "Temperature", "Relative Humidity", "Apparent Temperature", "Total Cloud Cover", 
@@ -25,9 +44,21 @@ DAILY_OPTIONS = [
     "Mean Precipitation Probability", "Mean Cloud Cover", "Mean Relative Humidity"
 ]
 
-CITIES_FILE = 'cities500.json'
 COUNTRIES_FILE = 'country_codes.json'
-PARAM_FILE = 'param_mapping.json'
+# When set, forecasts and summaries come from a forecast service (forecast_service.py) instead of this process
+SERVICE_URL = os.environ.get("FORECAST_SERVICE_URL")
+
+@st.cache_resource(show_spinner=False)
+def load_prefetch_scheduler(_mapping):
+    # Background thread (one per server process) that re-fetches popular forecasts as soon as they expire
+    def refresh(graph_type, data, start, end, locations):
+        forecast_data.get_weatherAPI_responses(data, locations, graph_type, _mapping, start, end)
+    return PrefetchScheduler(refresh).start()
+
+@st.cache_resource(show_spinner=False)
+def load_service_client():
+    # One client (and connection pool) per server process, shared by every session
+    return forecast_client.ForecastClient(SERVICE_URL)
 
 def configure_page():
     # Configure Streamlit page settings
@@ -37,14 +68,22 @@ def configure_page():
         layout="wide"
     )
 
-@st.cache_data(show_spinner="Caching cities for faster lookups...")
+@st.cache_resource(show_spinner="Mapping cities for faster lookups...")
 def load_cities():
-    # Load cities data from JSON file into dictionary
-    json_file = Path(__file__).parent / 'config' / CITIES_FILE
-    with open(json_file, "r") as f:
-        json_list = json.load(f)
-    # Combines city name and country code for unique identification
-    return {city["name"] + city["country"]: [city["lat"], city["lon"], city["name"]] for city in json_list}
+    # Memory-map the binary gazetteer (built from cities500.json on first run)
+    # cache_resource is used as the mapped file is shared rather than copied between sessions
+    with metrics.span("load_cities"):
+        return gazetteer.load(Path(__file__).parent / 'config')
+
+@st.cache_resource(show_spinner=False)
+def load_city_search(_cities):
+    # Server-side city search index, shared between sessions (underscore stops Streamlit hashing the gazetteer)
+    return CitySearch(_cities)
+
+@st.cache_resource(show_spinner="Indexing city locations...")
+def load_spatial_index(_cities):
+    # Grid index over the gazetteer's lat/lon arrays for nearest city lookups
+    return SpatialIndex(_cities)
 
 @st.cache_data(show_spinner="Linking country codes to countries...")
 def load_countries():
@@ -56,13 +95,15 @@ def load_countries():
 @st.cache_data(show_spinner="Creating mappings...")
 def load_mapping():
     # Load Weather API param mapping file into a dictionary
-    json_file = Path(__file__).parent / 'config' / PARAM_FILE
-    with open(json_file, "r") as f:
-        return json.load(f)
+    return forecast_data.load_mapping()
+
+def search_cities(cities, country_code, query):
+    # Get the best matching cities for the search query, ranked by population
+    return load_city_search(cities).search(query, country_code)
 
 def get_cities_for_country(cities, country_code):
-    # Get list of cities for country selected
-    return sorted([city_info[2] for key, city_info in cities.items() if key.endswith(country_code)])
+    # Get list of cities for country selected from the per-country index
+    return cities.country_cities(country_code)
 
 def create_date_filters(graph_filter):
     # Create date/time input filters based on graph type and return values
@@ -146,18 +187,65 @@ def create_sidebar():
 
 def get_city_data(city, country, cities, countries):
     if not city:
-        return
+        return None, None
         
-    city_key = city + countries[country]
-
-    chosen_city = cities[city_key]
+    chosen_city = cities.city(cities.find(city, countries[country]))
     return chosen_city, country
 
-def create_city_selection(cities, countries):
+def create_coordinate_selection(cities, countries):
+    # Snap the user's coordinates to one of the nearest cities, so nearby users share the same cached forecast
+    lat_col, lon_col = st.columns(2, gap="medium")
+    with lat_col:
+        lat = st.number_input("Latitude", min_value=-90.0, max_value=90.0, value=51.5, format="%.4f")
+    with lon_col:
+        lon = st.number_input("Longitude", min_value=-180.0, max_value=180.0, value=-0.13, format="%.4f")
+
+    country_names = {code: name for name, code in countries.items()}
+    nearest = load_spatial_index(cities).nearest(lat, lon)
+    options = {
+        f"{cities.name(row)}, {country_names.get(cities.country_code(row), cities.country_code(row))} ({distance:.1f} km away)": row
+        for row, distance in nearest
+    }
+    choice = st.selectbox("Nearest Cities", options.keys())
+    if choice is None:
+        return None, None
+
+    row = options[choice]
+    return cities.city(row), country_names.get(cities.country_code(row), cities.country_code(row))
+
+def create_header():
     # Create main dashboard content
     st.title(":orange[World Weather] For Dummies :nerd_face:")
     st.markdown(":grey[This dashboard provides graphs and data for your desired city via the *Open-Meteo* API and summarises the data through a *Groq* AI model]")
     st.divider()
+
+def create_comparison_selection(cities, countries):
+    # Cities are searched one country at a time and added to the selection, so earlier picks stay selected
+    # Returns {label: city} for the chosen cities
+    if "compare_cities" not in st.session_state:
+        st.session_state.compare_cities = {}
+
+    city_col, country_col = st.columns(2, gap="medium")
+    with country_col:
+        country = st.selectbox("Country", countries.keys(), key="compare_country")
+    with city_col:
+        query = st.text_input("Search City", placeholder="Start typing a city name", key="compare_query")
+
+    # Labels of earlier picks are kept in the options so the multiselect doesn't drop them when the search changes
+    chosen = st.session_state.get("compare_selection", [])
+    found = {f"{name}, {country}": name for name in search_cities(cities, countries[country], query)}
+    options = list(dict.fromkeys(chosen + list(found)))
+    selected = st.multiselect("Cities to compare", options, key="compare_selection",
+                              max_selections=MAX_COMPARE_CITIES, placeholder="Choose cities")
+
+    for label in selected:
+        if label not in st.session_state.compare_cities:
+            st.session_state.compare_cities[label] = cities.city(cities.find(found[label], countries[country]))
+    return {label: st.session_state.compare_cities[label] for label in selected}
+
+def create_city_selection(cities, countries):
+    if st.toggle("Use my coordinates"):
+        return create_coordinate_selection(cities, countries)
     
     city_col, country_col = st.columns(2, gap="medium")
     
@@ -165,7 +253,9 @@ def create_city_selection(cities, countries):
         country = st.selectbox("Country", countries.keys())
     
     with city_col:
-        available_cities = get_cities_for_country(cities, countries[country])
+        # Only the top matches for the search are sent to the browser rather than every city in the country
+        query = st.text_input("Search City", placeholder="Start typing a city name")
+        available_cities = search_cities(cities, countries[country], query)
         city = st.selectbox(
             "City",
             available_cities,
@@ -174,13 +264,53 @@ def create_city_selection(cities, countries):
     
     return get_city_data(city, country, cities, countries)
 
-def display_city_graphs(dataframe, graph):
+def dataset_fingerprint(dataframe):
+    # Content hash of a fetched dataset, computed once per fetch and used to key the cached figures
+    return hashlib.sha256(summary_cache.dataframe_fingerprint(dataframe)).hexdigest()
+
+@st.cache_resource(max_entries=FIGURE_CACHE_ENTRIES, show_spinner=False)
+def get_figure(chart, fingerprint, _dataframe, window=None):
+    # Figures are only rebuilt when the dataset, chart or zoom window changes, so reruns from other widgets reuse them
+    # The fingerprint (and window) stand in for the (unhashed) DataFrame in the cache key
+    with metrics.span("figure", chart=chart):
+        return FIGURE_BUILDERS[chart](_dataframe)
+
+def line_trace(dates, values, customdata=None, **kwargs):
+    # Line for a possibly long series - downsampled with LTTB to about the chart's width,
+    # and drawn as lines only with WebGL when there are still too many points for SVG markers
+    keep = downsample.lttb_indices(values.to_numpy())
+    many_points = len(keep) > downsample.WEBGL_THRESHOLD
+    trace = go.Scattergl if many_points else go.Scatter
+    return trace(x=dates.iloc[keep], y=values.iloc[keep],
+                 customdata=customdata.iloc[keep] if customdata is not None else None,
+                 mode='lines' if many_points else 'lines+markers', **kwargs)
+
+def bar_trace(dates, values, **kwargs):
+    # Bars for a possibly long series - only the largest bar of each bucket is kept so peaks are never lost
+    keep = downsample.max_bucket_indices(values.to_numpy())
+    return go.Bar(x=dates.iloc[keep], y=values.iloc[keep], **kwargs)
+
+def zoom_window(dataframe):
+    # Long hourly ranges are drawn downsampled, so a window can be picked to redraw part of it at full resolution
+    # Returns the rows in the window and the window itself (None when the whole range is shown)
+    if len(dataframe) <= downsample.MAX_POINTS:
+        return dataframe, None
+    first, last = dataframe['Date'].iloc[0].to_pydatetime(), dataframe['Date'].iloc[-1].to_pydatetime()
+    window = st.slider('Zoom to', min_value=first, max_value=last, value=(first, last),
+                       step=timedelta(hours=1), format="DD/MM/YYYY HH:mm")
+    if window == (first, last):
+        return dataframe, None
+    start = dataframe['Date'].searchsorted(pd.Timestamp(window[0]), side='left')
+    end = dataframe['Date'].searchsorted(pd.Timestamp(window[1]), side='right')
+    return dataframe.iloc[start:end], window
+
+def display_city_graphs(dataframe, graph, fingerprint, time_index):
     if graph == "Current":
         display_current_graphs(dataframe)
     elif graph == "Hourly":
-        display_hourly_graphs(dataframe)
+        display_hourly_graphs(dataframe, fingerprint, time_index)
     else: # Daily
-        display_daily_graphs(dataframe)
+        display_daily_graphs(dataframe, fingerprint, time_index)
 
 def display_current_graphs(dataframe):
     # Get available columns
@@ -215,137 +345,200 @@ def display_current_graphs(dataframe):
             
             st.metric(col_name, f"{value}{unit}", border=True)
 
-def display_hourly_graphs(dataframe):
+def build_hourly_temperature_figure(dataframe):
+    # Temperature line graph - shows actual vs feels-like temperature over time
+    available_cols = [col for col in dataframe.columns if col != 'Date']
+    fig = go.Figure()
+    # Add actual temperature line in blue
+    if 'Temperature' in available_cols:
+        fig.add_trace(line_trace(dataframe['Date'], dataframe['Temperature'], 
+                                name='Temperature', line=dict(color='blue'),
+                                hovertemplate='<b>Temperature:</b> %{y:.2f}°C<br><b>Date:</b> %{x}<extra></extra>'))
+    # Add apparent temperature line in orange
+    if 'Apparent Temperature' in available_cols:
+        fig.add_trace(line_trace(dataframe['Date'], dataframe['Apparent Temperature'], 
+                                name='Apparent Temperature', line=dict(color='orange'),
+                                hovertemplate='<b>Apparent Temperature:</b> %{y:.2f}°C<br><b>Date:</b> %{x}<extra></extra>'))
+    fig.update_layout(title='Temperature & Apparent Temperature', 
+                    xaxis_title='Datetime', yaxis_title='Temperature (°C)')
+    return fig
+
+def build_hourly_precipitation_figure(dataframe):
+    # Precipitation dual-axis bar chart - shows rainfall amount and probability side by side
+    available_cols = [col for col in dataframe.columns if col != 'Date']
+    fig = make_subplots(specs=[[{"secondary_y": True}]])
+    # Add precipitation amount bars (left y-axis)
+    if 'Precipitation' in available_cols:
+        fig.add_trace(bar_trace(dataframe['Date'], dataframe['Precipitation'], 
+                            name='Precipitation', marker_color='blue',
+                            offsetgroup=1,
+                            hovertemplate='<b>Precipitation:</b> %{y:.2f}mm<br><b>Date:</b> %{x}<extra></extra>'), secondary_y=False)
+    # Add precipitation probability bars (right y-axis)
+    if 'Precipitation Probability' in available_cols:
+        fig.add_trace(bar_trace(dataframe['Date'], dataframe['Precipitation Probability'], 
+                            name='Precipitation Probability', marker_color='orange',
+                            offsetgroup=2,
+                            hovertemplate='<b>Precipitation Probability:</b> %{y:.2f}%<br><b>Date:</b> %{x}<extra></extra>'), secondary_y=True)
+    # Configure y-axes with minimum values at 0
+    fig.update_yaxes(title_text='Amount of Precipitation (mm)', minallowed=0, secondary_y=False)
+    fig.update_yaxes(title_text='Precipitation Probability (%)', minallowed=0, maxallowed=100, secondary_y=True)
+    fig.update_layout(title='Precipitation & Precipitation Probability', xaxis_title='Datetime')
+    return fig
+
+def build_hourly_wind_figure(dataframe):
+    # Wind Speed Line Graph with Wind Direction given at each point
+    available_cols = [col for col in dataframe.columns if col != 'Date']
+    fig = go.Figure()
+    hover_data = ['Wind Direction'] if 'Wind Direction' in available_cols else []
+    fig.add_trace(line_trace(dataframe['Date'], dataframe['Wind Speed'], 
+                           name='Wind Speed',
+                           customdata=dataframe[hover_data] if hover_data else None,
+                           hovertemplate='<b>Wind Speed:</b> %{y:.2f} mph<br><b>Date:</b> %{x}<br>' + 
+                                       ('<b>Wind Direction:</b> %{customdata[0]:.2f}°<extra></extra>' if hover_data else '<extra></extra>')))
+    fig.update_layout(title='Wind Speed & Wind Direction', 
+                    xaxis_title='Datetime', yaxis_title='Wind Speed (mph)')
+    fig.update_yaxes(minallowed=0)
+    return fig
+
+def build_hourly_cloud_cover_figure(dataframe):
+    # Total Cloud Cover Line Graph
+    fig = go.Figure()
+    fig.add_trace(line_trace(dataframe['Date'], dataframe['Total Cloud Cover'], 
+                name='Total Cloud Cover',
+                hovertemplate='<b>Cloud Cover:</b> %{y:.2f}%<br><b>Date:</b> %{x}<extra></extra>'))
+    fig.update_layout(title='Total Cloud Cover', xaxis_title='Datetime', yaxis_title='Total Cloud Cover (%)')
+    fig.update_yaxes(minallowed=0, maxallowed=100)
+    return fig
+
+def display_hourly_graphs(dataframe, fingerprint, time_index):
     # Display hourly weather data as interactive graphs
     available_cols = [col for col in dataframe.columns if col != 'Date']
+    chart_data, window = zoom_window(dataframe)
     
-    # Temperature line graph - shows actual vs feels-like temperature over time
     if 'Temperature' in available_cols or 'Apparent Temperature' in available_cols:
-        fig = go.Figure()
-        # Add actual temperature line in blue
-        if 'Temperature' in available_cols:
-            fig.add_trace(go.Scatter(x=dataframe['Date'], y=dataframe['Temperature'], 
-                                    mode='lines+markers', name='Temperature', line=dict(color='blue'),
-                                    hovertemplate='<b>Temperature:</b> %{y}°C<br><b>Date:</b> %{x}<extra></extra>'))
-        # Add apparent temperature line in orange
-        if 'Apparent Temperature' in available_cols:
-            fig.add_trace(go.Scatter(x=dataframe['Date'], y=dataframe['Apparent Temperature'], 
-                                    mode='lines+markers', name='Apparent Temperature', line=dict(color='orange'),
-                                    hovertemplate='<b>Apparent Temperature:</b> %{y}°C<br><b>Date:</b> %{x}<extra></extra>'))
-        fig.update_layout(title='Temperature & Apparent Temperature', 
-                        xaxis_title='Datetime', yaxis_title='Temperature (°C)')
-        st.plotly_chart(fig)
+        st.plotly_chart(get_figure('hourly_temperature', fingerprint, chart_data, window))
 
-    # Precipitation dual-axis bar chart - shows rainfall amount and probability side by side
     if 'Precipitation' in available_cols or 'Precipitation Probability' in available_cols:
-        fig = make_subplots(specs=[[{"secondary_y": True}]])
-        # Add precipitation amount bars (left y-axis)
-        if 'Precipitation' in available_cols:
-            fig.add_trace(go.Bar(x=dataframe['Date'], y=dataframe['Precipitation'], 
-                                name='Precipitation', marker_color='blue',
-                                offsetgroup=1,
-                                hovertemplate='<b>Precipitation:</b> %{y}mm<br><b>Date:</b> %{x}<extra></extra>'), secondary_y=False)
-        # Add precipitation probability bars (right y-axis)
-        if 'Precipitation Probability' in available_cols:
-            fig.add_trace(go.Bar(x=dataframe['Date'], y=dataframe['Precipitation Probability'], 
-                                name='Precipitation Probability', marker_color='orange',
-                                offsetgroup=2,
-                                hovertemplate='<b>Precipitation Probability:</b> %{y}%<br><b>Date:</b> %{x}<extra></extra>'), secondary_y=True)
-        # Configure y-axes with minimum values at 0
-        fig.update_yaxes(title_text='Amount of Precipitation (mm)', minallowed=0, secondary_y=False)
-        fig.update_yaxes(title_text='Precipitation Probability (%)', minallowed=0, maxallowed=100, secondary_y=True)
-        fig.update_layout(title='Precipitation & Precipitation Probability', xaxis_title='Datetime')
-        st.plotly_chart(fig)
+        st.plotly_chart(get_figure('hourly_precipitation', fingerprint, chart_data, window))
     
     # Display side-by-side as legend doesn't take up unnecessary UI space
     col1, col2 = st.columns(2)
     
     with col1:
-        # Wind Speed Line Graph with Wind Direction given at each point
         if 'Wind Speed' in available_cols:
-            fig = go.Figure()
-            hover_data = ['Wind Direction'] if 'Wind Direction' in available_cols else []
-            fig.add_trace(go.Scatter(x=dataframe['Date'], y=dataframe['Wind Speed'], 
-                                   mode='lines+markers', name='Wind Speed',
-                                   customdata=dataframe[hover_data] if hover_data else None,
-                                   hovertemplate='<b>Wind Speed:</b> %{y} mph<br><b>Date:</b> %{x}<br>' + 
-                                               ('<b>Wind Direction:</b> %{customdata[0]:.2f}°<extra></extra>' if hover_data else '<extra></extra>')))
-            fig.update_layout(title='Wind Speed & Wind Direction', 
-                            xaxis_title='Datetime', yaxis_title='Wind Speed (mph)')
-            fig.update_yaxes(minallowed=0)
-            st.plotly_chart(fig)
+            st.plotly_chart(get_figure('hourly_wind', fingerprint, chart_data, window))
     
     with col2:
         # Relative Humidity metrics with Datetime input
         if 'Relative Humidity' in available_cols:
             st.subheader('Relative Humidity')
-            min_date = dataframe['Date'].min()
-            max_date = dataframe['Date'].max()
             selected_date = st.datetime_input('Select Date/Time', 
-                                            min_value=min_date,
-                                            max_value=max_date,
-                                            value=min_date,
+                                            min_value=time_index.first,
+                                            max_value=time_index.last,
+                                            value=time_index.first,
                                             step=3600,
                                             format="DD/MM/YYYY",
                                             )
             # Convert to Pandas datetime to match DataFrame
             selected_date = pd.to_datetime(selected_date, utc=True)
 
-            humidity_value = dataframe[dataframe['Date'] == selected_date]['Relative Humidity'].iloc[0]
-            st.metric('Relative Humidity', f'{humidity_value}%')
+            row = time_index.row_at(selected_date)
+            if row is not None:
+                humidity_value = dataframe['Relative Humidity'].iloc[row]
+                st.metric('Relative Humidity', f'{humidity_value:.2f}%')
 
-    # Total Cloud Cover Line Graph
     if 'Total Cloud Cover' in available_cols:
-        fig = go.Figure()
-        fig.add_trace(go.Scatter(x=dataframe['Date'], y=dataframe['Total Cloud Cover'], 
-                    mode='lines+markers', name='Total Cloud Cover',
-                    hovertemplate='<b>Cloud Cover:</b> %{y}%<br><b>Date:</b> %{x}<extra></extra>'))
-        fig.update_layout(title='Total Cloud Cover', xaxis_title='Datetime', yaxis_title='Total Cloud Cover (%)')
-        fig.update_yaxes(minallowed=0, maxallowed=100)
-        st.plotly_chart(fig)
-
-
-def display_daily_graphs(dataframe):
+        st.plotly_chart(get_figure('hourly_cloud_cover', fingerprint, chart_data, window))
+
+
+def min_max_segments(dates, min_values, max_values):
+    # x/y arrays that draw a vertical min-max segment per date, with None/NaN gaps between segments
+    # Also returns an empty text array in the same layout for per-segment hover text
+    x = np.empty(len(dates) * 3, dtype=object)
+    x[0::3] = x[1::3] = dates.to_numpy()
+    y = np.full(len(dates) * 3, np.nan)
+    y[0::3] = min_values.to_numpy()
+    y[1::3] = max_values.to_numpy()
+    text = np.full(len(dates) * 3, '', dtype=object)
+    return x, y, text
+
+def build_daily_temperature_figure(dataframe):
+    # Max/Min Temperature Chart
+    available_cols = [col for col in dataframe.columns if col != 'Date']
+    fig = go.Figure()
+    zero_pad_removal = '-' if os_name == 'posix' else '#'
+
+    temp_configs = [
+        ('Max Temperature', 'Min Temperature', 'blue', 'Temperature', -1),
+        ('Max Apparent Temperature', 'Min Apparent Temperature', 'orange', 'Apparent Temperature', 1)
+    ]
+
+    for max_col, min_col, colour, name, offset_hours in temp_configs:
+        # Add markers for the max and min points
+        if max_col in available_cols and min_col not in available_cols:
+            fig.add_trace(go.Scatter(x=dataframe['Date'], y=dataframe[max_col], 
+                                mode='markers', name=max_col, marker=dict(color=colour),
+                                hovertemplate=f'<b>{max_col}:</b> %{{y:.2f}}°C<br><b>Date:</b> %{{x}}<extra></extra>'))
+        
+        elif min_col in available_cols and max_col not in available_cols:
+            fig.add_trace(go.Scatter(x=dataframe['Date'], y=dataframe[min_col], 
+                                mode='markers', name=min_col, marker=dict(color=colour),
+                                hovertemplate=f'<b>{min_col}:</b> %{{y:.2f}}°C<br><b>Date:</b> %{{x}}<extra></extra>'))
+        
+        # Add Max/Min Temperature and Apparent Temperature lines
+        elif max_col in available_cols and min_col in available_cols:
+            # Using offset of time to trick scatter plot into displaying the data side-by-side
+            # All days are drawn as one trace of min-max segments, so the trace count doesn't grow with the date range
+            x, y, text = min_max_segments(dataframe['Date'] + pd.Timedelta(hours=offset_hours), dataframe[min_col], dataframe[max_col])
+            hover_text = (f'<b>{max_col}:</b> ' + dataframe[max_col].map('{:.2f}'.format) +
+                          f'°C<br><b>{min_col}:</b> ' + dataframe[min_col].map('{:.2f}'.format) +
+                          '°C<br><b>Date:</b> ' + dataframe['Date'].dt.strftime(f"%b %{zero_pad_removal}d, %Y"))
+            text[0::3] = text[1::3] = hover_text.to_numpy()
+            fig.add_trace(go.Scatter(x=x, y=y, text=text, mode='lines+markers', name=name,
+                                    line=dict(color=colour), hovertemplate='%{text}<extra></extra>'))
+
+    # xaxis_tickformat doesn't require same os check as date.strftime as it uses d3 formatting
+    # xaxis dtick is set to 86400000ms (1 day) to ensure that time offset is not visible on the graph
+    fig.update_layout(title='Max/Min Temperatures', xaxis_title='Dates', yaxis_title='Temperature (°C)', xaxis_tickformat="%b %-d, %Y", xaxis=dict(dtick=86400000))
+    return fig
+
+def build_daily_cloud_precipitation_figure(dataframe):
+    # Mean Cloud Cover and Precipitation Probability
+    available_cols = [col for col in dataframe.columns if col != 'Date']
+    fig = go.Figure()
+    
+    if 'Mean Precipitation Probability' in available_cols:
+        fig.add_trace(go.Scatter(x=dataframe['Date'], y=dataframe['Mean Precipitation Probability'], 
+                                mode='lines+markers', name='Mean Precipitation Probability', line=dict(color='blue'),
+                                hovertemplate='<b>Precipitation Probability:</b> %{y:.2f}%<br><b>Date:</b> %{x}<extra></extra>'))
+    
+    if 'Mean Cloud Cover' in available_cols:
+        fig.add_trace(go.Scatter(x=dataframe['Date'], y=dataframe['Mean Cloud Cover'], 
+                                mode='lines+markers', name='Mean Cloud Cover', line=dict(color='orange'),
+                                hovertemplate='<b>Cloud Cover:</b> %{y:.2f}%<br><b>Date:</b> %{x}<extra></extra>'))
+    
+    fig.update_layout(title='Mean Cloud Cover and Mean Precipitation Likelihood', 
+                    xaxis_title='Dates', yaxis_title='%')
+    fig.update_yaxes(minallowed=0, maxallowed=100)
+    return fig
+
+def build_daily_humidity_figure(dataframe):
+    # Mean Relative Humidity
+    fig = go.Figure()
+    fig.add_trace(go.Scatter(x=dataframe['Date'], y=dataframe['Mean Relative Humidity'], 
+                            mode='lines+markers', name='Mean Relative Humidity',
+                            hovertemplate='<b>Mean Relative Humidity:</b> %{y:.2f}%<br><b>Date:</b> %{x}<extra></extra>'))
+    fig.update_layout(title='Mean Relative Humidity', 
+                    xaxis_title='Dates', yaxis_title='Mean Relative Humidity (%)')
+    fig.update_yaxes(minallowed=0, maxallowed=100)
+    return fig
+
+def display_daily_graphs(dataframe, fingerprint, time_index):
     available_cols = [col for col in dataframe.columns if col != 'Date']
     
     # Graph 1: Max/Min Temperature Chart
     if any(temp in available_cols for temp in ('Max Temperature', 'Min Temperature', 'Max Apparent Temperature', 'Min Apparent Temperature')):
-        fig = go.Figure()
-        zero_pad_removal = '-' if os_name == 'posix' else '#'
-
-        temp_configs = [
-            ('Max Temperature', 'Min Temperature', 'blue', 'Temperature', -1),
-            ('Max Apparent Temperature', 'Min Apparent Temperature', 'orange', 'Apparent Temperature', 1)
-        ]
-
-        for max_col, min_col, colour, name, offset_hours in temp_configs:
-            # Add markers for the max and min points
-            if max_col in available_cols and min_col not in available_cols:
-                fig.add_trace(go.Scatter(x=dataframe['Date'], y=dataframe[max_col], 
-                                    mode='markers', name=max_col, marker=dict(color=colour),
-                                    hovertemplate=f'<b>{max_col}:</b> %{{y:.2f}}°C<br><b>Date:</b> %{{x}}<extra></extra>'))
-            
-            elif min_col in available_cols and max_col not in available_cols:
-                fig.add_trace(go.Scatter(x=dataframe['Date'], y=dataframe[min_col], 
-                                    mode='markers', name=min_col, marker=dict(color=colour),
-                                    hovertemplate=f'<b>{min_col}:</b> %{{y:.2f}}°C<br><b>Date:</b> %{{x}}<extra></extra>'))
-            
-            # Add Max/Min Temperature and Apparent Temperature lines
-            elif max_col in available_cols and min_col in available_cols:
-                # Using offset of time to trick scatter plot into displaying the data side-by-side
-                offset = pd.Timedelta(hours=offset_hours)
-                for i, date in enumerate(dataframe['Date']):
-                    max_temp = dataframe[max_col].iloc[i]
-                    min_temp = dataframe[min_col].iloc[i]
-                    fig.add_trace(go.Scatter(x=[date+offset, date+offset], y=[min_temp, max_temp], 
-                                        mode='lines+markers', name=name if i == 0 else None,
-                                        line=dict(color=colour), showlegend=(i == 0),
-                                        hovertemplate=f'<b>{max_col}:</b> {max_temp:.2f}°C<br><b>{min_col}:</b> {min_temp:.2f}°C<br><b>Date:</b> {date.strftime(f"%b %{zero_pad_removal}d, %Y")}<extra></extra>')) 
-
-        # xaxis_tickformat doesn't require same os check as date.strftime as it uses d3 formatting
-        # xaxis dtick is set to 86400000ms (1 day) to ensure that time offset is not visible on the graph
-        fig.update_layout(title='Max/Min Temperatures', xaxis_title='Dates', yaxis_title='Temperature (°C)', xaxis_tickformat="%b %-d, %Y", xaxis=dict(dtick=86400000))
-        st.plotly_chart(fig)
+        st.plotly_chart(get_figure('daily_temperature', fingerprint, dataframe))
     
     # Display side-by-side as legend doesn't take up unnecessary UI space
     col1, col2 = st.columns(2)
@@ -356,24 +549,22 @@ def display_daily_graphs(dataframe):
             st.subheader('Sum of Precipitation')
             
             # Date selector
-            min_date = dataframe['Date'].dt.date.min()
-            max_date = dataframe['Date'].dt.date.max()
             selected_date = st.date_input('Select Date for Precipitation', 
-                                        min_value=min_date, max_value=max_date, value=min_date, format="DD/MM/YYYY")
+                                        min_value=time_index.first_day, max_value=time_index.last_day, value=time_index.first_day, format="DD/MM/YYYY")
             
-            # Filter data for selected date
-            selected_row = dataframe[dataframe['Date'].dt.date == selected_date]
-            if not selected_row.empty:
-                rain = selected_row['Rain Sum'].iloc[0] if 'Rain Sum' in available_cols else 0
-                showers = selected_row['Showers Sum'].iloc[0] if 'Showers Sum' in available_cols else 0
-                snowfall = selected_row['Snowfall Sum'].iloc[0] if 'Snowfall Sum' in available_cols else 0
+            # Look up the row for the selected date
+            row = time_index.row_on(selected_date)
+            if row is not None:
+                rain = dataframe['Rain Sum'].iloc[row] if 'Rain Sum' in available_cols else 0
+                showers = dataframe['Showers Sum'].iloc[row] if 'Showers Sum' in available_cols else 0
+                snowfall = dataframe['Snowfall Sum'].iloc[row] if 'Snowfall Sum' in available_cols else 0
                 
                 # Create pie chart
                 values = [rain, showers, snowfall]
                 labels = ['Total Rainfall (mm)', 'Total Showers (mm)', 'Total Snowfall (cm)']
                 fig = go.Figure(data=[go.Pie(labels=labels, values=values, hole=0.3,
                                              hovertemplate='<b>%{label}</b><br>%{value:.2f}<br>%{percent}<extra></extra>')])
-                fig.update_layout(title=f'Precipitation for {selected_date.strftime('%d/%m/%Y')}')
+                fig.update_layout(title=f'Precipitation for {selected_date.strftime("%d/%m/%Y")}')
                 st.plotly_chart(fig)
                 
                 # Total precipitation caption
@@ -387,12 +578,12 @@ def display_daily_graphs(dataframe):
             
             # Date selector for wind data
             selected_wind_date = st.date_input('Select Date for Wind Data', 
-                                             min_value=min_date, max_value=max_date, value=min_date, format="DD/MM/YYYY")
+                                             min_value=time_index.first_day, max_value=time_index.last_day, value=time_index.first_day, format="DD/MM/YYYY")
             
-            selected_wind_row = dataframe[dataframe['Date'].dt.date == selected_wind_date]
-            if not selected_wind_row.empty:
-                wind_speed = selected_wind_row['Mean Wind Speed'].iloc[0] if 'Mean Wind Speed' in available_cols else None
-                wind_direction = selected_wind_row['Dominant Wind Direction'].iloc[0] if 'Dominant Wind Direction' in available_cols else None
+            row = time_index.row_on(selected_wind_date)
+            if row is not None:
+                wind_speed = dataframe['Mean Wind Speed'].iloc[row] if 'Mean Wind Speed' in available_cols else None
+                wind_direction = dataframe['Dominant Wind Direction'].iloc[row] if 'Dominant Wind Direction' in available_cols else None
                 
                 col_a, col_b = st.columns(2)
                 if wind_speed and wind_direction:
@@ -409,45 +600,95 @@ def display_daily_graphs(dataframe):
     
     # Graph 4: Mean Cloud Cover and Precipitation Probability
     if 'Mean Precipitation Probability' in available_cols or 'Mean Cloud Cover' in available_cols:
-        fig = go.Figure()
-        
-        if 'Mean Precipitation Probability' in available_cols:
-            fig.add_trace(go.Scatter(x=dataframe['Date'], y=dataframe['Mean Precipitation Probability'], 
-                                    mode='lines+markers', name='Mean Precipitation Probability', line=dict(color='blue'),
-                                    hovertemplate='<b>Precipitation Probability:</b> %{y}%<br><b>Date:</b> %{x}<extra></extra>'))
-        
-        if 'Mean Cloud Cover' in available_cols:
-            fig.add_trace(go.Scatter(x=dataframe['Date'], y=dataframe['Mean Cloud Cover'], 
-                                    mode='lines+markers', name='Mean Cloud Cover', line=dict(color='orange'),
-                                    hovertemplate='<b>Cloud Cover:</b> %{y}%<br><b>Date:</b> %{x}<extra></extra>'))
-        
-        fig.update_layout(title='Mean Cloud Cover and Mean Precipitation Likelihood', 
-                        xaxis_title='Dates', yaxis_title='%')
-        fig.update_yaxes(minallowed=0, maxallowed=100)
-        st.plotly_chart(fig)
+        st.plotly_chart(get_figure('daily_cloud_precipitation', fingerprint, dataframe))
 
     # Graph 5: Mean Relative Humidity
     if 'Mean Relative Humidity' in available_cols:
-        fig = go.Figure()
-        fig.add_trace(go.Scatter(x=dataframe['Date'], y=dataframe['Mean Relative Humidity'], 
-                                mode='lines+markers', name='Mean Relative Humidity',
-                                hovertemplate='<b>Mean Relative Humidity:</b> %{y}%<br><b>Date:</b> %{x}<extra></extra>'))
-        fig.update_layout(title='Mean Relative Humidity', 
-                        xaxis_title='Dates', yaxis_title='Mean Relative Humidity (%)')
-        fig.update_yaxes(minallowed=0, maxallowed=100)
-        st.plotly_chart(fig)
-
-def create_ai_panel(refresh, city, country, dataframe):
+        st.plotly_chart(get_figure('daily_humidity', fingerprint, dataframe))
+
+def build_comparison_figure(rows):
+    # One line per city for a single variable of the long-format comparison frame
+    variable = rows['Variable'].iloc[0]
+    fig = go.Figure()
+    for city, city_rows in rows.groupby('City', observed=True, sort=False):
+        fig.add_trace(line_trace(city_rows['Date'], city_rows['Value'], name=city,
+                                 hovertemplate=f'<b>{city}</b><br><b>{variable}:</b> %{{y:.2f}}<br><b>Date:</b> %{{x}}<extra></extra>'))
+    fig.update_layout(title=f'{variable} by City', xaxis_title='Datetime', yaxis_title=variable)
+    return fig
+
+def display_comparison(comparison_frame, fingerprint):
+    variables = list(comparison_frame['Variable'].unique())
+    if not variables:
+        st.info("No data was returned for the chosen cities")
+        return
+    variable = st.selectbox("Compare", variables)
+
+    # Only the chosen variable's rows are charted, so the figure stays one trace per city
+    if 'Date' in comparison_frame.columns:
+        rows = comparison.variable_rows(comparison_frame, variable)
+        st.plotly_chart(get_figure('comparison', f"{fingerprint}:{variable}", rows))
+
+    st.subheader(f"Cities ranked by {variable}")
+    st.dataframe(comparison.rank_cities(comparison_frame, variable), width="stretch")
+
+def get_comparison(data, chosen_cities, graph_type, mapping, start=None, end=None):
+    # All cities are fetched together (cache, then forecast store, then multi-location API batches)
+    # and merged into one long-format frame
+    labels = list(chosen_cities)
+    with metrics.span("fetch", graph=graph_type, cities=len(labels)):
+        dataframes = get_weatherAPI_responses(data, [chosen_cities[label] for label in labels], graph_type, mapping, start, end)
+    return comparison.long_format(labels, dataframes)
+
+# Cached figure builders by chart name (see get_figure)
+FIGURE_BUILDERS = {
+    'hourly_temperature': build_hourly_temperature_figure,
+    'hourly_precipitation': build_hourly_precipitation_figure,
+    'hourly_wind': build_hourly_wind_figure,
+    'hourly_cloud_cover': build_hourly_cloud_cover_figure,
+    'daily_temperature': build_daily_temperature_figure,
+    'daily_cloud_precipitation': build_daily_cloud_precipitation_figure,
+    'daily_humidity': build_daily_humidity_figure,
+    'comparison': build_comparison_figure
+}
+
+def get_session_id():
+    # Identifies the browser session, so the AI rate limiter can share Groq capacity fairly between sessions
+    ctx = get_script_run_ctx()
+    return ctx.session_id if ctx else None
+
+def get_model():
+    if SERVICE_URL:
+        return load_service_client().get_model()
+    return AI.get_model()
+
+def summary_stream(prompt, city, country, dataframe):
+    # (generator function, arguments) that stream the summary - through the forecast service in client mode
+    arguments = dict(message=prompt, city=city, country=country, session_id=get_session_id())
+    if SERVICE_URL:
+        return load_service_client().stream_API, dict(arguments, forecast=st.session_state.forecast_request)
+    return AI.stream_API, dict(arguments, dataframe=dataframe)
+
+def start_ai_summary(refresh):
+    # Send a newly submitted prompt to Groq on the Groq pool straight away, so the request runs while the graphs render
+    # The returned iterator yields the summary as it is streamed back
+    # A refresh replaces the dataset later in the rerun, so the request waits for the new data in that case
+    prompt = st.session_state.get("prompt")
+    if not prompt or refresh or st.session_state.dataset is None:
+        return None
+    stream, arguments = summary_stream(prompt, st.session_state.city, st.session_state.country, st.session_state.dataset)
+    return fetch_pool.submit_ai_stream(stream, **arguments)
+
+def create_ai_panel(refresh, city, country, dataframe, pending_response=None):
     # Create AI summary panel
     st.header("AI Summary :brain:")
     st.markdown(":grey[This summary panel is used to display the AI output after receiving the data given by the graphs]")
     st.markdown(":small[:grey[**NOTE:** The chat board will clear every 4 messages to avoid the page becoming too long and will NOT remember previous prompts]]")
-    st.markdown(f":blue[:small[The model you are currently using is: _{AI.get_model()}_]]")
+    st.markdown(f":blue[:small[The model you are currently using is: _{get_model()}_]]")
     st.divider()
 
-    display_chat_boards(refresh, city, country, dataframe)
+    display_chat_boards(refresh, city, country, dataframe, pending_response)
 
-def display_chat_boards(refresh, city, country, dataframe):
+def display_chat_boards(refresh, city, country, dataframe, pending_response=None):
     # Display the summary through chat messages (similar to that of ChatGPT)
     message_board = st.container()
     chat_board = st.container()
@@ -462,7 +703,7 @@ def display_chat_boards(refresh, city, country, dataframe):
     chat_board.markdown("**Why do you want to use this dashboard?**")
     chat_board.markdown("Please be as detailed as possible")
     chat_board.caption(":small[e.g. I want to see how the weather will affect my train journey at 8am on the Elizabeth Line from Romford to Liverpool Street to work]")
-    chat_board.prompt = st.chat_input("Give AI context", disabled=st.session_state.disabled, on_submit=check_disabled, args=(refresh,))
+    chat_board.prompt = st.chat_input("Give AI context", key="prompt", disabled=st.session_state.disabled, on_submit=check_disabled, args=(refresh,))
 
     if chat_board.prompt:
         with message_board:
@@ -471,11 +712,12 @@ def display_chat_boards(refresh, city, country, dataframe):
             st.session_state.chat.append({"role": "user", "content": chat_board.prompt})
             
             with st.chat_message('ai'):
-                response = AI.call_API(message=chat_board.prompt,
-                                       city=city,
-                                       country=country,
-                                       dataframe=dataframe)
-                st.write(response)
+                # Summary is written token-by-token as Groq streams it
+                if pending_response is None:
+                    stream, arguments = summary_stream(chat_board.prompt, city, country, dataframe)
+                    pending_response = stream(**arguments)
+                with metrics.span("ai_summary"):
+                    response = st.write_stream(pending_response)
             st.session_state.chat.append({"role": "ai", "content": response})
 
 def check_disabled(*args):
@@ -493,55 +735,81 @@ def display_prev_messages():
             st.write(message["content"])
 
 def get_weatherAPI_response(data, city, graph_type, mapping, start=None, end=None):
-    lat, long = city[0], city[1]
-    
-    # Build weather parameters based on graph type
-    if graph_type in ("Current", "Hourly"):
-        weather_params = [mapping['hourly_current'][element] for element in data]
-    else:  # Daily
-        weather_params = []
-        for element in data:
-            daily_param = mapping['daily'][element]
-            weather_params.extend(daily_param if isinstance(daily_param, list) else [daily_param])
-    
-    # Configure API call based on graph type
-    config = {
-        "latitude": lat,
-        "longitude": long,
-        "daily": None,
-        "hourly": None,
-        "current": None,
-        "call_API": True
-    }
+    # From the forecast service in client mode, otherwise from this process's data tier
+    if SERVICE_URL:
+        return load_service_client().get_weatherAPI_response(data, city, graph_type, start, end)
+    return forecast_data.get_weatherAPI_response(data, city, graph_type, mapping, start, end)
+
+def get_weatherAPI_responses(data, cities, graph_type, mapping, start=None, end=None):
+    if SERVICE_URL:
+        return load_service_client().get_weatherAPI_responses(data, cities, graph_type, start, end)
+    return forecast_data.get_weatherAPI_responses(data, cities, graph_type, mapping, start, end)
+
+def record_requests(mapping, cities, graph_type, data, start, end):
+    # Popular requests are kept warm by the prefetch scheduler of the process holding the forecast cache
+    # In client mode that is the forecast service, which records every request it gets itself
+    if SERVICE_URL:
+        return
+    scheduler = load_prefetch_scheduler(mapping)
+    for city in cities:
+        scheduler.record(city[0], city[1], graph_type, data, start, end)
+
+def display_debug_panel():
+    # Where this rerun's time went, plus the process-wide counters and timings
+    with st.sidebar.expander("Debug timings", icon=":material/timer:"):
+        spans = metrics.run_spans()
+        if spans:
+            st.caption("This rerun")
+            st.dataframe(pd.DataFrame(spans).assign(ms=lambda spans: spans['seconds'] * 1000).drop(columns='seconds'),
+                         hide_index=True)
+        snapshot = metrics.snapshot()
+        st.caption("Since the server started")
+        st.json({"counters": snapshot["counters"], "groq_latency": AI._CLIENT.latency_summary()}, expanded=False)
+        st.dataframe(pd.DataFrame(snapshot["timings"]).T, width="stretch")
+
+def create_city_view(refresh, cities, countries, graph_filter, start, end, selected_data, mapping):
+    chosen_city, chosen_country = create_city_selection(cities, countries)
     
-    if graph_type == "Current":
-        config["current"] = weather_params
-    elif graph_type == "Hourly":
-        config.update({
-            "hourly": weather_params,
-            "datetime_start": start,
-            "datetime_end": end
-        })
-    else:  # Daily
-        config.update({
-            "daily": weather_params,
-            "date_start": start,
-            "date_end": end
-        })
+    # Only fetch new data when refresh is clicked and city is selected
+    if refresh and chosen_city:
+        st.session_state.city = chosen_city
+        st.session_state.country = chosen_country
+        record_requests(mapping, [chosen_city], graph_filter, selected_data, start, end)
+
+        st.session_state.dataset, st.session_state.graph = get_weatherAPI_response(
+            data=selected_data,
+            city=chosen_city,
+            graph_type=graph_filter,
+            mapping=mapping,
+            start=start,
+            end=end
+        )
+        # The service summarises the forecast it has cached for this request rather than being sent the dataset
+        st.session_state.forecast_request = forecast_client.forecast_request(graph_filter, selected_data, [chosen_city], start, end)
+        st.session_state.dataset_fingerprint = dataset_fingerprint(st.session_state.dataset)
+        st.session_state.time_index = TimeIndex(st.session_state.dataset['Date']) if 'Date' in st.session_state.dataset.columns else None
     
-    # Unpacks the dictionary to corresponding parameters
-    response = wAPI.set_config(**config)
+    # Display the cached dataset
+    if st.session_state.dataset is not None:
+        display_city_graphs(st.session_state.dataset, st.session_state.graph,
+                            st.session_state.dataset_fingerprint, st.session_state.time_index)
 
-    if graph_type == "Current":
-        return wAPI.get_current_data(response, data), graph_type
-    elif graph_type == "Hourly":
-        return wAPI.get_hourly_data(response, data), graph_type
-    else: # Daily
-        return wAPI.get_daily_data(response, data), graph_type
+def create_comparison_view(refresh, cities, countries, graph_filter, start, end, selected_data, mapping):
+    chosen_cities = create_comparison_selection(cities, countries)
+
+    # Same as the single city view - only fetch when refresh is clicked
+    if refresh and chosen_cities:
+        record_requests(mapping, chosen_cities.values(), graph_filter, selected_data, start, end)
+        st.session_state.comparison = get_comparison(selected_data, chosen_cities, graph_filter, mapping, start, end)
+        st.session_state.comparison_fingerprint = dataset_fingerprint(st.session_state.comparison)
+
+    if st.session_state.comparison is not None:
+        display_comparison(st.session_state.comparison, st.session_state.comparison_fingerprint)
 
 def main():
     # Loads main functions to build the dashboard
     configure_page()
+    metrics.begin_run()
     
     if "disabled" not in st.session_state:
         st.session_state.disabled = True
@@ -551,10 +819,20 @@ def main():
         st.session_state.dataset = None
     if "graph" not in st.session_state:
         st.session_state.graph = None
+    if "dataset_fingerprint" not in st.session_state:
+        st.session_state.dataset_fingerprint = None
+    if "time_index" not in st.session_state:
+        st.session_state.time_index = None
     if "city" not in st.session_state:
         st.session_state.city = None
     if "country" not in st.session_state:
         st.session_state.country = None
+    if "comparison" not in st.session_state:
+        st.session_state.comparison = None
+    if "forecast_request" not in st.session_state:
+        st.session_state.forecast_request = None
+    if "comparison_fingerprint" not in st.session_state:
+        st.session_state.comparison_fingerprint = None
 
     cities = load_cities()
     countries = load_countries()
@@ -565,30 +843,20 @@ def main():
     # Get values from sidebar
     graph_filter, start, end, selected_data = create_sidebar()
     refresh = create_refresh_button()
+    pending_response = start_ai_summary(refresh)
     
     with main_col:
-        chosen_city, chosen_country = create_city_selection(cities, countries)
-        
-        # Only fetch new data when refresh is clicked and city is selected
-        if refresh and chosen_city:
-            st.session_state.city = chosen_city
-            st.session_state.country = chosen_country
-
-            st.session_state.dataset, st.session_state.graph = get_weatherAPI_response(
-                data=selected_data,
-                city=chosen_city,
-                graph_type=graph_filter,
-                mapping=mapping,
-                start=start,
-                end=end
-            )
-        
-        # Display the cached dataset
-        if st.session_state.dataset is not None:
-            display_city_graphs(st.session_state.dataset, st.session_state.graph)
+        create_header()
+        if st.toggle("Compare cities", help=f"Compare the forecasts of up to {MAX_COMPARE_CITIES} cities"):
+            create_comparison_view(refresh, cities, countries, graph_filter, start, end, selected_data, mapping)
+        else:
+            create_city_view(refresh, cities, countries, graph_filter, start, end, selected_data, mapping)
     
     with ai_col:
-        create_ai_panel(refresh, st.session_state.city, st.session_state.country, st.session_state.dataset)
+        create_ai_panel(refresh, st.session_state.city, st.session_state.country, st.session_state.dataset, pending_response)
+
+    if DEBUG or st.query_params.get("debug"):
+        display_debug_panel()
     
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,56 @@
+"""
+The purpose of this python file is to reduce long time series to about as many points as a chart can show.
+
+Lines are reduced with LTTB (Largest-Triangle-Three-Buckets), which keeps from each bucket the point that forms the
+largest triangle with its neighbours, so peaks, troughs and the overall shape survive. Bars are reduced by keeping
+the largest value of each bucket, so no peak (e.g. a heavy shower) disappears. Both return row positions, so any
+data that goes with a point (hover data, dates) can be taken with the same positions.
+"""
+
+import numpy as np
+
+# Roughly the width in pixels of a chart in the main column - more points than this can't be told apart
+MAX_POINTS = 1000
+# Traces with more points than this are drawn with WebGL (Scattergl) instead of SVG
+WEBGL_THRESHOLD = 500
+
+def _bucket_edges(length, threshold):
+    # Edges of threshold - 2 buckets over the points between the first and the last
+    return np.linspace(1, length - 1, threshold - 1).astype(np.int64)
+
+def lttb_indices(y, threshold=MAX_POINTS, x=None):
+    # Positions of the points kept by LTTB (all positions if there are no more than threshold points)
+    y = np.asarray(y, dtype=np.float64)
+    length = len(y)
+    if length <= threshold or threshold < 3:
+        return np.arange(length)
+    x = np.arange(length, dtype=np.float64) if x is None else np.asarray(x, dtype=np.float64)
+
+    edges = _bucket_edges(length, threshold)
+    kept = np.empty(threshold, dtype=np.int64)
+    kept[0], kept[-1] = 0, length - 1
+    previous = 0
+    for bucket in range(threshold - 2):
+        start, end = edges[bucket], edges[bucket + 1]
+        # The average of the next bucket stands in for the next (not yet chosen) point
+        next_start, next_end = end, edges[bucket + 2] if bucket + 2 < len(edges) else length
+        next_x = x[next_start:next_end].mean()
+        next_y = np.nanmean(y[next_start:next_end]) if not np.isnan(y[next_start:next_end]).all() else y[previous]
+
+        # Twice the area of the triangle (previous point, candidate, next average) for every candidate in the bucket
+        areas = np.abs((x[previous] - next_x) * (y[start:end] - y[previous]) -
+                       (x[previous] - x[start:end]) * (next_y - y[previous]))
+        previous = start + int(np.argmax(np.nan_to_num(areas, nan=-1.0)))
+        kept[bucket + 1] = previous
+    return kept
+
+def max_bucket_indices(y, threshold=MAX_POINTS):
+    # Positions of the largest value of each bucket (all positions if there are no more than threshold points)
+    y = np.asarray(y, dtype=np.float64)
+    length = len(y)
+    if length <= threshold:
+        return np.arange(length)
+    edges = np.linspace(0, length, threshold + 1).astype(np.int64)
+    # Missing values never win against a real value in the same bucket
+    filled = np.nan_to_num(y, nan=-np.inf)
+    return np.array([start + int(np.argmax(filled[start:end])) for start, end in zip(edges[:-1], edges[1:])])
@@ -0,0 +1,252 @@
+"""
+The purpose of this python file is to export forecasts for many cities at once from the command line, for batch jobs.
+
+The city list is a text/CSV file with one location per line, either "City, Country" (resolved through the gazetteer,
+the country given as its name or 2 letter code) or "latitude, longitude". Blank lines and lines starting with # are
+skipped. Locations are fetched in multi-location batches, a few batches at a time on the fetch pool, and each batch
+is written out as soon as it arrives, so memory use stays the same however many cities are exported:
+    - CSV output is one file that each batch is appended to
+    - Parquet output is a directory with one part file per batch (readable as one table with pyarrow/pandas)
+After every batch a checkpoint (<output>.checkpoint.json) records how far the export got, along with the city list
+and a hash of the locations written so far. Running the same command again with --resume carries on from the last
+completed batch instead of starting again, and refuses to if the city list no longer starts with the same locations.
+
+Run with:
+    python export_forecasts.py cities.txt --graph Hourly --data Temperature Precipitation
+        --start 2025-05-01T00:00 --end 2025-05-07T23:00 --output forecasts.csv [--format csv|parquet] [--resume]
+"""
+
+import argparse, csv, hashlib, json, sys
+from datetime import date, datetime, timedelta
+from itertools import islice
+from pathlib import Path
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+import fetch_pool
+import forecast_data
+import gazetteer
+import weatherAPI_wrapper as wAPI
+
+CONFIG_DIR = Path(__file__).parent / 'config'
+COUNTRIES_FILE = 'country_codes.json'
+# Batches being fetched at once (each one is a single multi-location request)
+CONCURRENCY = 4
+# Days exported when no start/end is given
+DEFAULT_DAYS = 7
+
+def parse_locations(lines, cities, countries):
+    # Yield (city, country code, lat, lon) for each line, lazily so the list is never held in memory
+    # Names that can't be found in the gazetteer are reported and skipped
+    codes = set(countries.values())
+    for line_number, row in enumerate(csv.reader(lines), start=1):
+        fields = [field.strip() for field in row]
+        if not fields or not fields[0] or fields[0].startswith("#"):
+            continue
+        if len(fields) != 2:
+            print(f"Line {line_number}: expected 'City, Country' or 'latitude, longitude', skipped", file=sys.stderr)
+            continue
+
+        try:
+            lat, lon = float(fields[0]), float(fields[1])
+        except ValueError:
+            name, country = fields
+            code = country.upper() if country.upper() in codes else countries.get(country)
+            pos = cities.find(name, code) if code else None
+            if pos is None:
+                print(f"Line {line_number}: {name}, {country} was not found, skipped", file=sys.stderr)
+                continue
+            yield name, code, round(float(cities.lat[pos]), 4), round(float(cities.lon[pos]), 4)
+            continue
+
+        if not (-90 <= lat <= 90 and -180 <= lon <= 180):
+            print(f"Line {line_number}: {lat}, {lon} is not a valid coordinate, skipped", file=sys.stderr)
+            continue
+        yield None, None, lat, lon
+
+def batched(items, size):
+    items = iter(items)
+    while batch := list(islice(items, size)):
+        yield batch
+
+def default_window(graph_type):
+    # Today and the following days, in the same formats that the dashboard sends
+    today = date.today()
+    if graph_type == "Daily":
+        return today.isoformat(), (today + timedelta(days=DEFAULT_DAYS - 1)).isoformat()
+    if graph_type == "Hourly":
+        start = datetime.combine(today, datetime.min.time())
+        return start.isoformat(timespec="minutes"), (start + timedelta(days=DEFAULT_DAYS, hours=-1)).isoformat(timespec="minutes")
+    return None, None
+
+def fetch_batch(batch, graph_type, data, config):
+    # One DataFrame for the batch - the forecast rows of each location, prefixed by the location they belong to
+    responses = wAPI.get_batch([(lat, lon) for _, _, lat, lon in batch], **config)
+    frames = []
+    for (city, country, lat, lon), response in zip(batch, responses):
+        dataframe = forecast_data.convert_weatherAPI_response(response, data, graph_type)
+        dataframe.insert(0, "City", city)
+        dataframe.insert(1, "Country", country)
+        dataframe.insert(2, "Latitude", lat)
+        dataframe.insert(3, "Longitude", lon)
+        frames.append(dataframe)
+    combined = pd.concat(frames, ignore_index=True)
+    # Kept as strings even when every location of the batch was given as coordinates, so every part has one schema
+    return combined.astype({"City": "string", "Country": "string"})
+
+def chain_digest(digest, batch):
+    # Hash of every location up to and including the batch, given the hash of the locations before it
+    return hashlib.sha256((digest + json.dumps(batch)).encode("utf-8")).hexdigest()
+
+class Checkpoint:
+    # How far an export got - the number of batches written, the hash of their locations and, for CSV, the size of
+    # the file at that point
+    def __init__(self, output, request):
+        self.path = output.with_name(output.name + ".checkpoint.json")
+        self.request = request
+        self.batches = 0
+        self.csv_bytes = 0
+        self.digest = ""
+
+    def load(self):
+        # Returns False if there is no checkpoint, raises ValueError if it belongs to a different export
+        if not self.path.exists():
+            return False
+        saved = json.loads(self.path.read_text())
+        if saved["request"] != self.request:
+            raise ValueError(f"{self.path} is for a different export, remove it or change --output")
+        self.batches = saved["batches"]
+        self.csv_bytes = saved["csv_bytes"]
+        self.digest = saved["digest"]
+        return True
+
+    def skip(self, batches):
+        # Skip the batches that were already written, raising ValueError if they aren't the ones the checkpoint hashed
+        batches = iter(batches)
+        digest = ""
+        for batch in islice(batches, self.batches):
+            digest = chain_digest(digest, batch)
+        if digest != self.digest:
+            raise ValueError(f"The city list has changed since {self.path} was written, remove it or change --output")
+        return batches
+
+    def save(self, batch, csv_bytes=0):
+        self.batches, self.csv_bytes = self.batches + 1, csv_bytes
+        self.digest = chain_digest(self.digest, batch)
+        # Written to a temporary file first so a crash never leaves a half-written checkpoint
+        tmp_path = self.path.with_suffix(".tmp")
+        tmp_path.write_text(json.dumps({"request": self.request, "batches": self.batches, "csv_bytes": csv_bytes,
+                                        "digest": self.digest}))
+        tmp_path.replace(self.path)
+
+class CSVWriter:
+    def __init__(self, output, checkpoint):
+        # Anything written after the last checkpoint (a batch that was cut off) is dropped
+        self._file = open(output, "a+b")
+        self._file.truncate(checkpoint.csv_bytes)
+        self._file.seek(checkpoint.csv_bytes)
+
+    def write(self, dataframe):
+        dataframe.to_csv(self._file, index=False, header=self._file.tell() == 0, date_format="%Y-%m-%dT%H:%M",
+                         lineterminator="\n")
+        self._file.flush()
+        return self._file.tell()
+
+    def close(self):
+        self._file.close()
+
+class ParquetWriter:
+    def __init__(self, output, checkpoint):
+        self._output = output
+        self._batch = checkpoint.batches
+        output.mkdir(parents=True, exist_ok=True)
+        # Parts of batches after the checkpoint are from an interrupted run and are written again
+        for part in output.glob("part-*.parquet"):
+            if int(part.stem.removeprefix("part-")) >= self._batch:
+                part.unlink()
+
+    def write(self, dataframe):
+        tmp_path = self._output / f".part-{self._batch:06d}.tmp"
+        pq.write_table(pa.Table.from_pandas(dataframe, preserve_index=False), tmp_path)
+        tmp_path.replace(self._output / f"part-{self._batch:06d}.parquet")
+        self._batch += 1
+        return 0
+
+    def close(self):
+        pass
+
+def export(lines, output, output_format, graph_type, data, start, end, batch_size=wAPI.BATCH_SIZE,
+           concurrency=CONCURRENCY, resume=False, source="-"):
+    # Returns the number of locations exported by this run
+    # 'source' names the city list (its path, or - for stdin) so a checkpoint is only resumed for the same list
+    cities = gazetteer.load(CONFIG_DIR)
+    with open(CONFIG_DIR / COUNTRIES_FILE, "r", encoding="utf-8") as f:
+        countries = json.load(f)
+
+    checkpoint = Checkpoint(output, {"source": source, "graph": graph_type, "data": data, "start": start, "end": end,
+                                     "format": output_format, "batch_size": batch_size})
+    if resume and checkpoint.load():
+        print(f"Resuming after batch {checkpoint.batches}", file=sys.stderr)
+    elif output.exists() and any(output.iterdir() if output.is_dir() else [output]):
+        raise ValueError(f"{output} already exists, use --resume to continue an export or choose another --output")
+
+    config = forecast_data.build_weather_config(data, graph_type, forecast_data.load_mapping(), start, end)
+    # Batches already written are skipped without being fetched
+    batches = checkpoint.skip(batched(parse_locations(lines, cities, countries), batch_size))
+    writer = (CSVWriter if output_format == "csv" else ParquetWriter)(output, checkpoint)
+
+    exported = 0
+    try:
+        # map_ordered only reads ahead as far as the batches in flight, and yields them in order for the checkpoint
+        fetched = fetch_pool.map_ordered(lambda batch: (batch, fetch_batch(batch, graph_type, data, config)),
+                                         batches, max_in_flight=concurrency)
+        for batch, dataframe in fetched:
+            csv_bytes = writer.write(dataframe)
+            checkpoint.save(batch, csv_bytes)
+            exported += len(batch)
+            print(f"Batch {checkpoint.batches} written ({exported} locations this run)", file=sys.stderr)
+    finally:
+        writer.close()
+    return exported
+
+def main():
+    parser = argparse.ArgumentParser(description="Export forecasts for a list of cities or coordinates")
+    parser.add_argument("cities", help="file with one 'City, Country' or 'latitude, longitude' per line (- for stdin)")
+    parser.add_argument("--graph", choices=forecast_data.GRAPH_TYPES, default="Hourly")
+    parser.add_argument("--data", nargs="+", help="variables from param_mapping.json (default: all of the graph type)")
+    parser.add_argument("--start", help="first date (Daily) or hour (Hourly), e.g. 2025-05-01 or 2025-05-01T00:00")
+    parser.add_argument("--end", help="last date or hour (inclusive)")
+    parser.add_argument("--output", type=Path, required=True, help="CSV file or Parquet directory")
+    parser.add_argument("--format", choices=("csv", "parquet"), help="default: from the output's suffix")
+    parser.add_argument("--batch-size", type=int, default=wAPI.BATCH_SIZE, help="locations per request")
+    parser.add_argument("--concurrency", type=int, default=CONCURRENCY, help="requests in flight at once")
+    parser.add_argument("--resume", action="store_true", help="carry on from the checkpoint of an earlier run")
+    args = parser.parse_args()
+
+    choices = forecast_data.choices(forecast_data.load_mapping(), args.graph)
+    data = args.data or choices
+    unknown = [name for name in data if name not in choices]
+    if unknown:
+        parser.error(f"unknown {args.graph} data: {', '.join(unknown)} (choose from: {', '.join(choices)})")
+    if not 1 <= args.concurrency <= fetch_pool.MAX_WORKERS:
+        parser.error(f"--concurrency must be between 1 and {fetch_pool.MAX_WORKERS}")
+
+    start, end = default_window(args.graph)
+    start, end = args.start or start, args.end or end
+    output_format = args.format or ("parquet" if args.output.suffix in ("", ".parquet") else "csv")
+
+    lines = sys.stdin if args.cities == "-" else open(args.cities, "r", encoding="utf-8", newline="")
+    try:
+        source = "-" if args.cities == "-" else str(Path(args.cities).resolve())
+        exported = export(lines, args.output, output_format, args.graph, data, start, end, args.batch_size,
+                          args.concurrency, args.resume, source)
+    except ValueError as error:
+        parser.exit(1, f"{error}\n")
+    finally:
+        lines.close()
+    print(f"Exported {exported} locations to {args.output}", file=sys.stderr)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+"""
+The purpose of this python file is to run the network calls of the dashboard (Open-Meteo and Groq) on shared thread pools.
+
+Streamlit runs each session's script on its own thread and both API clients are blocking, so bounded thread pools
+let independent calls overlap (e.g. several forecast batches, or the Groq request while the graphs are drawn)
+without every session opening unbounded numbers of connections. Groq requests get a pool of their own, as they can
+wait up to rate_limiter.MAX_QUEUE_WAIT seconds for the rate limiter and would otherwise hold up every session's
+forecast fetches.
+"""
+
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from queue import Queue
+
+# Upper bound on concurrent network calls for the whole process (shared by all sessions)
+MAX_WORKERS = 8
+
+# Upper bound on concurrent Groq requests (including those waiting on the rate limiter)
+AI_WORKERS = 8
+
+_executor = ThreadPoolExecutor(max_workers=MAX_WORKERS, thread_name_prefix="fetch")
+_ai_executor = ThreadPoolExecutor(max_workers=AI_WORKERS, thread_name_prefix="groq")
+
+def submit(fn, *args, **kwargs):
+    # Start fn on the pool and return its Future
+    return _executor.submit(fn, *args, **kwargs)
+
+def map_ordered(fn, items, max_in_flight=MAX_WORKERS):
+    # Like map(), but calls run concurrently with at most max_in_flight submitted at once
+    # Results are yielded in the order of items and items are only consumed as results are yielded,
+    # so memory stays bounded even for very long (or lazy) inputs
+    in_flight = deque()
+    for item in items:
+        in_flight.append(_executor.submit(fn, item))
+        if len(in_flight) >= max_in_flight:
+            yield in_flight.popleft().result()
+    while in_flight:
+        yield in_flight.popleft().result()
+
+def submit_stream(fn, *args, **kwargs):
+    # Run the generator function fn on the pool and return an iterator over its items as they are produced
+    # Exceptions raised by the generator are re-raised by the iterator
+    return _stream_on(_executor, fn, args, kwargs)
+
+def submit_ai_stream(fn, *args, **kwargs):
+    # Same as submit_stream, on the Groq pool
+    return _stream_on(_ai_executor, fn, args, kwargs)
+
+def _stream_on(executor, fn, args, kwargs):
+    items = Queue()
+    def run():
+        try:
+            for item in fn(*args, **kwargs):
+                items.put((True, item))
+            items.put((False, None))
+        except BaseException as error:
+            items.put((False, error))
+    executor.submit(run)
+
+    def iterate():
+        while True:
+            is_item, item = items.get()
+            if not is_item:
+                if item is not None:
+                    raise item
+                return
+            yield item
+    return iterate()
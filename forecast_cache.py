@@ -0,0 +1,203 @@
+"""
+The purpose of this python file is to cache forecasts by weather model grid cell instead of by request URL.
+
+Coordinates are quantized to GRID_RESOLUTION degree cells and the forecast is always fetched for the cell centre, so
+neighbouring cities in the same cell share one entry. Each entry keeps the superset of variables and of the time
+window fetched so far for its cell, so narrower requests are answered by slicing the stored DataFrame. Entries
+belong to a model run and expire when the next run becomes available rather than after a flat hour.
+
+Entries are kept in this process unless a shared backend is configured (see shared_backend.py), in which case they
+are stored there as Arrow IPC so every worker process reads and fills the same cache.
+"""
+
+import json, math, struct, time
+import pandas as pd
+import pyarrow as pa
+from collections import OrderedDict
+from threading import Lock
+import shared_backend
+from metrics import metrics
+
+# Roughly the resolution of the high resolution models Open-Meteo blends in (~11km)
+GRID_RESOLUTION = 0.1
+MAX_ENTRIES = 512
+
+# (update interval, delay until the run is available) in seconds for each graph type
+# Current conditions are refreshed every 15 minutes, forecast models every few hours
+MODEL_RUN_CYCLES = {
+    "Current": (15 * 60, 0),
+    "Hourly": (3 * 3600, 3600),
+    "Daily": (3 * 3600, 3600)
+}
+
+# Daily choices that are returned as several DataFrame columns
+_DAILY_COLUMNS = {"Precipitation Sum": ["Rain Sum", "Showers Sum", "Snowfall Sum"]}
+
+def grid_cell(lat, lon, resolution=GRID_RESOLUTION):
+    return (round(lat / resolution), round(lon / resolution))
+
+def cell_centre(cell, resolution=GRID_RESOLUTION):
+    return (round(cell[0] * resolution, 4), round(cell[1] * resolution, 4))
+
+def model_run(graph_type, now=None):
+    # Number of the latest model run that is available at 'now'
+    interval, delay = MODEL_RUN_CYCLES[graph_type]
+    return math.floor(((now or time.time()) - delay) / interval)
+
+def run_expiry(graph_type, now=None):
+    # Seconds until the run after the current one becomes available, when the entries of this run expire
+    interval, delay = MODEL_RUN_CYCLES[graph_type]
+    now = now or time.time()
+    return (model_run(graph_type, now) + 1) * interval + delay - now
+
+def data_columns(graph_type, choices):
+    # DataFrame columns produced for the dashboard choices
+    if graph_type != "Daily":
+        return list(choices)
+    return [column for choice in choices for column in _DAILY_COLUMNS.get(choice, [choice])]
+
+def _to_timestamp(value):
+    # The dashboard sends naive local times, which the DataFrames label as UTC
+    return pd.Timestamp(value).tz_localize("UTC")
+
+class _Entry:
+    def __init__(self, run, choices, start, end, dataframe):
+        self.run = run
+        self.choices = choices
+        self.start = start
+        self.end = end
+        self.dataframe = dataframe
+
+    def to_bytes(self):
+        # Length of the JSON header, the header (run, choices and window), then the DataFrame as an Arrow IPC stream
+        header = json.dumps({"run": self.run, "choices": self.choices,
+                             "start": self.start and self.start.isoformat(), "end": self.end and self.end.isoformat()})
+        header = header.encode("utf-8")
+        table = pa.Table.from_pandas(self.dataframe, preserve_index=False)
+        sink = pa.BufferOutputStream()
+        with pa.ipc.new_stream(sink, table.schema) as writer:
+            writer.write_table(table)
+        return struct.pack("<I", len(header)) + header + sink.getvalue().to_pybytes()
+
+    @classmethod
+    def from_bytes(cls, data, with_dataframe=True):
+        # Without the DataFrame only the header is decoded, for checks that don't need the forecast itself
+        if data is None:
+            return None
+        (length,) = struct.unpack_from("<I", data)
+        header = json.loads(data[4:4 + length])
+        dataframe = pa.ipc.open_stream(data[4 + length:]).read_all().to_pandas() if with_dataframe else None
+        return cls(header["run"], header["choices"], header["start"] and pd.Timestamp(header["start"]),
+                   header["end"] and pd.Timestamp(header["end"]), dataframe)
+
+    def covers(self, choices, start, end):
+        if not set(choices) <= set(self.choices):
+            return False
+        if start is None:
+            return True
+        return self.start <= start and end <= self.end
+
+def _backend_key(key):
+    (cell_lat, cell_lon), graph_type = key
+    return f"forecast:{graph_type.lower()}:{cell_lat}:{cell_lon}"
+
+class ForecastCache:
+    def __init__(self, max_entries=MAX_ENTRIES, backend=None):
+        self._entries = OrderedDict()
+        self._max_entries = max_entries
+        self._lock = Lock()
+        self._backend = backend
+
+    def _get_entry(self, key, graph_type, with_dataframe=True):
+        # Get a live entry for the key, dropping it if its model run has been superseded
+        if self._backend is not None:
+            entry = _Entry.from_bytes(self._backend.get(_backend_key(key)), with_dataframe)
+            return entry if entry is not None and entry.run == model_run(graph_type) else None
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry.run != model_run(graph_type):
+                del self._entries[key]
+                return None
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def _put_entry(self, key, graph_type, entry):
+        if self._backend is not None:
+            # The backend drops the entry by itself once the next model run is out
+            self._backend.set(_backend_key(key), entry.to_bytes(), ttl=run_expiry(graph_type))
+            return
+
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self._max_entries:
+                self._entries.popitem(last=False)
+
+    def select(self, entry, graph_type, choices, start=None, end=None):
+        # Slice the requested choices and time window out of an entry
+        columns = data_columns(graph_type, choices)
+        dataframe = entry.dataframe
+        if graph_type == "Current":
+            return dataframe[columns].copy()
+
+        dates = dataframe["Date"]
+        if graph_type == "Daily":
+            dates = dates.dt.normalize()
+        in_window = (dates >= _to_timestamp(start)) & (dates <= _to_timestamp(end))
+        return dataframe.loc[in_window, ["Date"] + columns].reset_index(drop=True)
+
+    def get(self, lat, lon, graph_type, choices, start=None, end=None):
+        # Return the requested slice of a cached forecast, or None on a miss
+        key = (grid_cell(lat, lon), graph_type)
+        entry = self._get_entry(key, graph_type)
+        if entry is None or not entry.covers(choices, start and _to_timestamp(start), end and _to_timestamp(end)):
+            return None
+        return self.select(entry, graph_type, choices, start, end)
+
+    def contains(self, lat, lon, graph_type, choices, start=None, end=None):
+        # Whether get() would be a hit, without decoding the cached DataFrame
+        entry = self._get_entry((grid_cell(lat, lon), graph_type), graph_type, with_dataframe=False)
+        return entry is not None and entry.covers(choices, start and _to_timestamp(start), end and _to_timestamp(end))
+
+    def superset(self, lat, lon, graph_type, choices, start=None, end=None):
+        # Work out what to fetch on a miss - the union of what is cached for the cell and what was asked for
+        # Returns (choices, start, end)
+        key = (grid_cell(lat, lon), graph_type)
+        entry = self._get_entry(key, graph_type)
+        if entry is None:
+            return list(choices), start, end
+
+        fetch_choices = list(entry.choices) + [choice for choice in choices if choice not in entry.choices]
+        if start is None:
+            return fetch_choices, start, end
+        fetch_start = min(_to_timestamp(start), entry.start)
+        fetch_end = max(_to_timestamp(end), entry.end)
+        # Keep the same string format that the dashboard passes to the API
+        string_format = "%Y-%m-%d" if graph_type == "Daily" else "%Y-%m-%dT%H:%M"
+        return fetch_choices, fetch_start.strftime(string_format), fetch_end.strftime(string_format)
+
+    def put(self, lat, lon, graph_type, choices, start, end, dataframe):
+        # Store a forecast fetched for the cell of lat/lon and return its entry
+        key = (grid_cell(lat, lon), graph_type)
+        entry = _Entry(model_run(graph_type), list(choices), start and _to_timestamp(start), end and _to_timestamp(end), dataframe)
+        self._put_entry(key, graph_type, entry)
+        return entry
+
+    def get_or_fetch(self, lat, lon, graph_type, choices, start, end, fetch):
+        # fetch(lat, lon, choices, start, end) is only called on a miss, for the cell centre and the superset request
+        dataframe = self.get(lat, lon, graph_type, choices, start, end)
+        if dataframe is not None:
+            metrics.increment("forecast_cache.hit")
+            return dataframe
+        metrics.increment("forecast_cache.miss")
+
+        fetch_choices, fetch_start, fetch_end = self.superset(lat, lon, graph_type, choices, start, end)
+        centre_lat, centre_lon = cell_centre(grid_cell(lat, lon))
+        fetched = fetch(centre_lat, centre_lon, fetch_choices, fetch_start, fetch_end)
+        entry = self.put(lat, lon, graph_type, fetch_choices, fetch_start, fetch_end, fetched)
+        return self.select(entry, graph_type, choices, start, end)
+
+# Process-wide cache shared by every dashboard session (and every worker process when there is a shared backend)
+cache = ForecastCache(backend=shared_backend.backend)
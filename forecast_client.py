@@ -0,0 +1,92 @@
+"""
+The purpose of this python file is to fetch forecasts and AI summaries from the forecast service (forecast_service.py).
+
+The methods mirror the data tier the dashboard otherwise runs in its own process (forecast_data and the AI class),
+so the dashboard can switch to the service by setting FORECAST_SERVICE_URL. Forecasts are transferred as Arrow IPC
+streams, so DataFrames arrive with the same float32 columns and UTC dates that the data tier produces, and
+summaries are streamed back as plain text chunks while Groq writes them.
+"""
+
+import pyarrow as pa
+import requests
+from requests.adapters import HTTPAdapter
+import fetch_pool
+
+ARROW_TYPE = "application/vnd.apache.arrow.stream"
+# Seconds to connect to the service / to wait between bytes of its response (a cold batch can take a while)
+CONNECT_TIMEOUT = 5
+READ_TIMEOUT = 120
+
+def forecast_request(graph_type, data, cities, start=None, end=None):
+    # JSON body of a /forecast request - cities are [lat, lon, ...] like the dashboard's chosen cities
+    return {
+        "graph": graph_type,
+        "data": list(data),
+        "locations": [[city[0], city[1]] for city in cities],
+        "start": start,
+        "end": end
+    }
+
+def read_arrow(body):
+    # Split an Arrow /forecast response back into one DataFrame per requested location
+    table = pa.ipc.open_stream(body).read_all()
+    locations = int(table.schema.metadata[b"locations"])
+    dataframe = table.to_pandas()
+    groups = dict(tuple(dataframe.groupby("Location", sort=False)))
+    empty = dataframe.iloc[0:0]
+    return [groups.get(pos, empty).drop(columns="Location").reset_index(drop=True) for pos in range(locations)]
+
+class ForecastClient:
+    def __init__(self, base_url, connect_timeout=CONNECT_TIMEOUT, read_timeout=READ_TIMEOUT):
+        self.base_url = base_url.rstrip("/")
+        self._timeout = (connect_timeout, read_timeout)
+        # Kept-alive connections for every thread that can be waiting on the service at once
+        self._session = requests.Session()
+        self._session.mount("http://", HTTPAdapter(pool_maxsize=fetch_pool.MAX_WORKERS))
+        self._session.mount("https://", HTTPAdapter(pool_maxsize=fetch_pool.MAX_WORKERS))
+
+    def _post(self, path, body, stream=False, accept="application/json"):
+        response = self._session.post(f"{self.base_url}{path}", json=body, stream=stream, timeout=self._timeout,
+                                      headers={"Accept": accept})
+        if not response.ok:
+            # Errors are always JSON, so their reason can be shown instead of a bare status code
+            try:
+                reason = response.json()["error"]
+            except (ValueError, KeyError):
+                reason = response.reason
+            response.close()
+            raise requests.HTTPError(f"Forecast service returned {response.status_code}: {reason}", response=response)
+        return response
+
+    def get_weatherAPI_responses(self, data, cities, graph_type, start=None, end=None):
+        # One DataFrame per city, in the order given
+        response = self._post("/forecast", forecast_request(graph_type, data, cities, start, end), accept=ARROW_TYPE)
+        return read_arrow(response.content)
+
+    def get_weatherAPI_response(self, data, city, graph_type, start=None, end=None):
+        # Same (dataframe, graph_type) pair that the data tier returns
+        return self.get_weatherAPI_responses(data, [city], graph_type, start, end)[0], graph_type
+
+    def get_model(self):
+        response = self._session.get(f"{self.base_url}/model", timeout=self._timeout)
+        response.raise_for_status()
+        return response.json()["model"]
+
+    def call_API(self, message, city, country, forecast, session_id=None):
+        # 'forecast' is the /forecast request (one location) of the data to summarise - the service has it cached
+        body = {"message": message, "city": city, "country": country, "forecast": forecast, "session_id": session_id}
+        return self._post("/summary", body).json()["summary"]
+
+    def stream_API(self, message, city, country, forecast, session_id=None):
+        # Generator of text deltas, like AI.stream_API
+        body = {"message": message, "city": city, "country": country, "forecast": forecast, "session_id": session_id,
+                "stream": True}
+        with self._post("/summary", body, stream=True, accept="text/plain") as response:
+            for chunk in response.iter_content(chunk_size=None, decode_unicode=True):
+                if chunk:
+                    yield chunk
+
+    def health(self):
+        response = self._session.get(f"{self.base_url}/health", timeout=self._timeout)
+        response.raise_for_status()
+        return response.json()
@@ -0,0 +1,135 @@
+"""
+The purpose of this python file is to fetch forecasts into DataFrames without any dependency on Streamlit.
+
+This is the data tier shared by the dashboard (when it runs the data tier in its own process) and by the forecast
+service (forecast_service.py). Requests are answered from the grid cell cache (forecast_cache), then the local
+forecast store (forecast_store), and only then from the Open-Meteo API, with several locations sharing
+multi-location requests where possible.
+"""
+
+import json
+from pathlib import Path
+import weatherAPI_wrapper as wAPI
+import forecast_cache
+import forecast_store
+from metrics import metrics
+
+PARAM_FILE = 'param_mapping.json'
+GRAPH_TYPES = ("Current", "Hourly", "Daily")
+
+def load_mapping():
+    # Load Weather API param mapping file into a dictionary
+    json_file = Path(__file__).parent / 'config' / PARAM_FILE
+    with open(json_file, "r") as f:
+        return json.load(f)
+
+def choices(mapping, graph_type):
+    # Variables that can be asked for with the graph type
+    return list(mapping['daily'] if graph_type == "Daily" else mapping['hourly_current'])
+
+def build_weather_config(data, graph_type, mapping, start=None, end=None):
+    # Build weather parameters based on graph type
+    if graph_type in ("Current", "Hourly"):
+        weather_params = [mapping['hourly_current'][element] for element in data]
+    else:  # Daily
+        weather_params = []
+        for element in data:
+            daily_param = mapping['daily'][element]
+            weather_params.extend(daily_param if isinstance(daily_param, list) else [daily_param])
+    
+    # Configure API call based on graph type
+    config = {
+        "daily": None,
+        "hourly": None,
+        "current": None,
+        "call_API": True
+    }
+    
+    if graph_type == "Current":
+        config["current"] = weather_params
+    elif graph_type == "Hourly":
+        config.update({
+            "hourly": weather_params,
+            "datetime_start": start,
+            "datetime_end": end
+        })
+    else:  # Daily
+        config.update({
+            "daily": weather_params,
+            "date_start": start,
+            "date_end": end
+        })
+    return config
+
+def convert_weatherAPI_response(response, data, graph_type):
+    with metrics.span("to_dataframe", graph=graph_type):
+        if graph_type == "Current":
+            return wAPI.get_current_data(response, data)
+        elif graph_type == "Hourly":
+            return wAPI.get_hourly_data(response, data)
+        else: # Daily
+            return wAPI.get_daily_data(response, data)
+
+def get_weatherAPI_response(data, city, graph_type, mapping, start=None, end=None):
+    def fetch(lat, long, fetch_data, fetch_start, fetch_end):
+        # Past windows are read back from the local forecast store when it already has them
+        columns = forecast_cache.data_columns(graph_type, fetch_data)
+        stored = forecast_store.read(lat, long, graph_type, columns, fetch_start, fetch_end)
+        if stored is not None:
+            return stored
+
+        config = build_weather_config(fetch_data, graph_type, mapping, fetch_start, fetch_end)
+        # Unpacks the dictionary to corresponding parameters
+        response = wAPI.set_config(latitude=lat, longitude=long, **config)
+        dataframe = convert_weatherAPI_response(response, fetch_data, graph_type)
+        forecast_store.write(lat, long, graph_type, dataframe)
+        return dataframe
+
+    # Served from the grid cell cache when this cell already has the data, otherwise fetched for the cell centre
+    with metrics.span("fetch", graph=graph_type):
+        dataframe = forecast_cache.cache.get_or_fetch(city[0], city[1], graph_type, data, start, end, fetch)
+    return dataframe, graph_type
+
+def get_weatherAPI_responses(data, cities, graph_type, mapping, start=None, end=None):
+    # Batched version of get_weatherAPI_response - one DataFrame per city, in the order given
+    cache = forecast_cache.cache
+    dataframes = [cache.get(city[0], city[1], graph_type, data, start, end) for city in cities]
+    hits = sum(dataframe is not None for dataframe in dataframes)
+    metrics.increment("forecast_cache.hit", hits)
+    metrics.increment("forecast_cache.miss", len(cities) - hits)
+
+    # Group the cache misses by the request they need, so each group can share multi-location batches
+    misses = {}
+    for pos, city in enumerate(cities):
+        if dataframes[pos] is None:
+            fetch_data, fetch_start, fetch_end = cache.superset(city[0], city[1], graph_type, data, start, end)
+            cell = forecast_cache.grid_cell(city[0], city[1])
+            misses.setdefault((tuple(fetch_data), fetch_start, fetch_end), {}).setdefault(cell, []).append(pos)
+
+    for (fetch_data, fetch_start, fetch_end), cells in misses.items():
+        fetch_data = list(fetch_data)
+        columns = forecast_cache.data_columns(graph_type, fetch_data)
+        fetched = {}
+        for cell in cells:
+            lat, long = forecast_cache.cell_centre(cell)
+            stored = forecast_store.read(lat, long, graph_type, columns, fetch_start, fetch_end)
+            if stored is not None:
+                fetched[cell] = stored
+
+        # Only the cells the forecast store couldn't answer are requested from the API
+        centres = [forecast_cache.cell_centre(cell) for cell in cells if cell not in fetched]
+        if centres:
+            config = build_weather_config(fetch_data, graph_type, mapping, fetch_start, fetch_end)
+            responses = wAPI.set_batch_config(centres, **config)
+            for (lat, long), response in zip(centres, responses):
+                dataframe = convert_weatherAPI_response(response, fetch_data, graph_type)
+                forecast_store.write(lat, long, graph_type, dataframe)
+                fetched[forecast_cache.grid_cell(lat, long)] = dataframe
+
+        for cell, positions in cells.items():
+            lat, long = forecast_cache.cell_centre(cell)
+            entry = cache.put(lat, long, graph_type, fetch_data, fetch_start, fetch_end, fetched[cell])
+            for pos in positions:
+                dataframes[pos] = cache.select(entry, graph_type, data, start, end)
+
+    return dataframes
@@ -0,0 +1,269 @@
+"""
+The purpose of this python file is to serve forecasts and AI summaries over HTTP, separately from the Streamlit UI.
+
+The service runs the data tier (forecast_data and the AI class) on its own pool of request workers, and every
+client shares its forecast cache, summary cache, Groq rate limiter and prefetch scheduler. The dashboard becomes
+one of its clients when FORECAST_SERVICE_URL is set (see forecast_client.py), so the data tier can be scaled
+across processes and machines independently of the UI sessions. Endpoints:
+    POST /forecast  {"graph": "Hourly", "data": ["Temperature", ...], "locations": [[lat, lon], ...],
+                     "start": "2025-05-01T00:00", "end": "2025-05-02T23:00"}
+        Answered as an Arrow IPC stream (Accept: application/vnd.apache.arrow.stream) with a Location column giving
+        the position of each row's location in the request, otherwise as JSON with one 'split' table per location.
+        'data' defaults to every variable of the graph type in param_mapping.json, start/end are left out for Current.
+    POST /summary   {"message": ..., "city": ..., "country": ..., "forecast": {<a /forecast request, one location>},
+                     "session_id": ..., "stream": false}
+        The summary as JSON, or streamed as chunked plain text when "stream" is true.
+    GET /model, GET /health, GET /metrics
+
+Run with:
+    python forecast_service.py [--host 127.0.0.1] [--port 8600] [--workers 16]
+"""
+
+import argparse, json
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import openmeteo_requests
+import pandas as pd
+import pyarrow as pa
+import requests
+
+import forecast_data
+from forecast_client import ARROW_TYPE
+from groqAI_wrapper import AI
+from metrics import metrics
+from prefetch_scheduler import PrefetchScheduler
+
+HOST = "127.0.0.1"
+PORT = 8600
+# Requests handled at once - requests beyond this queue for a worker once they have been read
+WORKERS = 16
+# Most locations in one /forecast request (the comparison view asks for up to 20)
+MAX_LOCATIONS = 200
+# Largest request body accepted, in bytes
+MAX_BODY = 1024 * 1024
+# Seconds an idle kept-alive connection is kept open (only its connection thread waits, never a worker)
+IDLE_TIMEOUT = 30
+
+UPSTREAM_ERRORS = (openmeteo_requests.OpenMeteoRequestsError, requests.RequestException)
+
+def parse_forecast_request(body, mapping):
+    # Validate a /forecast request and return (graph_type, data, cities, start, end), raising ValueError if invalid
+    graph_type = body.get("graph")
+    if not isinstance(graph_type, str):
+        raise ValueError(f"'graph' must be one of {', '.join(forecast_data.GRAPH_TYPES)}")
+    if graph_type not in forecast_data.GRAPH_TYPES:
+        raise ValueError(f"'graph' must be one of {', '.join(forecast_data.GRAPH_TYPES)}")
+
+    choices = forecast_data.choices(mapping, graph_type)
+    data = body.get("data") or choices
+    if not isinstance(data, list):
+        raise ValueError("'data' must be a list of variable names")
+    unknown = [name for name in data if name not in choices]
+    if unknown:
+        raise ValueError(f"Unknown {graph_type} data: {', '.join(map(str, unknown))}")
+
+    locations = body.get("locations")
+    if not isinstance(locations, list) or not 1 <= len(locations) <= MAX_LOCATIONS:
+        raise ValueError(f"'locations' must be a list of between 1 and {MAX_LOCATIONS} [latitude, longitude] pairs")
+    if any(not isinstance(location, list) or len(location) != 2 for location in locations):
+        raise ValueError("'locations' must hold [latitude, longitude] pairs")
+    try:
+        cities = [[float(lat), float(lon)] for lat, lon in locations]
+    except (TypeError, ValueError):
+        raise ValueError("'locations' must hold [latitude, longitude] pairs")
+    if any(not (-90 <= lat <= 90 and -180 <= lon <= 180) for lat, lon in cities):
+        raise ValueError("Latitudes must be within -90 to 90 and longitudes within -180 to 180")
+
+    start, end = body.get("start"), body.get("end")
+    if graph_type == "Current":
+        return graph_type, list(data), cities, None, None
+    parse = date.fromisoformat if graph_type == "Daily" else datetime.fromisoformat
+    try:
+        if parse(start) > parse(end):
+            raise ValueError("'start' must not be after 'end'")
+    except TypeError:
+        raise ValueError(f"'start' and 'end' are required for {graph_type} data")
+    return graph_type, list(data), cities, start, end
+
+def to_arrow(dataframes):
+    # One Arrow IPC stream for every location, with a Location column saying which location each row belongs to
+    frames = [dataframe.assign(Location=pos) for pos, dataframe in enumerate(dataframes)]
+    table = pa.Table.from_pandas(pd.concat(frames, ignore_index=True), preserve_index=False)
+    table = table.replace_schema_metadata({**table.schema.metadata, b"locations": str(len(dataframes)).encode()})
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
+
+def to_json(dataframes, cities):
+    forecasts = [{"latitude": lat, "longitude": lon,
+                  **json.loads(dataframe.to_json(orient="split", date_format="iso", index=False))}
+                 for (lat, lon), dataframe in zip(cities, dataframes)]
+    return json.dumps({"forecasts": forecasts}).encode("utf-8")
+
+class ServiceHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    timeout = IDLE_TIMEOUT
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status, body, content_type="application/json"):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_response(self, code, message=None):
+        self._response_started = True
+        super().send_response(code, message)
+
+    def _send_json(self, status, data):
+        self._send(status, json.dumps(data).encode("utf-8"))
+
+    def _read_json(self):
+        length = int(self.headers.get("Content-Length", 0))
+        if length > MAX_BODY:
+            raise ValueError("Request body is too large")
+        try:
+            body = json.loads(self.rfile.read(length) or b"{}")
+        except json.JSONDecodeError:
+            raise ValueError("Request body must be JSON")
+        if not isinstance(body, dict):
+            raise ValueError("Request body must be a JSON object")
+        return body
+
+    def do_GET(self):
+        path = self.path.split("?")[0].rstrip("/")
+        if path == "/health":
+            self._send_json(200, {"status": "ok"})
+        elif path == "/model":
+            self._send_json(200, {"model": AI.get_model()})
+        elif path == "/metrics":
+            self._send_json(200, metrics.snapshot())
+        else:
+            self._send_json(404, {"error": "Not found"})
+
+    def do_POST(self):
+        self._response_started = False
+        path = self.path.split("?")[0].rstrip("/")
+        handlers = {"/forecast": self._forecast, "/summary": self._summary}
+        if path not in handlers:
+            # The unread body would be taken for the next request on this connection
+            self.close_connection = True
+            return self._send_json(404, {"error": "Not found"})
+        try:
+            # The body is read on this connection's thread and only the work is handed to the worker pool
+            self.server.run(handlers[path], self._read_json())
+        except ValueError as error:
+            self.close_connection = True
+            self._send_json(400, {"error": str(error)})
+        except UPSTREAM_ERRORS as error:
+            self._send_json(502, {"error": f"Upstream request failed: {error}"})
+        except Exception as error:
+            # Anything unexpected still gets a JSON answer (ForecastClient expects one) instead of a dropped connection
+            # A summary stream that already started can't change its status, so that connection is closed instead
+            self.close_connection = True
+            metrics.increment("service.errors")
+            if not self._response_started:
+                self._send_json(500, {"error": f"Internal error: {type(error).__name__}"})
+
+    def _forecast(self, body):
+        graph_type, data, cities, start, end = parse_forecast_request(body, self.server.mapping)
+        with metrics.span("service.forecast", graph=graph_type, locations=len(cities)):
+            dataframes = self.server.get_forecasts(graph_type, data, cities, start, end)
+
+        if ARROW_TYPE in self.headers.get("Accept", ""):
+            self._send(200, to_arrow(dataframes), ARROW_TYPE)
+        else:
+            self._send(200, to_json(dataframes, cities))
+
+    def _summary(self, body):
+        message = body.get("message")
+        if not message or not isinstance(message, str):
+            raise ValueError("'message' is required")
+        forecast = body.get("forecast") or {}
+        if not isinstance(forecast, dict):
+            raise ValueError("'forecast' must be a /forecast request")
+        graph_type, data, cities, start, end = parse_forecast_request(forecast, self.server.mapping)
+        if len(cities) != 1:
+            raise ValueError("A summary is of one location's forecast")
+
+        # Normally a cache hit, as the client has just fetched the same forecast
+        dataframe = self.server.get_forecasts(graph_type, data, cities, start, end)[0]
+        arguments = dict(message=message, city=body.get("city"), country=body.get("country"), dataframe=dataframe,
+                         session_id=body.get("session_id"))
+
+        if not body.get("stream"):
+            with metrics.span("service.summary", stream=False):
+                summary = AI.call_API(**arguments)
+            return self._send_json(200, {"summary": summary})
+
+        # Chunked transfer encoding, so each delta reaches the client as soon as Groq writes it
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; charset=utf-8")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        with metrics.span("service.summary", stream=True):
+            for delta in AI.stream_API(**arguments):
+                chunk = delta.encode("utf-8")
+                if chunk:
+                    self.wfile.write(f"{len(chunk):X}\r\n".encode("ascii") + chunk + b"\r\n")
+                    self.wfile.flush()
+        self.wfile.write(b"0\r\n\r\n")
+
+class ForecastService(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, host=HOST, port=PORT, workers=WORKERS, mapping=None, prefetch=True):
+        super().__init__((host, port), ServiceHandler)
+        self.mapping = mapping or forecast_data.load_mapping()
+        self._workers = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="service")
+        self._scheduler = PrefetchScheduler(self._refresh).start() if prefetch else None
+
+    def run(self, handler, body):
+        # Each connection has a thread that waits for its requests, but the requests are handled on the bounded
+        # worker pool, so idle kept-alive connections (e.g. a ForecastClient's pool) never hold up other clients
+        return self._workers.submit(handler, body).result()
+
+    def _refresh(self, graph_type, data, start, end, locations):
+        forecast_data.get_weatherAPI_responses(data, locations, graph_type, self.mapping, start, end)
+
+    def get_forecasts(self, graph_type, data, cities, start, end):
+        # Every request counts towards the popularity of its locations, so the popular ones are kept warm
+        if self._scheduler is not None:
+            for lat, lon in cities:
+                self._scheduler.record(lat, lon, graph_type, data, start, end)
+        return forecast_data.get_weatherAPI_responses(data, cities, graph_type, self.mapping, start, end)
+
+    @property
+    def base_url(self):
+        return f"http://{self.server_address[0]}:{self.server_address[1]}"
+
+    def server_close(self):
+        super().server_close()
+        if self._scheduler is not None:
+            self._scheduler.stop()
+        self._workers.shutdown(wait=False)
+
+def main():
+    parser = argparse.ArgumentParser(description="Forecast and AI summary service for the dashboard")
+    parser.add_argument("--host", default=HOST)
+    parser.add_argument("--port", type=int, default=PORT)
+    parser.add_argument("--workers", type=int, default=WORKERS, help="requests handled at once")
+    args = parser.parse_args()
+
+    server = ForecastService(args.host, args.port, args.workers)
+    print(f"Forecast service: {server.base_url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+if __name__ == "__main__":
+    main()
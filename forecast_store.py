@@ -0,0 +1,169 @@
+"""
+The purpose of this python file is to keep a local columnar (Parquet) archive of past forecast hours and days.
+
+Data is partitioned by graph type, grid cell location and variable:
+    .forecast_store/<hourly|daily>/<lat>_<lon>/<variable>/part-<time>-<id>.parquet
+Only time steps that are already in the past (older than HISTORICAL_AFTER) are archived, as they no longer change
+between model runs, and each write only appends the time steps that are not stored yet as a new part file. A small
+index.json next to the parts records the stored date ranges, so writes and reads of uncovered windows never have to
+open the parts, and once a variable has more than MAX_PARTS parts they are compacted into one sorted file.
+Requested windows that lie entirely in the past are then read back from the memory-mapped files instead of being
+downloaded again.
+"""
+
+import json, time, uuid
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+from pathlib import Path
+from threading import Lock
+
+STORE_DIR = Path(__file__).parent / '.forecast_store'
+# Time steps older than this are treated as final and archived
+HISTORICAL_AFTER = pd.Timedelta(days=1)
+# Parts a variable may have before they are rewritten as one file
+MAX_PARTS = 8
+INDEX_FILE = "index.json"
+
+_STORED_TYPES = ("Hourly", "Daily")
+# Nanoseconds between consecutive time steps, so that touching ranges can be merged
+_STEPS = {"Hourly": pd.Timedelta(hours=1).value, "Daily": pd.Timedelta(days=1).value}
+# Writes (index updates and compaction) of this process are made one at a time
+_write_lock = Lock()
+
+def _location_dir(lat, lon, graph_type):
+    return STORE_DIR / graph_type.lower() / f"{lat:.4f}_{lon:.4f}"
+
+def _variable_dir(lat, lon, graph_type, column):
+    return _location_dir(lat, lon, graph_type) / column.lower().replace(" ", "_")
+
+def _historical_cutoff():
+    return pd.Timestamp.now(tz="UTC") - HISTORICAL_AFTER
+
+def _to_ns(dates):
+    # Nanoseconds since the epoch (UTC) of a Series of dates
+    return dates.to_numpy(dtype="datetime64[ns]").view("int64")
+
+def _ranges(dates, step):
+    # Sorted dates (ns) as [first, last] runs of consecutive time steps
+    if len(dates) == 0:
+        return []
+    breaks = np.flatnonzero(np.diff(dates) > step)
+    starts = np.concatenate(([0], breaks + 1))
+    ends = np.concatenate((breaks, [len(dates) - 1]))
+    return [[int(dates[first]), int(dates[last])] for first, last in zip(starts, ends)]
+
+def _merge(ranges, step):
+    merged = []
+    for first, last in sorted(ranges):
+        if merged and first <= merged[-1][1] + step:
+            merged[-1][1] = max(merged[-1][1], last)
+        else:
+            merged.append([first, last])
+    return merged
+
+def _parts(variable_dir):
+    return sorted(variable_dir.glob("part-*.parquet"))
+
+def _read_parts(parts):
+    # All parts of a variable as one Arrow table sorted by date, memory-mapping each file
+    table = pa.concat_tables([pq.read_table(part, memory_map=True) for part in parts])
+    return table if len(parts) == 1 else table.take(pc.sort_indices(table, [("Date", "ascending")]))
+
+def _load_index(variable_dir, step):
+    # {"ranges": [[first, last], ...], "parts": n}, rebuilt from the parts if they were written without an index
+    index_path = variable_dir / INDEX_FILE
+    if index_path.exists():
+        return json.loads(index_path.read_text())
+    parts = _parts(variable_dir)
+    if not parts:
+        return {"ranges": [], "parts": 0}
+    dates = _to_ns(_read_parts(parts).column("Date").to_pandas())
+    return {"ranges": _ranges(dates, step), "parts": len(parts)}
+
+def _save_index(variable_dir, index):
+    # Written to a temporary file first so a crash never leaves a half-written index
+    tmp_path = variable_dir / (INDEX_FILE + ".tmp")
+    tmp_path.write_text(json.dumps(index))
+    tmp_path.replace(variable_dir / INDEX_FILE)
+
+def _write_part(variable_dir, table):
+    pq.write_table(table, variable_dir / f"part-{time.time_ns()}-{uuid.uuid4().hex[:8]}.parquet")
+
+def _compact(variable_dir):
+    # Rewrite every part as one sorted file - the new file is written before the old ones are removed
+    parts = _parts(variable_dir)
+    _write_part(variable_dir, _read_parts(parts))
+    for part in parts:
+        part.unlink()
+
+def write(lat, lon, graph_type, dataframe):
+    # Append the historical rows of each column of the DataFrame that are not stored yet
+    if graph_type not in _STORED_TYPES or dataframe.empty:
+        return
+
+    historical = dataframe[dataframe["Date"] < _historical_cutoff()]
+    if historical.empty:
+        return
+
+    step = _STEPS[graph_type]
+    dates = _to_ns(historical["Date"])
+    with _write_lock:
+        for column in historical.columns.drop("Date"):
+            variable_dir = _variable_dir(lat, lon, graph_type, column)
+            index = _load_index(variable_dir, step)
+            new = np.ones(len(dates), dtype=bool)
+            for first, last in index["ranges"]:
+                new &= (dates < first) | (dates > last)
+            if not new.any():
+                continue
+
+            variable_dir.mkdir(parents=True, exist_ok=True)
+            _write_part(variable_dir, pa.table({"Date": historical["Date"].to_numpy()[new],
+                                                "value": historical[column].to_numpy(dtype="float32")[new]}))
+            index = {"ranges": _merge(index["ranges"] + _ranges(np.sort(dates[new]), step), step),
+                     "parts": index["parts"] + 1}
+            if index["parts"] > MAX_PARTS:
+                _compact(variable_dir)
+                index["parts"] = 1
+            _save_index(variable_dir, index)
+
+def read(lat, lon, graph_type, columns, start, end):
+    # Return a DataFrame (Date + columns) for the window if it is entirely historical and fully stored, otherwise None
+    # 'start' and 'end' are the naive local date/time strings that the dashboard sends to the API
+    if graph_type not in _STORED_TYPES or start is None:
+        return None
+
+    start, end = pd.Timestamp(start).tz_localize("UTC"), pd.Timestamp(end).tz_localize("UTC")
+    if end >= _historical_cutoff():
+        return None
+
+    if graph_type == "Hourly":
+        expected = pd.date_range(start, end, freq="h")
+    else:
+        expected = pd.date_range(start.normalize(), end.normalize(), freq="D")
+    first, last = expected[0].value, expected[-1].value
+
+    data = {}
+    for column in columns:
+        variable_dir = _variable_dir(lat, lon, graph_type, column)
+        # The index says whether the window is stored, without opening any part
+        if not any(low <= first and last <= high for low, high in _load_index(variable_dir, _STEPS[graph_type])["ranges"]):
+            return None
+        try:
+            table = _read_parts(_parts(variable_dir))
+        except (FileNotFoundError, ValueError):
+            # Compacted by another thread between listing and reading the parts (or nothing left to read)
+            return None
+        dates = table.column("Date")
+        table = table.filter(pc.and_(pc.greater_equal(dates, pa.scalar(expected[0])), pc.less_equal(dates, pa.scalar(expected[-1]))))
+        if len(table) < len(expected):
+            return None
+        # Parquet pages are decoded into new buffers however the file is opened, so each column is copied once here
+        if not data:
+            data["Date"] = table.column("Date").to_pandas()
+        data[column] = table.column("value").to_numpy()
+
+    return pd.DataFrame(data)
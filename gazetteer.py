@@ -0,0 +1,180 @@
+"""
+The purpose of this python file is to turn the cities500.json file into a compact binary gazetteer that can be memory-mapped.
+
+Parsing the JSON file on every cold start costs seconds of CPU and hundreds of MB of memory per Streamlit process,
+whereas the binary file is built once and then shared between every worker process through the OS page cache.
+
+The file can be (re)built manually with: python gazetteer.py
+"""
+
+import json, mmap, struct
+import numpy as np
+from pathlib import Path
+
+CITIES_FILE = 'cities500.json'
+GAZETTEER_FILE = 'cities500.gaz'
+
+# File layout (little-endian, every section starts on an 8 byte boundary):
+#   header        -> magic, version, number of cities, number of countries, number of interned names, size of name blob
+#   countries     -> (country code, first city, last city + 1) sorted by country code
+#   lat, lon      -> float32 arrays, one entry per city
+#   population    -> uint32 array, one entry per city
+#   name ids      -> uint32 array pointing each city at its interned name
+#   name offsets  -> uint32 array (number of names + 1) of byte offsets into the name blob
+#   name blob     -> UTF-8 encoded interned names
+# Cities are sorted by country code and then by name, so each country is one contiguous slice of every array
+_MAGIC = b'PWDGAZ\x00\x00'
+_VERSION = 1
+_HEADER = struct.Struct('<8sIIIII')
+_COUNTRY_DTYPE = np.dtype([('code', 'S2'), ('start', '<u4'), ('end', '<u4')])
+_ALIGNMENT = 8
+
+def _padding(size):
+    # Number of bytes needed to move the next section onto the alignment boundary
+    return -size % _ALIGNMENT
+
+def build(json_file, gaz_file):
+    # Convert the cities JSON list into the binary gazetteer format described above
+    with open(json_file, "r", encoding="utf-8") as f:
+        json_list = json.load(f)
+
+    records = sorted(
+        ((city["country"], city["name"], float(city["lat"]), float(city["lon"]), int(city.get("pop") or 0)) for city in json_list),
+        key=lambda record: (record[0], record[1])
+    )
+
+    # Intern names so that common names (e.g. Springfield) are only stored once
+    name_ids = {}
+    name_id_array = np.empty(len(records), dtype='<u4')
+    for pos, record in enumerate(records):
+        name_id_array[pos] = name_ids.setdefault(record[1], len(name_ids))
+
+    encoded_names = [name.encode("utf-8") for name in name_ids]
+    name_offsets = np.zeros(len(encoded_names) + 1, dtype='<u4')
+    np.cumsum([len(name) for name in encoded_names], out=name_offsets[1:])
+    name_blob = b"".join(encoded_names)
+
+    # Country offset index - one (start, end) slice per country code
+    country_rows = []
+    for pos, record in enumerate(records):
+        if country_rows and country_rows[-1][0] == record[0]:
+            country_rows[-1][2] = pos + 1
+        else:
+            country_rows.append([record[0], pos, pos + 1])
+    countries = np.array([(code.encode("ascii"), start, end) for code, start, end in country_rows], dtype=_COUNTRY_DTYPE)
+
+    sections = [
+        countries.tobytes(),
+        np.array([record[2] for record in records], dtype='<f4').tobytes(),
+        np.array([record[3] for record in records], dtype='<f4').tobytes(),
+        np.array([record[4] for record in records], dtype='<u4').tobytes(),
+        name_id_array.tobytes(),
+        name_offsets.tobytes(),
+        name_blob
+    ]
+
+    # Write to a temporary file first so that a running dashboard never maps a half-written file
+    tmp_file = Path(gaz_file).with_suffix('.tmp')
+    with open(tmp_file, "wb") as f:
+        f.write(_HEADER.pack(_MAGIC, _VERSION, len(records), len(countries), len(encoded_names), len(name_blob)))
+        f.write(b"\x00" * _padding(_HEADER.size))
+        for section in sections:
+            f.write(section)
+            f.write(b"\x00" * _padding(len(section)))
+    tmp_file.replace(gaz_file)
+
+class Gazetteer:
+    # Read-only view over a memory-mapped gazetteer file
+    # Every array below is a numpy view straight onto the mapped pages, so nothing is copied at load time
+    def __init__(self, gaz_file):
+        with open(gaz_file, "rb") as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, version, n_cities, n_countries, n_names, blob_size = _HEADER.unpack_from(self._mmap, 0)
+        if magic != _MAGIC or version != _VERSION:
+            raise ValueError(f"{gaz_file} is not a version {_VERSION} gazetteer file")
+
+        offset = _HEADER.size + _padding(_HEADER.size)
+        def section(dtype, count):
+            nonlocal offset
+            array = np.frombuffer(self._mmap, dtype=dtype, count=count, offset=offset)
+            offset += array.nbytes + _padding(array.nbytes)
+            return array
+
+        self.countries = section(_COUNTRY_DTYPE, n_countries)
+        self.lat = section('<f4', n_cities)
+        self.lon = section('<f4', n_cities)
+        self.population = section('<u4', n_cities)
+        self.name_ids = section('<u4', n_cities)
+        self._name_offsets = section('<u4', n_names + 1)
+        self._name_blob_start = offset
+
+        # Per-country index of name -> row and pre-sorted name lists, filled in the first time a country is looked up
+        self._country_index = {}
+        self._country_names = {}
+
+    def __len__(self):
+        return len(self.lat)
+
+    def name(self, pos):
+        # Decode the name of the city at the given row
+        name_id = self.name_ids[pos]
+        start = self._name_blob_start + int(self._name_offsets[name_id])
+        end = self._name_blob_start + int(self._name_offsets[name_id + 1])
+        return self._mmap[start:end].decode("utf-8")
+
+    def country_slice(self, country_code):
+        # Get the (start, end) rows of a country through a binary search of the sorted country index
+        code = country_code.encode("ascii")
+        pos = np.searchsorted(self.countries['code'], code)
+        if pos < len(self.countries) and self.countries['code'][pos] == code:
+            return int(self.countries['start'][pos]), int(self.countries['end'][pos])
+        return 0, 0
+
+    def country_code(self, pos):
+        # Get the country code of the city at the given row from the country offset index
+        country = np.searchsorted(self.countries['end'], pos, side='right')
+        return self.countries['code'][country].decode("ascii")
+
+    def country_index(self, country_code):
+        # Map each city name of a country to its row
+        # Rows are already sorted by name, so the dictionary keeps that order and needs no sorting here
+        # Duplicate names in a country (e.g. Springfield, US) resolve to the most populous city
+        index = self._country_index.get(country_code)
+        if index is None:
+            index = {}
+            start, end = self.country_slice(country_code)
+            for pos in range(start, end):
+                name = self.name(pos)
+                if name not in index or self.population[pos] > self.population[index[name]]:
+                    index[name] = pos
+            self._country_names[country_code] = tuple(index)
+            self._country_index[country_code] = index
+        return index
+
+    def country_cities(self, country_code):
+        # Pre-sorted tuple of unique city names for a country
+        if country_code not in self._country_names:
+            self.country_index(country_code)
+        return self._country_names[country_code]
+
+    def find(self, name, country_code):
+        # Get the row of a city from its name and country code, or None if it doesn't exist
+        return self.country_index(country_code).get(name)
+
+    def city(self, pos):
+        # Same [lat, lon, name] shape that the dashboard has always passed around for a chosen city
+        return [float(self.lat[pos]), float(self.lon[pos]), self.name(pos)]
+
+def load(config_dir):
+    # Memory-map the gazetteer, building it first if it is missing or older than the cities JSON file
+    json_file = Path(config_dir) / CITIES_FILE
+    gaz_file = Path(config_dir) / GAZETTEER_FILE
+    if not gaz_file.exists() or (json_file.exists() and json_file.stat().st_mtime > gaz_file.stat().st_mtime):
+        build(json_file, gaz_file)
+    return Gazetteer(gaz_file)
+
+if __name__ == "__main__":
+    config_dir = Path(__file__).parent / 'config'
+    build(config_dir / CITIES_FILE, config_dir / GAZETTEER_FILE)
+    print(f"Built {config_dir / GAZETTEER_FILE} with {len(Gazetteer(config_dir / GAZETTEER_FILE))} cities")
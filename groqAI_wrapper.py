@@ -1,6 +1,9 @@
-import tomllib, requests
+import tomllib, json, os
 from pathlib import Path
-from threading import Timer
+import summary_cache, prompt_builder, shared_backend
+from groq_client import GroqClient, TRANSPORT_ERRORS
+from metrics import metrics
+from rate_limiter import MODEL_LIMITS, RateLimiter, parse_duration
 
 class AI:
     # Protected class attributeswhat
@@ -12,15 +15,28 @@ class AI:
     _DAILY_LIMIT_REACHED = "You have reached your daily rate limit of AI responses.\nFor more summaries, please return in 24 hours."
     _MIN_LIMIT_REACHED = "You have reached your minute rate limit of AI responses.\nFor more summaries, please wait 1 minute and then refresh."
     _UNRESOLVABLE_ISSUE = "Sorry! There are currently issues with the Groq API, and so a summary could not be provided."
-    _MODEL_CHANGE = True
+    _ROUTE_AGAIN = True
     _FALLBACK_MODEL = "llama-3.1-8b-instant"
     _NORMAL_MODEL = "llama-3.3-70b-versatile"
-    _CURRENT_MODEL = _NORMAL_MODEL
+    # Tokens reserved for the summary itself on top of the prompt, as the TPM limit counts both
+    _OUTPUT_TOKEN_ESTIMATE = 500
+    # How long a model is avoided after a 429 that doesn't say when to retry
+    _RATE_LIMIT_BACKOFF = 60
+    # Can be pointed elsewhere (e.g. the benchmarks' replay server) with the GROQ_URL environment variable
+    _URL = os.environ.get("GROQ_URL", "https://api.groq.com/openai/v1/responses")
+    _SUMMARY_CACHE = summary_cache.SummaryCache()
+    # Pooled keep-alive connections shared by every session, with timeouts and retries on 5xx responses
+    # HTTP/2 is only used if httpx[http2] is installed
+    _CLIENT = GroqClient(http2=True)
+    # Client-side token buckets (per model) and router, normal model preferred over the fallback model
+    # (the order and limits of rate_limiter.MODEL_LIMITS)
+    # The buckets are shared by every worker process when a shared backend is configured
+    _LIMITER = RateLimiter(MODEL_LIMITS, backend=shared_backend.backend)
 
-    # Returns the current model in use so user can know what AI they're using
-    @classmethod
-    def get_model(cls):
-        return cls._CURRENT_MODEL
+    # Returns the model the next request would be routed to so user can know what AI they're using
+    @staticmethod
+    def get_model():
+        return AI._LIMITER.preview()
 
     # Returns appropriate response after error-checking API response
     @staticmethod
@@ -28,47 +44,143 @@ class AI:
         if response.ok:
             return response.json()['output'][1]['content'][0]['text']
         elif response.status_code == 429:
+            # Requests per min (RPM) or tokens per min (TPM) limits can be routed around, daily limits can't
             if any(error in response.json()['error']['message'] for error in ('(RPM)', '(TPM)')):
-                if AI._CURRENT_MODEL == AI._NORMAL_MODEL:
-                    AI._CURRENT_MODEL = AI._FALLBACK_MODEL
-                    Timer(60, AI.reset_model).start()
-                    return AI._MODEL_CHANGE
-                else:
-                    return AI._MIN_LIMIT_REACHED
+                metrics.increment("groq.rate_limited")
+                return AI._ROUTE_AGAIN
             else:
+                metrics.increment("groq.daily_limit")
                 return AI._DAILY_LIMIT_REACHED
         else:
             return AI._UNRESOLVABLE_ISSUE
 
-    # Method called on separate thread when requests per min (RPM) or token per min (TPM) are maxed for normal model
+    # Sends message to Groq API, unless the same summary was asked for recently (or is being asked for right now)
+    # session_id lets the rate limiter queue requests fairly between dashboard sessions
+    @staticmethod
+    def call_API(message, city, country, dataframe, session_id=None):
+        # Looked up under the model the request would go to now, stored under the model that wrote the summary
+        key = lambda model: summary_cache.summary_key(model, message, city, country, dataframe)
+        def send():
+            summary, model = AI._send(message, city, country, dataframe, session_id)
+            return summary, model and key(model)
+        return AI._SUMMARY_CACHE.get_or_call(key(AI.get_model()), send)
+
+    # Same as call_API, but returns a generator of text deltas so the summary can be shown as it is written
     @staticmethod
-    def reset_model():
-        AI._CURRENT_MODEL = AI._NORMAL_MODEL
+    def stream_API(message, city, country, dataframe, session_id=None):
+        key = lambda model: summary_cache.summary_key(model, message, city, country, dataframe)
+        def stream():
+            model = yield from AI._stream(message, city, country, dataframe, session_id)
+            return model and key(model)
+        return AI._SUMMARY_CACHE.get_or_stream(key(AI.get_model()), stream)
 
-    # Sends message to Groq API
+    # Builds the URL, headers and JSON body of a Groq Responses API request
     @staticmethod
-    def call_API(message, city, country, dataframe):
-        url = "https://api.groq.com/openai/v1/responses"
+    def _build_request(message, city, country, dataframe):
+        url = AI._URL
         headers = {
             "Content-Type": "application/json",
             "Authorization": f"Bearer {AI._API_FILE['GROQ_API_KEY']}"
         }
         # input is the message sent to the AI on behalf of the user
         # instructions are the prior details sent to the AI to set its tone for the user and what it needs to do
+        # The model is filled in by the rate limiter's router just before the request is sent
         json_data = {
-            "model": AI._CURRENT_MODEL,
-            "input": f'Country: {country}, City: {city}\nContext: {message}\nData:\n\n{dataframe.to_string()}',
-            "instructions": "You are a weather forecast analyst that summarises data in Python Pandas DataFrames to the common person. This person will provide the data in the message (wind speed in mph and snowfall in cm) as well as the: city, country and context for their personalised summary. You should not ask any further questions and only provide a personalised summary with the data given."
+            "input": f'Country: {country}, City: {city}\nContext: {message}\nData:\n\n{prompt_builder.build_data_section(dataframe)}',
+            "instructions": "You are a weather forecast analyst that summarises weather data to the common person. The data is given as summary statistics followed by CSV rows, which may be reduced to key times to keep it short. This person will provide the data in the message (wind speed in mph and snowfall in cm) as well as the: city, country and context for their personalised summary. You should not ask any further questions and only provide a personalised summary with the data given."
         }
+        return url, headers, json_data
 
-        response = requests.post(url, headers=headers, json=json_data)
+    # Waits for the rate limiter to route the request to a model and sends it (stream or not)
+    # Returns (model, response), or (None, None) if every model stays limited for too long
+    @staticmethod
+    def _post(url, headers, json_data, session_id, stream=False):
+        tokens = prompt_builder.estimate_tokens(json_data["input"] + json_data["instructions"]) + AI._OUTPUT_TOKEN_ESTIMATE
+        with metrics.span("groq.queue_wait"):
+            model = AI._LIMITER.acquire(tokens, session_id)
+        if model is None:
+            metrics.increment("groq.queue_timeout")
+            return None, None
+        if model != AI._NORMAL_MODEL:
+            metrics.increment("groq.fallback")
 
-        result = AI.get_response(response)
-    
-        # If model changed due to rate limits, retry with new model
-        if result == AI._MODEL_CHANGE:
-            json_data["model"] = AI._CURRENT_MODEL  # Update to fallback model
-            response = requests.post(url, headers=headers, json=json_data)
-            return AI.get_response(response)
-        
-        return result
\ No newline at end of file
+        json_data["model"] = model
+        with metrics.span("groq.request", model=model, stream=stream):
+            response = AI._CLIENT.post(url, headers, json_data, stream=stream)
+        AI._LIMITER.update(model, response.headers)
+        return model, response
+
+    # Avoids a model that returned a 429 until it says it can be retried
+    @staticmethod
+    def _back_off(model, response):
+        AI._LIMITER.block(model, parse_duration(response.headers.get("retry-after")) or AI._RATE_LIMIT_BACKOFF)
+
+    # Returns (summary, model that wrote it) - the model is None for error messages, as only summaries are cached
+    @staticmethod
+    def _send(message, city, country, dataframe, session_id=None):
+        url, headers, json_data = AI._build_request(message, city, country, dataframe)
+
+        # If the limits were hit anyway (e.g. by another app on the same key), route once more with updated limits
+        for _ in range(2):
+            try:
+                model, response = AI._post(url, headers, json_data, session_id)
+            except TRANSPORT_ERRORS:
+                return AI._UNRESOLVABLE_ISSUE, None
+            if response is None:
+                return AI._MIN_LIMIT_REACHED, None
+
+            result = AI.get_response(response)
+            if result != AI._ROUTE_AGAIN:
+                return result, model if response.ok else None
+            AI._back_off(model, response)
+
+        return AI._MIN_LIMIT_REACHED, None
+
+    # Generator of text deltas from a streamed response, returning the model that wrote it (None if it can't be cached)
+    # Rate limits are reported before any text is streamed, so the same routing logic as _send applies
+    @staticmethod
+    def _stream(message, city, country, dataframe, session_id=None):
+        url, headers, json_data = AI._build_request(message, city, country, dataframe)
+        json_data["stream"] = True
+
+        for _ in range(2):
+            try:
+                model, response = AI._post(url, headers, json_data, session_id, stream=True)
+            except TRANSPORT_ERRORS:
+                yield AI._UNRESOLVABLE_ISSUE
+                return None
+            if response is None:
+                yield AI._MIN_LIMIT_REACHED
+                return None
+            if response.ok:
+                break
+
+            result = AI.get_response(response)
+            if result != AI._ROUTE_AGAIN:
+                yield result
+                return None
+            AI._back_off(model, response)
+        else:
+            yield AI._MIN_LIMIT_REACHED
+            return None
+
+        # Server-sent events - each 'data:' line holds one JSON event
+        try:
+            with response:
+                for line in response.iter_lines(decode_unicode=True):
+                    if not line or not line.startswith("data:"):
+                        continue
+                    data = line.removeprefix("data:").strip()
+                    if data == "[DONE]":
+                        break
+                    event = json.loads(data)
+                    if event.get("type") == "response.output_text.delta":
+                        yield event["delta"]
+                    elif event.get("type") in ("response.failed", "error"):
+                        yield AI._UNRESOLVABLE_ISSUE
+                        return None
+        except TRANSPORT_ERRORS:
+            # The connection dropped or timed out part way through the summary
+            yield AI._UNRESOLVABLE_ISSUE
+            return None
+        return model
\ No newline at end of file
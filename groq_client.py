@@ -0,0 +1,184 @@
+"""
+The purpose of this python file is to send Groq requests over a shared pool of kept-alive connections.
+
+One client is shared by every session and thread, so prompts reuse open TCP/TLS connections instead of paying a new
+handshake each time. Requests have connect/read timeouts, failures to connect and 5xx responses are retried with
+jittered exponential backoff, and HTTP/2 is used when httpx (with h2) is installed and asked for. Every attempt is
+recorded with its latency and whether it had to open a new connection, so connection setup cost can be measured.
+"""
+
+import random, threading, time
+from collections import deque, namedtuple
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from urllib3.exceptions import NewConnectionError
+import fetch_pool
+from metrics import metrics
+
+try:
+    import httpx
+except ImportError:
+    httpx = None
+
+# Seconds to open a connection / to wait between bytes of the response
+CONNECT_TIMEOUT = 5
+READ_TIMEOUT = 60
+RETRIES = 3
+BACKOFF_FACTOR = 0.5
+RETRY_STATUSES = (500, 502, 503, 504)
+# One kept-alive connection per worker that can be talking to Groq at once
+POOL_SIZE = fetch_pool.AI_WORKERS
+# Number of recent attempts kept for the latency metrics
+HISTORY = 500
+
+# latency is the time until the response headers arrived (streamed bodies are read afterwards)
+# new_connection is None when it can't be told (HTTP/2 client), status is None if the attempt failed to connect
+Attempt = namedtuple("Attempt", ["started", "latency", "status", "new_connection", "retry"])
+
+TRANSPORT_ERRORS = (requests.RequestException,) + ((httpx.HTTPError,) if httpx else ())
+
+# Set by the connections of this thread when they connect, so an attempt knows whether it opened a connection
+_connecting = threading.local()
+
+def _not_sent(error):
+    # Whether a failed attempt never reached Groq, so it can be retried without Groq generating (and charging for)
+    # the same response twice - requests wraps urllib3's NewConnectionError in a MaxRetryError in a ConnectionError
+    if isinstance(error, requests.ConnectTimeout) or (httpx is not None and isinstance(error, httpx.ConnectError)):
+        return True
+    # Follow the wrapped errors down (a few levels are all requests/urllib3 ever use)
+    for _ in range(5):
+        if isinstance(error, NewConnectionError):
+            return True
+        wrapped = getattr(error, "reason", None) or (error.args[0] if error.args else None)
+        if not isinstance(wrapped, BaseException):
+            break
+        error = wrapped
+    return False
+
+class _TrackedHTTPConnection(HTTPConnection):
+    def connect(self):
+        _connecting.opened = True
+        super().connect()
+
+class _TrackedHTTPSConnection(HTTPSConnection):
+    def connect(self):
+        _connecting.opened = True
+        super().connect()
+
+class _TrackedHTTPConnectionPool(HTTPConnectionPool):
+    ConnectionCls = _TrackedHTTPConnection
+
+class _TrackedHTTPSConnectionPool(HTTPSConnectionPool):
+    ConnectionCls = _TrackedHTTPSConnection
+
+class _TrackedAdapter(HTTPAdapter):
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {"http": _TrackedHTTPConnectionPool,
+                                                   "https": _TrackedHTTPSConnectionPool}
+
+class _HTTPXResponse:
+    # Gives an httpx response the parts of the requests.Response interface the AI client uses
+    def __init__(self, response):
+        self._response = response
+        self.status_code = response.status_code
+        self.headers = response.headers
+        self.ok = response.is_success
+
+    def json(self):
+        self._response.read()
+        return self._response.json()
+
+    def iter_lines(self, decode_unicode=True):
+        return self._response.iter_lines()
+
+    def close(self):
+        self._response.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+class GroqClient:
+    def __init__(self, connect_timeout=CONNECT_TIMEOUT, read_timeout=READ_TIMEOUT, retries=RETRIES,
+                 backoff_factor=BACKOFF_FACTOR, pool_size=POOL_SIZE, http2=False):
+        self._retries = retries
+        self._backoff_factor = backoff_factor
+        self._attempts = deque(maxlen=HISTORY)
+        self._lock = threading.Lock()
+
+        # HTTP/2 multiplexes every request over one connection, but needs httpx with the h2 extra
+        self.http2 = False
+        if http2 and httpx is not None:
+            try:
+                self._httpx = httpx.Client(http2=True, timeout=httpx.Timeout(read_timeout, connect=connect_timeout),
+                                           limits=httpx.Limits(max_connections=pool_size))
+                self.http2 = True
+            except ImportError:
+                pass
+
+        if not self.http2:
+            self._timeout = (connect_timeout, read_timeout)
+            self._session = requests.Session()
+            adapter = _TrackedAdapter(pool_connections=1, pool_maxsize=pool_size)
+            self._session.mount("https://", adapter)
+            self._session.mount("http://", adapter)
+
+    def _send_once(self, url, headers, json, stream):
+        if self.http2:
+            request = self._httpx.build_request("POST", url, headers=headers, json=json)
+            return _HTTPXResponse(self._httpx.send(request, stream=stream))
+        return self._session.post(url, headers=headers, json=json, stream=stream, timeout=self._timeout)
+
+    def _record(self, started, status, new_connection, retry):
+        with self._lock:
+            self._attempts.append(Attempt(started, time.monotonic() - started, status, new_connection, retry))
+        if retry:
+            metrics.increment("groq.retries")
+        if new_connection:
+            metrics.increment("groq.new_connections")
+
+    def _backoff(self, retry):
+        # Full jitter - a random wait up to the exponential backoff, so clients that failed together don't retry together
+        time.sleep(random.uniform(0, self._backoff_factor * 2 ** retry))
+
+    def post(self, url, headers, json, stream=False):
+        # Same as requests.post, with failures to connect and 5xx responses retried
+        # Failures after the request may have been sent (read timeouts, a kept-alive connection dropped by the server,
+        # a response cut off) are not retried as Groq may already be generating (and charging for) the response,
+        # and a retry would be a request that the rate limiter never counted
+        for retry in range(self._retries + 1):
+            _connecting.opened = False
+            started = time.monotonic()
+            try:
+                response = self._send_once(url, headers, json, stream)
+            except (requests.ConnectionError,) + ((httpx.ConnectError,) if httpx else ()) as error:
+                self._record(started, None, True, retry)
+                if retry == self._retries or not _not_sent(error):
+                    raise
+                self._backoff(retry)
+                continue
+
+            self._record(started, response.status_code, None if self.http2 else _connecting.opened, retry)
+            if response.status_code not in RETRY_STATUSES or retry == self._retries:
+                return response
+            response.close()
+            self._backoff(retry)
+
+    def attempts(self):
+        with self._lock:
+            return list(self._attempts)
+
+    def latency_summary(self):
+        # Mean latency of attempts on new vs reused connections - the difference is the connection setup cost
+        attempts = [attempt for attempt in self.attempts() if attempt.status is not None]
+        summary = {"attempts": len(attempts), "retries": sum(attempt.retry > 0 for attempt in attempts)}
+        for label, new_connection in (("new_connection", True), ("reused_connection", False)):
+            latencies = [attempt.latency for attempt in attempts if attempt.new_connection is new_connection]
+            summary[label] = {"count": len(latencies),
+                              "mean_latency": sum(latencies) / len(latencies) if latencies else None}
+        return summary
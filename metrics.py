@@ -0,0 +1,114 @@
+"""
+The purpose of this python file is to time the dashboard's hot paths and count cache, retry and rate limit events.
+
+Code is wrapped in spans (with metrics.span("name"): ...), which record how long it took, and events are counted
+with metrics.increment("name"). Totals are kept per process and the spans of the current Streamlit rerun are also
+kept per script thread, so the optional debug panel can show where this rerun's time went. Every span and counter
+is also appended to a JSONL file when METRICS_LOG is set, and the totals are served as JSON on
+http://127.0.0.1:<METRICS_PORT>/metrics when METRICS_PORT is set, so they can be scraped.
+"""
+
+import json, os, threading, time
+from collections import defaultdict
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+METRICS_LOG = os.environ.get("METRICS_LOG")
+METRICS_PORT = os.environ.get("METRICS_PORT")
+
+class _Timing:
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, seconds):
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+
+    def as_dict(self):
+        return {"count": self.count, "total": self.total, "mean": self.total / self.count if self.count else 0.0, "max": self.max}
+
+class Metrics:
+    def __init__(self, log_path=METRICS_LOG):
+        self._counters = defaultdict(int)
+        self._timings = defaultdict(_Timing)
+        self._lock = threading.Lock()
+        self._run = threading.local()
+        self._log = open(log_path, "a", buffering=1, encoding="utf-8") if log_path else None
+        self._server = None
+
+    def _write(self, record):
+        if self._log is not None:
+            with self._lock:
+                self._log.write(json.dumps(record) + "\n")
+
+    def increment(self, name, amount=1):
+        if not amount:
+            return
+        with self._lock:
+            self._counters[name] += amount
+        self._write({"time": time.time(), "type": "counter", "name": name, "amount": amount})
+
+    @contextmanager
+    def span(self, name, **labels):
+        # Times the block, even when it raises
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            seconds = time.perf_counter() - start
+            with self._lock:
+                self._timings[name].add(seconds)
+            spans = getattr(self._run, "spans", None)
+            if spans is not None:
+                spans.append({"name": name, "seconds": seconds, **labels})
+            self._write({"time": time.time(), "type": "span", "name": name, "seconds": seconds, **labels})
+
+    def begin_run(self):
+        # Start collecting the spans of this thread (a Streamlit rerun runs on one script thread)
+        self._run.spans = []
+
+    def run_spans(self):
+        return list(getattr(self._run, "spans", None) or [])
+
+    def snapshot(self):
+        with self._lock:
+            return {"counters": dict(self._counters),
+                    "timings": {name: timing.as_dict() for name, timing in self._timings.items()}}
+
+    def serve(self, port):
+        # Serve the snapshot as JSON on 127.0.0.1:port (once per process)
+        if self._server is not None:
+            return self._server
+        registry = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, format, *args):
+                pass
+
+            def do_GET(self):
+                if self.path.rstrip("/") != "/metrics":
+                    self.send_error(404)
+                    return
+                body = json.dumps(registry.snapshot()).encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+        try:
+            self._server = ThreadingHTTPServer(("127.0.0.1", int(port)), Handler)
+        except OSError:
+            # Port already in use (e.g. the module was reloaded) - the endpoint is simply not served again
+            return None
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, name="metrics", daemon=True).start()
+        return self._server
+
+# Process-wide registry shared by every module and session
+metrics = Metrics()
+if METRICS_PORT:
+    metrics.serve(METRICS_PORT)
@@ -0,0 +1,118 @@
+"""
+The purpose of this python file is to keep the forecasts of popular locations warm in the forecast cache.
+
+Every on-demand fetch is recorded with a popularity score that decays over time (HALF_LIFE). A background thread
+checks every CHECK_INTERVAL seconds which of the tracked requests have expired from the forecast cache (i.e. a new
+model run became available) and re-fetches the most popular ones, at most REQUEST_BUDGET locations per check,
+so the next viewer of a popular city is served from the cache instead of waiting for the network. Each tracked
+request remembers the model run it was last found cached for, so the cache is only asked about it (a header-only
+check, see ForecastCache.contains) once per model run rather than on every check.
+"""
+
+import time
+from threading import Event, Lock, Thread
+
+import forecast_cache
+
+CHECK_INTERVAL = 30
+REQUEST_BUDGET = 20
+HALF_LIFE = 3600
+# Requests not seen for this long are forgotten
+MAX_IDLE = 6 * 3600
+MAX_TRACKED = 2000
+
+class _Tracked:
+    def __init__(self, now):
+        self.score = 0.0
+        self.updated = now
+        self.last_seen = now
+        # Model run the request was last known to be cached for
+        self.run = None
+
+    def decayed_score(self, now):
+        return self.score * 0.5 ** ((now - self.updated) / HALF_LIFE)
+
+    def hit(self, now):
+        self.score = self.decayed_score(now) + 1
+        self.updated = self.last_seen = now
+
+class PrefetchScheduler:
+    # 'refresh(graph_type, choices, start, end, locations)' fetches one request for a list of (lat, lon) locations
+    def __init__(self, refresh, budget=REQUEST_BUDGET, check_interval=CHECK_INTERVAL, cache=forecast_cache.cache):
+        self._refresh = refresh
+        self._budget = budget
+        self._check_interval = check_interval
+        self._cache = cache
+        self._tracked = {}
+        self._lock = Lock()
+        self._stop = Event()
+        self._thread = None
+
+    def record(self, lat, lon, graph_type, choices, start=None, end=None):
+        # Count a request towards the popularity of its grid cell, graph type, variables and window
+        cell = forecast_cache.grid_cell(lat, lon)
+        key = (cell, graph_type, tuple(choices), start, end)
+        now = time.time()
+        with self._lock:
+            self._tracked.setdefault(key, _Tracked(now)).hit(now)
+            if len(self._tracked) > MAX_TRACKED:
+                coldest = min(self._tracked, key=lambda tracked_key: self._tracked[tracked_key].decayed_score(now))
+                del self._tracked[coldest]
+
+    def due(self, now=None):
+        # The most popular tracked requests (up to the budget) that are no longer in the forecast cache
+        now = now or time.time()
+        with self._lock:
+            for key in [key for key, tracked in self._tracked.items() if now - tracked.last_seen > MAX_IDLE]:
+                del self._tracked[key]
+            ranked = sorted(self._tracked.items(), key=lambda item: item[1].decayed_score(now), reverse=True)
+
+        due = []
+        for (cell, graph_type, choices, start, end), tracked in ranked:
+            run = forecast_cache.model_run(graph_type, now)
+            if tracked.run == run:
+                continue
+            lat, lon = forecast_cache.cell_centre(cell)
+            if self._cache.contains(lat, lon, graph_type, list(choices), start, end):
+                # Fetched on demand (or by another worker process) since the run came out
+                tracked.run = run
+                continue
+            due.append((lat, lon, graph_type, choices, start, end))
+            if len(due) >= self._budget:
+                break
+        return due
+
+    def _refreshed(self, graph_type, choices, start, end, locations):
+        # Mark refreshed requests as cached for the current model run
+        run = forecast_cache.model_run(graph_type)
+        with self._lock:
+            for lat, lon in locations:
+                tracked = self._tracked.get((forecast_cache.grid_cell(lat, lon), graph_type, choices, start, end))
+                if tracked is not None:
+                    tracked.run = run
+
+    def run_once(self):
+        # Refresh the due requests, grouping identical requests so they share multi-location batches
+        groups = {}
+        for lat, lon, graph_type, choices, start, end in self.due():
+            groups.setdefault((graph_type, choices, start, end), []).append((lat, lon))
+        for (graph_type, choices, start, end), locations in groups.items():
+            try:
+                self._refresh(graph_type, list(choices), start, end, locations)
+            except Exception:
+                # A failed prefetch is not fatal - the location is simply fetched on demand instead
+                continue
+            self._refreshed(graph_type, choices, start, end, locations)
+
+    def _loop(self):
+        while not self._stop.wait(self._check_interval):
+            self.run_once()
+
+    def start(self):
+        if self._thread is None:
+            self._thread = Thread(target=self._loop, name="prefetch", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
@@ -0,0 +1,101 @@
+"""
+The purpose of this python file is to turn the dashboard's DataFrame into the data section of the AI prompt within a token budget.
+
+The data section always starts with summary statistics of the full data (mean, min/max and when they happen, and the
+biggest change between consecutive time steps), followed by the rows as compact CSV. If the rows don't fit in the budget
+they are reduced step by step: hourly data to 3-hourly and 6-hourly key times and then to daily min/mean/max,
+daily data to every 2nd, 3rd or 7th day. The statistics are calculated before downsampling so extremes are never lost.
+"""
+
+import numpy as np
+import pandas as pd
+
+TOKEN_BUDGET = 1500
+# Rough number of characters per token for the Llama tokenizers on numeric CSV
+CHARS_PER_TOKEN = 3.5
+
+HOURLY_STEPS = (1, 3, 6)
+DAILY_STEPS = (1, 2, 3, 7)
+# Ends the rows when even the most reduced ones had to be cut short
+OMITTED = "(remaining rows omitted)\n"
+
+def estimate_tokens(text):
+    return int(len(text) / CHARS_PER_TOKEN) + 1
+
+def _date_format(dataframe):
+    if len(dataframe) > 1 and dataframe['Date'].iloc[1] - dataframe['Date'].iloc[0] < pd.Timedelta(days=1):
+        return "%Y-%m-%d %H:%M"
+    return "%Y-%m-%d"
+
+def to_csv(dataframe, date_format="%Y-%m-%d %H:%M"):
+    # The dashboard labels local times as UTC, so the timezone is dropped rather than shown as +00:00
+    return dataframe.to_csv(index=False, float_format="%.1f", date_format=date_format, lineterminator="\n")
+
+def summary_statistics(dataframe):
+    # One line per column: mean, extremes with their times and the biggest change between consecutive steps
+    if 'Date' not in dataframe.columns or len(dataframe) < 2:
+        return ""
+
+    date_format = _date_format(dataframe)
+    dates = dataframe['Date'].dt.strftime(date_format).to_numpy()
+    lines = ["Summary of all data:"]
+    for column in dataframe.columns.drop('Date'):
+        values = dataframe[column].to_numpy(dtype=np.float64)
+        if np.isnan(values).all():
+            continue
+        min_pos, max_pos = np.nanargmin(values), np.nanargmax(values)
+        line = (f"{column}: mean {np.nanmean(values):.1f}, "
+                f"min {values[min_pos]:.1f} at {dates[min_pos]}, max {values[max_pos]:.1f} at {dates[max_pos]}")
+        changes = np.nan_to_num(np.diff(values))
+        if np.abs(changes).max() > 0:
+            change_pos = np.abs(changes).argmax()
+            line += f", biggest change {changes[change_pos]:+.1f} from {dates[change_pos]} to {dates[change_pos + 1]}"
+        lines.append(line)
+    return "\n".join(lines) + "\n"
+
+def _daily_aggregate(dataframe):
+    # Per-day min/mean/max of every column except the dates themselves, which become the group keys
+    grouped = dataframe.drop(columns='Date').groupby(dataframe['Date'].dt.normalize())
+    daily = grouped.agg(['min', 'mean', 'max'])
+    daily.columns = [f"{column} {stat}" for column, stat in daily.columns]
+    return daily.rename_axis('Date').reset_index()
+
+def _candidates(dataframe):
+    # Row sets to try, from full resolution to most reduced, as (description, DataFrame, date format)
+    date_format = _date_format(dataframe)
+    if date_format == "%Y-%m-%d":
+        for step in DAILY_STEPS:
+            yield (f"every {step} days" if step > 1 else "daily"), dataframe.iloc[::step], date_format
+        return
+
+    hours = dataframe['Date'].dt.hour
+    for step in HOURLY_STEPS:
+        yield (f"every {step} hours" if step > 1 else "hourly"), dataframe[hours % step == 0], date_format
+    yield "daily min/mean/max", _daily_aggregate(dataframe), "%Y-%m-%d"
+
+def build_data_section(dataframe, token_budget=TOKEN_BUDGET):
+    if dataframe is None:
+        return ""
+    if 'Date' not in dataframe.columns:
+        return to_csv(dataframe)
+
+    statistics = summary_statistics(dataframe)
+    remaining = token_budget - estimate_tokens(statistics)
+
+    rows = ""
+    for description, candidate, date_format in _candidates(dataframe):
+        rows = f"Data ({description}):\n{to_csv(candidate, date_format)}"
+        if estimate_tokens(rows) <= remaining:
+            break
+    else:
+        # Even the most reduced rows don't fit, so keep as many whole lines as the budget allows
+        # The whole section is measured with the omission note included, so the note never takes it over the budget
+        lines = rows.splitlines(keepends=True)
+        kept = ""
+        for line in lines:
+            if estimate_tokens(statistics + kept + line + OMITTED) > token_budget:
+                break
+            kept += line
+        rows = kept + OMITTED
+
+    return statistics + rows
@@ -0,0 +1,205 @@
+"""
+The purpose of this python file is to keep Groq requests under the per-model rate limits before they are sent.
+
+Each model has a requests-per-minute and a tokens-per-minute token bucket. The buckets are corrected from the
+x-ratelimit-* headers of every response and blocked for the retry-after time of any 429. The router picks the first
+model in order of preference that has room for the request, and when none has, callers queue. The queue is fair
+across sessions: the session that has been served least recently goes first.
+
+With a shared backend (see shared_backend.py) the buckets are stored there and every worker process takes from the
+same buckets, so together they stay under the limits. The queue itself is per process. Times are wall clock
+(time.time) rather than monotonic so that they mean the same thing in every process.
+"""
+
+import json, re, time
+from itertools import count
+from threading import Condition
+
+# (requests per minute, tokens per minute) for each model, used until the response headers say otherwise
+MODEL_LIMITS = {
+    "llama-3.3-70b-versatile": (30, 12000),
+    "llama-3.1-8b-instant": (30, 6000)
+}
+# Longest a request waits in the queue before the user is told to try again later
+MAX_QUEUE_WAIT = 20
+
+_DURATION_PART = re.compile(r"([\d.]+)(ms|h|m|s)")
+_DURATION_SECONDS = {"ms": 0.001, "s": 1, "m": 60, "h": 3600}
+
+def parse_duration(value):
+    # Groq reset headers look like "7.66s", "2m59.56s" or "120ms"
+    if not value:
+        return 0.0
+    try:
+        return float(value)
+    except ValueError:
+        return sum(float(number) * _DURATION_SECONDS[unit] for number, unit in _DURATION_PART.findall(value))
+
+# Key of the bucket state in a shared backend
+STATE_KEY = "ratelimit"
+
+class TokenBucket:
+    def __init__(self, capacity, per_seconds=60):
+        self.capacity = capacity
+        self.rate = capacity / per_seconds
+        self.tokens = float(capacity)
+        self.updated = time.time()
+
+    def to_list(self):
+        return [self.capacity, self.rate, self.tokens, self.updated]
+
+    def load(self, values):
+        self.capacity, self.rate, self.tokens, self.updated = values
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount, now):
+        # Seconds until 'amount' is available (0 if available now)
+        self._refill(now)
+        amount = min(amount, self.capacity)
+        return 0.0 if self.tokens >= amount else (amount - self.tokens) / self.rate
+
+    def take(self, amount, now):
+        self._refill(now)
+        self.tokens -= amount
+
+    def sync(self, limit, remaining, reset_seconds, now):
+        # Match the bucket to what the API reports: 'remaining' now, refilling to 'limit' over 'reset_seconds'
+        if limit:
+            self.capacity = limit
+        self.tokens = float(remaining)
+        if reset_seconds > 0 and self.capacity > remaining:
+            self.rate = (self.capacity - remaining) / reset_seconds
+        self.updated = now
+
+class _ModelState:
+    def __init__(self, requests_per_minute, tokens_per_minute):
+        self.requests = TokenBucket(requests_per_minute)
+        self.tokens = TokenBucket(tokens_per_minute)
+        self.blocked_until = 0.0
+
+    def wait_time(self, tokens, now):
+        return max(self.blocked_until - now, self.requests.wait_time(1, now), self.tokens.wait_time(tokens, now))
+
+    def to_dict(self):
+        return {"requests": self.requests.to_list(), "tokens": self.tokens.to_list(), "blocked_until": self.blocked_until}
+
+    def load(self, values):
+        self.requests.load(values["requests"])
+        self.tokens.load(values["tokens"])
+        self.blocked_until = values["blocked_until"]
+
+def _route(models, tokens, now):
+    # (model, 0) for the most preferred model with room now, otherwise (None, shortest wait)
+    shortest_wait = None
+    for model, state in models.items():
+        wait = state.wait_time(tokens, now)
+        if wait == 0:
+            return model, 0.0
+        shortest_wait = wait if shortest_wait is None else min(shortest_wait, wait)
+    return None, shortest_wait
+
+def _take(models, tokens, now):
+    # Route the request and, if a model has room, take the request and its tokens from that model's buckets
+    model, wait = _route(models, tokens, now)
+    if model is not None:
+        models[model].requests.take(1, now)
+        models[model].tokens.take(tokens, now)
+    return model, wait
+
+class RateLimiter:
+    def __init__(self, models=MODEL_LIMITS, max_queue_wait=MAX_QUEUE_WAIT, backend=None):
+        # Dictionaries keep insertion order, which is the order of preference for the router
+        self._limits = dict(models)
+        self._models = {model: _ModelState(*limits) for model, limits in models.items()}
+        self._max_queue_wait = max_queue_wait
+        self._backend = backend
+        self._condition = Condition()
+        self._waiting = {}
+        self._last_served = {}
+        self._tickets = count()
+
+    def _load(self, stored):
+        # Model states from the backend, with the default limits for any model that isn't stored yet
+        models = {model: _ModelState(*limits) for model, limits in self._limits.items()}
+        saved = json.loads(stored) if stored else {}
+        for model, state in models.items():
+            if model in saved:
+                state.load(saved[model])
+        return models
+
+    def _with_models(self, function, write=True):
+        # function(models, now) on the model states, atomically through the shared backend when there is one
+        # Callers hold the condition, which is all that is needed for the states of this process
+        now = time.time()
+        if self._backend is None:
+            return function(self._models, now)
+        if not write:
+            return function(self._load(self._backend.get(STATE_KEY)), now)
+
+        def apply(stored):
+            models = self._load(stored)
+            result = function(models, now)
+            return json.dumps({model: state.to_dict() for model, state in models.items()}).encode("utf-8"), result
+        return self._backend.update(STATE_KEY, apply)
+
+    def preview(self, tokens=1):
+        # Model that a request would be sent to right now (the preferred model if every model is limited)
+        with self._condition:
+            model, _ = self._with_models(lambda models, now: _route(models, tokens, now), write=False)
+        return model or next(iter(self._models))
+
+    def acquire(self, tokens, session_id=None):
+        # Wait for a model with room for 'tokens' and reserve it, returning the model (None if the wait is too long)
+        ticket = next(self._tickets)
+        deadline = time.time() + self._max_queue_wait
+        with self._condition:
+            self._waiting[ticket] = session_id
+            try:
+                while True:
+                    now = time.time()
+                    # Fair scheduling - the waiter whose session was served longest ago (then the oldest ticket) goes first
+                    first = min(self._waiting, key=lambda waiter: (self._last_served.get(self._waiting[waiter], 0.0), waiter))
+                    if first == ticket:
+                        model, wait = self._with_models(lambda models, now: _take(models, tokens, now))
+                    else:
+                        model, wait = self._with_models(lambda models, now: _route(models, tokens, now), write=False)
+                    if first == ticket and model is not None:
+                        self._last_served[session_id] = now
+                        if len(self._last_served) > 1000:
+                            self._last_served = {session: served for session, served in self._last_served.items() if now - served < 60}
+                        return model
+                    if now >= deadline:
+                        return None
+                    # Other processes don't notify this condition, but the wait never outlasts the buckets' refill
+                    self._condition.wait(min(deadline - now, wait or self._max_queue_wait))
+            finally:
+                del self._waiting[ticket]
+                self._condition.notify_all()
+
+    def update(self, model, headers):
+        # Correct the buckets of a model from the x-ratelimit-* (and retry-after) headers of its response
+        # Groq's request headers count requests per day, so only the token (per minute) bucket is synced from them
+        def sync(models, now):
+            state = models[model]
+            if headers.get("x-ratelimit-remaining-tokens") is not None:
+                state.tokens.sync(int(headers.get("x-ratelimit-limit-tokens") or 0),
+                                  int(headers["x-ratelimit-remaining-tokens"]),
+                                  parse_duration(headers.get("x-ratelimit-reset-tokens")), now)
+            if headers.get("retry-after") is not None:
+                state.blocked_until = max(state.blocked_until, now + parse_duration(headers["retry-after"]))
+
+        with self._condition:
+            self._with_models(sync)
+            self._condition.notify_all()
+
+    def block(self, model, seconds):
+        # Stop routing to a model for a while (e.g. after a 429 without a retry-after header)
+        def block(models, now):
+            models[model].blocked_until = max(models[model].blocked_until, now + seconds)
+
+        with self._condition:
+            self._with_models(block)
+            self._condition.notify_all()
@@ -0,0 +1,187 @@
+"""
+The purpose of this python file is to stand in for a Redis server, so the Redis shared backend can be tried locally.
+
+It speaks enough of the Redis protocol (RESP2) for shared_backend.RedisBackend and redis-py: PING, GET, SET (with
+EX/PX), DEL, EXISTS, FLUSHDB, WATCH/UNWATCH/MULTI/EXEC/DISCARD and the handshake commands. Data lives in memory
+and every command runs under one lock, like Redis running commands one at a time. It is not meant for production.
+
+Run with:
+    python redis_standin.py [--port 6390]
+then start the workers with SHARED_BACKEND_URL=redis://127.0.0.1:6390/0
+"""
+
+import argparse, threading, time
+from socketserver import StreamRequestHandler, ThreadingTCPServer
+
+PORT = 6390
+
+class _Error(Exception):
+    pass
+
+class StandInHandler(StreamRequestHandler):
+    def setup(self):
+        super().setup()
+        self.watched = {}
+        self.queued = None
+
+    def _read_command(self):
+        # Commands arrive as arrays of bulk strings, e.g. *2\r\n$3\r\nGET\r\n$3\r\nkey\r\n
+        line = self.rfile.readline()
+        if not line:
+            return None
+        if not line.startswith(b"*"):
+            # Inline command (e.g. typed into telnet)
+            return line.split()
+        arguments = []
+        for _ in range(int(line[1:])):
+            length = int(self.rfile.readline()[1:])
+            arguments.append(self.rfile.read(length + 2)[:-2])
+        return arguments
+
+    def _encode(self, reply):
+        if reply is None:
+            return b"$-1\r\n"
+        if isinstance(reply, _Error):
+            return b"-ERR " + str(reply).encode("utf-8") + b"\r\n"
+        if reply is False:
+            return b"*-1\r\n"
+        if isinstance(reply, str):
+            return b"+" + reply.encode("utf-8") + b"\r\n"
+        if isinstance(reply, int):
+            return b":" + str(reply).encode("ascii") + b"\r\n"
+        if isinstance(reply, bytes):
+            return b"$" + str(len(reply)).encode("ascii") + b"\r\n" + reply + b"\r\n"
+        return b"*" + str(len(reply)).encode("ascii") + b"\r\n" + b"".join(self._encode(item) for item in reply)
+
+    def handle(self):
+        while (command := self._read_command()) is not None:
+            if not command:
+                continue
+            try:
+                reply = self.server.run(self, command[0].upper().decode("ascii"), command[1:])
+            except _Error as error:
+                reply = error
+            except (ValueError, IndexError):
+                reply = _Error("syntax error")
+            self.wfile.write(self._encode(reply))
+
+class StandInServer(ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, port=PORT):
+        super().__init__(("127.0.0.1", port), StandInHandler)
+        self._data = {}
+        # Bumped on every write to a key, so WATCH can tell whether a key changed before EXEC
+        self._versions = {}
+        self._lock = threading.Lock()
+
+    def _get(self, key):
+        value, expires = self._data.get(key, (None, None))
+        if expires is not None and expires <= time.time():
+            del self._data[key]
+            self._touch(key)
+            return None
+        return value
+
+    def _touch(self, key):
+        self._versions[key] = self._versions.get(key, 0) + 1
+
+    def _set(self, key, arguments):
+        value, options = arguments[0], [argument.upper() for argument in arguments[1:]]
+        expires = None
+        for pos, option in enumerate(options):
+            if option == b"EX":
+                expires = time.time() + int(arguments[pos + 2])
+            elif option == b"PX":
+                expires = time.time() + int(arguments[pos + 2]) / 1000
+        self._data[key] = (value, expires)
+        self._touch(key)
+        return "OK"
+
+    def _execute(self, name, arguments):
+        # Runs one data command, with the lock held
+        if name == "GET":
+            return self._get(arguments[0])
+        if name == "SET":
+            return self._set(arguments[0], arguments[1:])
+        if name == "DEL":
+            deleted = 0
+            for key in arguments:
+                if self._get(key) is not None:
+                    del self._data[key]
+                    self._touch(key)
+                    deleted += 1
+            return deleted
+        if name == "EXISTS":
+            return sum(self._get(key) is not None for key in arguments)
+        if name == "FLUSHDB":
+            for key in list(self._data):
+                self._touch(key)
+            self._data.clear()
+            return "OK"
+        raise _Error(f"unknown command '{name}'")
+
+    def run(self, client, name, arguments):
+        if name == "PING":
+            return arguments[0] if arguments else "PONG"
+        if name == "HELLO":
+            # Only RESP2 is spoken - clients asking for RESP3 are told so and fall back or give up
+            if arguments and arguments[0] != b"2":
+                raise _Error("NOPROTO unsupported protocol version")
+            return [b"server", b"redis", b"version", b"7.0.0", b"proto", 2, b"id", 1, b"mode", b"standalone",
+                    b"role", b"master", b"modules", []]
+        if name in ("CLIENT", "SELECT", "READONLY"):
+            return "OK"
+        with self._lock:
+            if name == "WATCH":
+                for key in arguments:
+                    self._get(key)
+                    client.watched[key] = self._versions.get(key, 0)
+                return "OK"
+            if name == "UNWATCH":
+                client.watched = {}
+                return "OK"
+            if name == "MULTI":
+                client.queued = []
+                return "OK"
+            if name == "DISCARD":
+                client.queued, client.watched = None, {}
+                return "OK"
+            if name == "EXEC":
+                if client.queued is None:
+                    raise _Error("EXEC without MULTI")
+                queued, client.queued = client.queued, None
+                # Aborted (a nil array) if a watched key was written since WATCH
+                changed = any(self._versions.get(key, 0) != version for key, version in client.watched.items())
+                client.watched = {}
+                if changed:
+                    return False
+                return [self._execute(queued_name, queued_arguments) for queued_name, queued_arguments in queued]
+            if client.queued is not None:
+                client.queued.append((name, arguments))
+                return "QUEUED"
+            return self._execute(name, arguments)
+
+    def start(self):
+        threading.Thread(target=self.serve_forever, name="redis-standin", daemon=True).start()
+        return self
+
+    @property
+    def url(self):
+        return f"redis://127.0.0.1:{self.server_address[1]}/0"
+
+def main():
+    parser = argparse.ArgumentParser(description="In-memory stand-in for a Redis server")
+    parser.add_argument("--port", type=int, default=PORT)
+    args = parser.parse_args()
+
+    server = StandInServer(args.port)
+    print(f"Redis stand-in: {server.url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    main()
@@ -2,11 +2,31 @@
 The purpose of this python file is to automatically run the dashboard script without having to write the terminal command "streamlit run ...".
 
 This will also allow me to add arguments to command without the user having to necessarily add them themselves.
+With --with-service the forecast service (forecast_service.py) is started too and the dashboard is made its client.
 """
 
-import subprocess
+import argparse, os, subprocess, sys
 from pathlib import Path
 
+# Same default port as forecast_service.py (not imported, as that would load the whole data tier here)
+SERVICE_PORT = 8600
+
+parser = argparse.ArgumentParser(description="Run the dashboard")
+parser.add_argument("--with-service", action="store_true", help="start the forecast service and fetch data through it")
+parser.add_argument("--service-port", type=int, default=SERVICE_PORT)
+args = parser.parse_args()
+
 dashboard = Path(__file__).with_name('dashboard.py')
-subprocess.run(["streamlit", "run", f"{dashboard}", 
-                "--server.runOnSave=True"])
\ No newline at end of file
+env = dict(os.environ)
+service = None
+if args.with_service:
+    service = subprocess.Popen([sys.executable, str(Path(__file__).with_name('forecast_service.py')),
+                                "--port", str(args.service_port)])
+    env["FORECAST_SERVICE_URL"] = f"http://127.0.0.1:{args.service_port}"
+
+try:
+    subprocess.run(["streamlit", "run", f"{dashboard}",
+                    "--server.runOnSave=True"], env=env)
+finally:
+    if service is not None:
+        service.terminate()
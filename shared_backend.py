@@ -0,0 +1,144 @@
+"""
+The purpose of this python file is to share the forecast cache and the Groq rate limit state between worker processes.
+
+When several dashboard/service workers run behind a load balancer, each one would otherwise keep its own forecast
+cache and its own view of the Groq limits. A backend is a small key-value store of bytes with expiry and an atomic
+read-modify-write (update), chosen with the SHARED_BACKEND_URL environment variable:
+    - unset                          -> nothing is shared, every process keeps its state in memory (the default)
+    - sqlite:///path/to/state.db     -> a SQLite file in WAL mode, shared by the processes of one machine
+    - redis://host:6379/0            -> a Redis (or Redis-compatible) server, shared by any number of machines
+The Redis mode needs the redis package, and can be tried locally against redis_standin.py.
+"""
+
+import os, sqlite3, threading, time
+from pathlib import Path
+from urllib.parse import urlsplit
+
+try:
+    import redis
+except ImportError:
+    redis = None
+
+SHARED_BACKEND_URL = os.environ.get("SHARED_BACKEND_URL")
+# Every key is prefixed so the store can be shared with other applications
+KEY_PREFIX = "weather:"
+# Milliseconds a SQLite write waits for another process's write to finish
+SQLITE_BUSY_TIMEOUT = 5000
+# Expired rows are deleted every this many SQLite writes, and the oldest rows past MAX_ROWS with them
+# Only rows written with a ttl (cache entries) are counted and evicted - rows without one (e.g. the rate limiter's
+# state) are kept until they are deleted
+SQLITE_PRUNE_EVERY = 100
+SQLITE_MAX_ROWS = 4096
+
+class SQLiteBackend:
+    def __init__(self, path):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        # sqlite3 connections can't be shared between threads, so each thread opens its own
+        self._local = threading.local()
+        self._writes = 0
+        with self._connection() as connection:
+            connection.execute("CREATE TABLE IF NOT EXISTS entries (key TEXT PRIMARY KEY, value BLOB NOT NULL, "
+                               "expires REAL, written REAL NOT NULL)")
+
+    def _connection(self):
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            # Autocommit mode, with transactions opened explicitly by update()
+            connection = sqlite3.connect(self.path, timeout=SQLITE_BUSY_TIMEOUT / 1000, isolation_level=None)
+            # WAL lets readers carry on while one process writes, instead of every write locking the whole file
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            connection.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT}")
+            self._local.connection = connection
+        return connection
+
+    @staticmethod
+    def _expires(ttl):
+        return time.time() + ttl if ttl else None
+
+    def _read(self, connection, key):
+        row = connection.execute("SELECT value, expires FROM entries WHERE key = ?", (key,)).fetchone()
+        if row is None or (row[1] is not None and row[1] < time.time()):
+            return None
+        return bytes(row[0])
+
+    def _write(self, connection, key, value, ttl):
+        connection.execute("INSERT OR REPLACE INTO entries (key, value, expires, written) VALUES (?, ?, ?, ?)",
+                           (key, value, self._expires(ttl), time.time()))
+        self._writes += 1
+        if self._writes % SQLITE_PRUNE_EVERY == 0:
+            connection.execute("DELETE FROM entries WHERE expires < ?", (time.time(),))
+            connection.execute("DELETE FROM entries WHERE key IN (SELECT key FROM entries WHERE expires IS NOT NULL "
+                               "ORDER BY written DESC LIMIT -1 OFFSET ?)", (SQLITE_MAX_ROWS,))
+
+    def get(self, key):
+        return self._read(self._connection(), KEY_PREFIX + key)
+
+    def set(self, key, value, ttl=None):
+        self._write(self._connection(), KEY_PREFIX + key, value, ttl)
+
+    def delete(self, key):
+        self._connection().execute("DELETE FROM entries WHERE key = ?", (KEY_PREFIX + key,))
+
+    def update(self, key, function, ttl=None):
+        # function(value or None) -> (new value, result), run while every other writer waits; returns result
+        connection = self._connection()
+        # IMMEDIATE takes the write lock before reading, so two processes can't both read the old value
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            value, result = function(self._read(connection, KEY_PREFIX + key))
+            self._write(connection, KEY_PREFIX + key, value, ttl)
+        except BaseException:
+            connection.execute("ROLLBACK")
+            raise
+        connection.execute("COMMIT")
+        return result
+
+class RedisBackend:
+    def __init__(self, url):
+        if redis is None:
+            raise ImportError("The redis package is needed for a redis:// SHARED_BACKEND_URL (pip install redis)")
+        self.url = url
+        # redis-py's client is thread safe and pools its connections
+        # RESP2 is asked for as every Redis-compatible server (and redis_standin.py) speaks it
+        self._client = redis.Redis.from_url(url, protocol=2)
+
+    def get(self, key):
+        return self._client.get(KEY_PREFIX + key)
+
+    def set(self, key, value, ttl=None):
+        self._client.set(KEY_PREFIX + key, value, px=int(ttl * 1000) if ttl else None)
+
+    def delete(self, key):
+        self._client.delete(KEY_PREFIX + key)
+
+    def update(self, key, function, ttl=None):
+        # Optimistic transaction - if another client changes the key between the read and the write, it is retried
+        key = KEY_PREFIX + key
+        with self._client.pipeline() as pipe:
+            while True:
+                try:
+                    pipe.watch(key)
+                    value, result = function(pipe.get(key))
+                    pipe.multi()
+                    pipe.set(key, value, px=int(ttl * 1000) if ttl else None)
+                    pipe.execute()
+                    return result
+                except redis.WatchError:
+                    continue
+
+def from_url(url):
+    # Backend for a SHARED_BACKEND_URL, or None to keep state in this process
+    if not url:
+        return None
+    parts = urlsplit(url)
+    if parts.scheme == "sqlite":
+        # sqlite:///relative/path or sqlite:////absolute/path, like SQLAlchemy
+        return SQLiteBackend(parts.path[1:])
+    if parts.scheme in ("redis", "rediss", "unix"):
+        return RedisBackend(url)
+    raise ValueError(f"Unknown SHARED_BACKEND_URL scheme: {parts.scheme}")
+
+# Process-wide backend used by the forecast cache and the AI rate limiter
+backend = from_url(SHARED_BACKEND_URL)
@@ -0,0 +1,85 @@
+"""
+The purpose of this python file is to find the nearest cities to a latitude/longitude without scanning every city.
+
+Cities are bucketed into a grid of CELL_SIZE degree cells (a sorted array of cell ids over the gazetteer rows),
+and a lookup searches rings of cells outwards from the query point, refining candidates with the haversine distance.
+The search stops once no unsearched cell could hold a closer city than the k-th best found so far.
+"""
+
+import heapq
+import numpy as np
+
+CELL_SIZE = 1.0
+EARTH_RADIUS_KM = 6371.0088
+
+def haversine(lat1, lon1, lat2, lon2):
+    # Great-circle distance in km, works element-wise on numpy arrays
+    lat1, lon1, lat2, lon2 = (np.radians(np.asarray(value, dtype=np.float64)) for value in (lat1, lon1, lat2, lon2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0, 1)))
+
+class SpatialIndex:
+    def __init__(self, cities, cell_size=CELL_SIZE):
+        self._cities = cities
+        self._cell_size = cell_size
+        self._n_lat = int(np.ceil(180 / cell_size))
+        self._n_lon = int(np.ceil(360 / cell_size))
+
+        # Sort the gazetteer rows by grid cell, so each cell is one contiguous run of self._order
+        cell_ids = self._cell_id(*self._cell_of(cities.lat, cities.lon))
+        self._order = np.argsort(cell_ids, kind="stable").astype(np.uint32)
+        self._sorted_cells = cell_ids[self._order]
+
+    def _cell_of(self, lat, lon):
+        lat_idx = np.clip(((np.asarray(lat, dtype=np.float64) + 90) // self._cell_size).astype(np.int64), 0, self._n_lat - 1)
+        lon_idx = ((np.asarray(lon, dtype=np.float64) + 180) // self._cell_size).astype(np.int64) % self._n_lon
+        return lat_idx, lon_idx
+
+    def _cell_id(self, lat_idx, lon_idx):
+        return lat_idx * self._n_lon + lon_idx
+
+    def _ring(self, lat_idx, lon_idx, r):
+        # Cell ids on the border of the (2r+1) x (2r+1) square around the query cell, wrapping around in longitude
+        if r == 0:
+            lats, lons = np.array([lat_idx]), np.array([lon_idx])
+        else:
+            span = np.arange(-r, r + 1)
+            side = np.arange(-r + 1, r)
+            lats = np.concatenate([np.full(span.size, lat_idx - r), np.full(span.size, lat_idx + r), lat_idx + side, lat_idx + side])
+            lons = np.concatenate([lon_idx + span, lon_idx + span, np.full(side.size, lon_idx - r), np.full(side.size, lon_idx + r)])
+        inside = (lats >= 0) & (lats < self._n_lat)
+        return np.unique(self._cell_id(lats[inside], lons[inside] % self._n_lon))
+
+    def _rows_in(self, cell_ids):
+        starts = np.searchsorted(self._sorted_cells, cell_ids, side="left")
+        ends = np.searchsorted(self._sorted_cells, cell_ids, side="right")
+        if not len(starts):
+            return np.empty(0, dtype=np.uint32)
+        return np.concatenate([self._order[start:end] for start, end in zip(starts, ends)])
+
+    def _unsearched_bound(self, lat, r):
+        # Lower bound (km) on the distance to any city outside rings 0..r
+        # Such a city is at least r cells away in latitude, or within that latitude band and r cells away in longitude
+        # (r rather than r + 1 cells, as the query point can sit anywhere inside its own cell)
+        degrees = r * self._cell_size
+        lat_bound = EARTH_RADIUS_KM * np.radians(degrees)
+        if 2 * r + 1 >= self._n_lon:
+            return lat_bound
+        max_lat = np.radians(min(90.0, abs(lat) + degrees))
+        lon_bound = 2 * EARTH_RADIUS_KM * np.arcsin(np.cos(max_lat) * np.sin(np.radians(degrees) / 2))
+        return min(lat_bound, lon_bound)
+
+    def nearest(self, lat, lon, k=5):
+        # Return [(row, distance in km), ...] for the k nearest cities, closest first
+        lat_idx, lon_idx = (int(idx) for idx in self._cell_of(lat, lon))
+        best = []
+        for r in range(max(self._n_lat, self._n_lon)):
+            rows = self._rows_in(self._ring(lat_idx, lon_idx, r))
+            if len(rows):
+                distances = haversine(lat, lon, self._cities.lat[rows], self._cities.lon[rows])
+                best = heapq.nsmallest(k, best + list(zip(distances.tolist(), rows.tolist())))
+            if len(best) == k and best[-1][0] <= self._unsearched_bound(lat, r):
+                break
+            if lat_idx - r <= 0 and lat_idx + r >= self._n_lat - 1 and 2 * r + 1 >= self._n_lon:
+                break
+        return [(row, distance) for distance, row in best]
@@ -0,0 +1,158 @@
+"""
+The purpose of this python file is to cache AI summaries so that repeated questions don't spend Groq quota.
+
+Summaries are keyed by a content hash of the model, the normalised prompt, the location and a fingerprint of the
+DataFrame, kept for TTL seconds and evicted least-recently-used past MAX_ENTRIES. Identical requests that arrive
+while the first one is still waiting on Groq share its result instead of sending their own request. A request is
+looked up under the model it is expected to go to, but its summary is stored under the model that actually wrote it
+(the rate limiter may route it to the fallback model), so one model's summary is never served as the other's.
+"""
+
+import hashlib, time
+import pandas as pd
+from collections import OrderedDict
+from concurrent.futures import Future
+from threading import Lock
+from metrics import metrics
+
+TTL = 30 * 60
+MAX_ENTRIES = 256
+
+def normalise_prompt(message):
+    return " ".join(message.casefold().split())
+
+def dataframe_fingerprint(dataframe):
+    # Hash of the values, index and column names of the DataFrame
+    if dataframe is None:
+        return b""
+    values = pd.util.hash_pandas_object(dataframe, index=True).to_numpy().tobytes()
+    return values + "\x1f".join(map(str, dataframe.columns)).encode("utf-8")
+
+class _Abandoned(Exception):
+    # Set on a request's future when its stream was closed before the summary was finished
+    pass
+
+def _recording(deltas, parts):
+    # Pass the deltas of a stream through while keeping a copy, returning the stream's own return value
+    while True:
+        try:
+            delta = next(deltas)
+        except StopIteration as stop:
+            return stop.value
+        parts.append(delta)
+        yield delta
+
+def summary_key(model, message, city, country, dataframe):
+    digest = hashlib.sha256()
+    for part in (model, normalise_prompt(message), str(city), str(country)):
+        digest.update(part.encode("utf-8") + b"\x1e")
+    digest.update(dataframe_fingerprint(dataframe))
+    return digest.hexdigest()
+
+class SummaryCache:
+    def __init__(self, ttl=TTL, max_entries=MAX_ENTRIES):
+        self._ttl = ttl
+        self._max_entries = max_entries
+        self._entries = OrderedDict()
+        self._in_flight = {}
+        self._lock = Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            stored_at, summary = entry
+            if time.time() - stored_at > self._ttl:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return summary
+
+    def put(self, key, summary):
+        with self._lock:
+            self._entries[key] = (time.time(), summary)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self._max_entries:
+                self._entries.popitem(last=False)
+
+    def _claim(self, key):
+        # Returns (future, whether this caller owns the request)
+        with self._lock:
+            future = self._in_flight.get(key)
+            if future is not None:
+                return future, False
+            future = self._in_flight[key] = Future()
+            return future, True
+
+    def _release(self, key):
+        with self._lock:
+            del self._in_flight[key]
+
+    def _wait(self, key):
+        # Returns (summary, None) from the cache or from the request already in flight for the key,
+        # otherwise (None, future) once this caller owns the request
+        while True:
+            summary = self.get(key)
+            if summary is not None:
+                metrics.increment("summary_cache.hit")
+                return summary, None
+
+            future, owner = self._claim(key)
+            if owner:
+                metrics.increment("summary_cache.miss")
+                return None, future
+
+            # Another session is already asking Groq the same thing, so wait for its answer
+            metrics.increment("summary_cache.coalesced")
+            try:
+                return future.result(), None
+            except _Abandoned:
+                # Its reader went away before the summary was finished, so this caller asks for it instead
+                continue
+
+    def get_or_call(self, key, call):
+        # call() returns (summary, key to store it under) - the key is None for error messages, which are returned
+        # to the user but never cached
+        summary, future = self._wait(key)
+        if future is None:
+            return summary
+
+        try:
+            summary, store_key = call()
+            if store_key is not None:
+                self.put(store_key, summary)
+            future.set_result(summary)
+            return summary
+        except BaseException as error:
+            future.set_exception(error)
+            raise
+        finally:
+            self._release(key)
+
+    def get_or_stream(self, key, stream):
+        # Streaming version of get_or_call - a generator of text deltas
+        # stream() yields deltas and returns the key to store the joined text under (None if it can't be cached)
+        # Cache hits and coalesced requests yield the whole summary at once
+        summary, future = self._wait(key)
+        if future is None:
+            yield summary
+            return
+
+        parts = []
+        try:
+            store_key = yield from _recording(stream(), parts)
+            summary = "".join(parts)
+            if store_key is not None:
+                self.put(store_key, summary)
+            future.set_result(summary)
+        except GeneratorExit:
+            # Closed part way through (e.g. the client disconnected) - the waiters take over rather than
+            # receiving GeneratorExit, which isn't an Exception and would skip their error handling
+            future.set_exception(_Abandoned())
+            raise
+        except BaseException as error:
+            future.set_exception(error)
+            raise
+        finally:
+            self._release(key)
@@ -0,0 +1,37 @@
+"""
+The purpose of this python file is to share fixtures between the tests and make the top level modules importable.
+
+The modules live at the top of the repository rather than in a package, so its directory is put on sys.path.
+
+Run with:
+    python -m pytest tests
+"""
+
+import json, sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import gazetteer
+
+def make_gazetteer(directory, cities):
+    # Build and map a gazetteer from (name, country code, lat, lon, population) tuples
+    json_file = Path(directory) / gazetteer.CITIES_FILE
+    json_file.write_text(json.dumps([{"name": name, "country": country, "lat": lat, "lon": lon, "pop": population}
+                                     for name, country, lat, lon, population in cities]), encoding="utf-8")
+    return gazetteer.load(directory)
+
+@pytest.fixture
+def small_gazetteer(tmp_path):
+    return make_gazetteer(tmp_path, [
+        ("London", "GB", 51.5074, -0.1278, 8900000),
+        ("Londonderry", "GB", 54.9966, -7.3086, 85000),
+        ("Long Eaton", "GB", 52.8980, -1.2712, 38000),
+        ("Longridge", "GB", 53.8310, -2.5970, 7500),
+        ("Manchester", "GB", 53.4808, -2.2426, 550000),
+        ("Lincoln", "GB", 53.2307, -0.5406, 100000),
+        ("Paris", "FR", 48.8566, 2.3522, 2100000),
+        ("Lyon", "FR", 45.7640, 4.8357, 515000),
+    ])
@@ -0,0 +1,34 @@
+from city_search import CitySearch
+
+def test_prefix_matches_are_ranked_by_population(small_gazetteer):
+    search = CitySearch(small_gazetteer)
+    assert search.search("lon", "GB", k=4) == ["London", "Londonderry", "Long Eaton", "Longridge"]
+
+def test_query_is_case_and_whitespace_insensitive(small_gazetteer):
+    search = CitySearch(small_gazetteer)
+    assert search.search("  LONG   eat", "GB", k=1) == ["Long Eaton"]
+
+def test_typos_are_found_by_trigram_matching(small_gazetteer):
+    search = CitySearch(small_gazetteer)
+    assert search.search("Londn", "GB", k=1) == ["London"]
+    assert search.search("Manchestr", "GB", k=1) == ["Manchester"]
+
+def test_prefix_matches_come_before_fuzzy_matches_without_duplicates(small_gazetteer):
+    search = CitySearch(small_gazetteer)
+    results = search.search("londonderry", "GB", k=5)
+    assert results[0] == "Londonderry"
+    assert len(results) == len(set(results))
+    assert "London" in results[1:]
+
+def test_empty_query_returns_the_most_populous_cities(small_gazetteer):
+    search = CitySearch(small_gazetteer)
+    assert search.search("", "GB", k=3) == ["London", "Manchester", "Lincoln"]
+    assert search.search(None, "FR") == ["Paris", "Lyon"]
+
+def test_results_only_come_from_the_given_country(small_gazetteer):
+    search = CitySearch(small_gazetteer)
+    assert search.search("l", "FR") == ["Lyon"]
+    assert "Paris" not in search.search("paris", "GB", k=3)
+
+def test_unknown_country_returns_nothing(small_gazetteer):
+    assert CitySearch(small_gazetteer).search("london", "ZZ") == []
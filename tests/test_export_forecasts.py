@@ -0,0 +1,123 @@
+import json
+
+import pandas as pd
+import pytest
+
+import export_forecasts
+import forecast_data
+import weatherAPI_wrapper as wAPI
+from conftest import make_gazetteer
+
+HOURS = 4
+
+@pytest.fixture(autouse=True)
+def config_dir(tmp_path, monkeypatch):
+    # A small gazetteer and country list in place of the real config files
+    directory = tmp_path / "config"
+    directory.mkdir()
+    make_gazetteer(directory, [("London", "GB", 51.5074, -0.1278, 8900000), ("Paris", "FR", 48.8566, 2.3522, 2100000)])
+    (directory / export_forecasts.COUNTRIES_FILE).write_text(json.dumps({"United Kingdom": "GB", "France": "FR"}))
+    monkeypatch.setattr(export_forecasts, "CONFIG_DIR", directory)
+    return directory
+
+class FakeUpstream:
+    # Stands in for Open-Meteo - each response is just its location, turned into HOURS rows by convert
+    def __init__(self, monkeypatch, fail_on_call=None):
+        self.calls = 0
+        self.fail_on_call = fail_on_call
+        monkeypatch.setattr(wAPI, "get_batch", self.get_batch)
+        monkeypatch.setattr(forecast_data, "convert_weatherAPI_response", self.convert)
+
+    def get_batch(self, locations, **config):
+        self.calls += 1
+        if self.calls == self.fail_on_call:
+            raise ConnectionError("interrupted")
+        return list(locations)
+
+    @staticmethod
+    def convert(response, data, graph_type):
+        lat, lon = response
+        dates = pd.date_range("2025-05-01", periods=HOURS, freq="h", tz="UTC")
+        return pd.DataFrame({"Date": dates, "Temperature": [lat + lon + hour for hour in range(HOURS)]})
+
+def city_lines(count):
+    return ["London, United Kingdom\n", "# a comment\n", "Paris, FR\n"] + \
+           [f"{10 + pos * 0.5}, {20 + pos * 0.25}\n" for pos in range(count - 2)]
+
+def run(lines, output, output_format, **kwargs):
+    kwargs.setdefault("batch_size", 3)
+    kwargs.setdefault("concurrency", 2)
+    return export_forecasts.export(iter(lines), output, output_format, "Hourly", ["Temperature"],
+                                   "2025-05-01T00:00", "2025-05-01T03:00", **kwargs)
+
+def read(output, output_format):
+    dataframe = pd.read_csv(output) if output_format == "csv" else pd.read_parquet(output)
+    return dataframe.astype({"Date": str})
+
+def output_path(tmp_path, output_format):
+    return tmp_path / ("out.csv" if output_format == "csv" else "out_parquet")
+
+@pytest.mark.parametrize("output_format", ["csv", "parquet"])
+def test_interrupted_export_resumes_without_duplicate_or_missing_rows(tmp_path, monkeypatch, output_format):
+    lines = city_lines(20)
+    FakeUpstream(monkeypatch)
+    expected_output = tmp_path / ("expected.csv" if output_format == "csv" else "expected_parquet")
+    assert run(lines, expected_output, output_format) == 20
+    expected = read(expected_output, output_format)
+    assert len(expected) == 20 * HOURS
+    assert not expected.duplicated(["Latitude", "Longitude", "Date"]).any()
+
+    output = output_path(tmp_path, output_format)
+    FakeUpstream(monkeypatch, fail_on_call=4)
+    with pytest.raises(ConnectionError):
+        run(lines, output, output_format)
+    checkpoint = json.loads(output.with_name(output.name + ".checkpoint.json").read_text())
+    assert 0 < checkpoint["batches"] < 7
+
+    # What a crash after the checkpoint could leave behind - half a CSV batch, or parts that were never checkpointed
+    if output_format == "csv":
+        with open(output, "a") as f:
+            f.write("Half,GB,1.0,2.0,2025-05-01T00:00")
+    else:
+        for batch in (checkpoint["batches"], 99):
+            (output / f"part-{batch:06d}.parquet").write_bytes(b"not parquet")
+
+    upstream = FakeUpstream(monkeypatch)
+    assert run(lines, output, output_format, resume=True) == 20 - checkpoint["batches"] * 3
+    # Only the batches after the checkpoint were fetched again
+    assert upstream.calls == 7 - checkpoint["batches"]
+    pd.testing.assert_frame_equal(read(output, output_format), expected)
+
+@pytest.mark.parametrize("output_format", ["csv", "parquet"])
+def test_resume_with_a_changed_city_list_is_refused(tmp_path, monkeypatch, output_format):
+    lines = city_lines(20)
+    output = output_path(tmp_path, output_format)
+    FakeUpstream(monkeypatch, fail_on_call=4)
+    with pytest.raises(ConnectionError):
+        run(lines, output, output_format, concurrency=1)
+
+    FakeUpstream(monkeypatch)
+    edited = lines[:2] + lines[3:]
+    with pytest.raises(ValueError, match="city list has changed"):
+        run(edited, output, output_format, resume=True)
+    with pytest.raises(ValueError, match="different export"):
+        run(lines, output, output_format, resume=True, source="other.txt")
+    # Cities added to the end of the list still resume
+    assert run(lines + ["1, 1\n"], output, output_format, resume=True, concurrency=1) == 21 - 9
+
+@pytest.mark.parametrize("output_format", ["csv", "parquet"])
+def test_existing_output_is_not_overwritten_without_resume(tmp_path, monkeypatch, output_format):
+    output = output_path(tmp_path, output_format)
+    FakeUpstream(monkeypatch)
+    run(city_lines(5), output, output_format)
+    before = read(output, output_format)
+    with pytest.raises(ValueError, match="already exists"):
+        run(city_lines(5), output, output_format)
+    pd.testing.assert_frame_equal(read(output, output_format), before)
+
+def test_unknown_cities_and_bad_coordinates_are_skipped(tmp_path, monkeypatch, capsys):
+    FakeUpstream(monkeypatch)
+    lines = ["Atlantis, GB\n", "London, Narnia\n", "95, 10\n", "just one field\n", "London, GB\n"]
+    assert run(lines, tmp_path / "out.csv", "csv") == 1
+    assert read(tmp_path / "out.csv", "csv")["City"].unique().tolist() == ["London"]
+    assert capsys.readouterr().err.count("skipped") == 4
@@ -0,0 +1,116 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import forecast_cache
+from forecast_cache import ForecastCache, grid_cell, model_run, run_expiry
+from shared_backend import SQLiteBackend
+
+# 2025-05-01 12:30 UTC, inside an Hourly model run
+NOW = pd.Timestamp("2025-05-01T12:30", tz="UTC").timestamp()
+
+@pytest.fixture
+def clock(monkeypatch):
+    # A settable time.time() for model run expiry
+    now = [NOW]
+    monkeypatch.setattr(forecast_cache.time, "time", lambda: now[0])
+    return now
+
+@pytest.fixture(params=["memory", "sqlite"])
+def cache(request, tmp_path, clock):
+    return ForecastCache(backend=SQLiteBackend(tmp_path / "state.db") if request.param == "sqlite" else None)
+
+def hourly(start, end, choices):
+    dates = pd.date_range(start, end, freq="h", tz="UTC")
+    return pd.DataFrame({"Date": dates, **{choice: np.arange(len(dates), dtype="float32") + pos
+                                           for pos, choice in enumerate(choices)}})
+
+def fetcher(calls):
+    def fetch(lat, lon, choices, start, end):
+        calls.append((lat, lon, list(choices), start, end))
+        return hourly(start, end, choices)
+    return fetch
+
+def test_model_run_and_expiry():
+    interval, delay = forecast_cache.MODEL_RUN_CYCLES["Hourly"]
+    run = model_run("Hourly", NOW)
+    assert run * interval + delay <= NOW < (run + 1) * interval + delay
+    assert NOW + run_expiry("Hourly", NOW) == pytest.approx((run + 1) * interval + delay)
+    assert model_run("Hourly", NOW + run_expiry("Hourly", NOW)) == run + 1
+
+def test_covers_needs_every_choice_and_the_whole_window(cache):
+    cache.put(51.5, -0.13, "Hourly", ["Temperature", "Rain"], "2025-05-01T00:00", "2025-05-02T23:00",
+              hourly("2025-05-01T00:00", "2025-05-02T23:00", ["Temperature", "Rain"]))
+    assert cache.contains(51.5, -0.13, "Hourly", ["Rain"], "2025-05-01T06:00", "2025-05-02T23:00")
+    assert not cache.contains(51.5, -0.13, "Hourly", ["Rain", "Wind Speed"], "2025-05-01T06:00", "2025-05-01T12:00")
+    assert not cache.contains(51.5, -0.13, "Hourly", ["Rain"], "2025-04-30T23:00", "2025-05-01T12:00")
+    assert not cache.contains(51.5, -0.13, "Hourly", ["Rain"], "2025-05-01T00:00", "2025-05-03T00:00")
+
+def test_get_selects_the_requested_columns_and_window(cache):
+    cache.put(51.5, -0.13, "Hourly", ["Temperature", "Rain"], "2025-05-01T00:00", "2025-05-02T23:00",
+              hourly("2025-05-01T00:00", "2025-05-02T23:00", ["Temperature", "Rain"]))
+    dataframe = cache.get(51.5, -0.13, "Hourly", ["Rain"], "2025-05-01T06:00", "2025-05-01T08:00")
+    assert list(dataframe.columns) == ["Date", "Rain"]
+    assert dataframe["Date"].tolist() == list(pd.date_range("2025-05-01T06:00", periods=3, freq="h", tz="UTC"))
+    assert dataframe["Rain"].tolist() == [7, 8, 9]
+
+def test_daily_select_compares_whole_days(cache):
+    dates = pd.date_range("2025-05-01", periods=5, freq="D", tz="UTC")
+    dataframe = pd.DataFrame({"Date": dates, "Rain Sum": np.ones(5), "Showers Sum": np.ones(5),
+                              "Snowfall Sum": np.zeros(5), "Max Temperature": np.arange(5.0)})
+    cache.put(51.5, -0.13, "Daily", ["Precipitation Sum", "Max Temperature"], "2025-05-01", "2025-05-05", dataframe)
+    selected = cache.get(51.5, -0.13, "Daily", ["Precipitation Sum"], "2025-05-02", "2025-05-03")
+    assert list(selected.columns) == ["Date", "Rain Sum", "Showers Sum", "Snowfall Sum"]
+    assert len(selected) == 2
+
+def test_superset_is_the_union_of_the_cached_and_requested(cache):
+    assert cache.superset(51.5, -0.13, "Hourly", ["Rain"], "2025-05-01T00:00", "2025-05-01T23:00") == \
+        (["Rain"], "2025-05-01T00:00", "2025-05-01T23:00")
+    cache.put(51.5, -0.13, "Hourly", ["Temperature"], "2025-05-01T06:00", "2025-05-02T23:00",
+              hourly("2025-05-01T06:00", "2025-05-02T23:00", ["Temperature"]))
+    assert cache.superset(51.5, -0.13, "Hourly", ["Rain"], "2025-05-01T00:00", "2025-05-01T23:00") == \
+        (["Temperature", "Rain"], "2025-05-01T00:00", "2025-05-02T23:00")
+
+def test_nearby_coordinates_share_one_cell_and_one_fetch(cache):
+    assert grid_cell(51.501, -0.128) == grid_cell(51.52, -0.11)
+    calls = []
+    for lat, lon in ((51.501, -0.128), (51.52, -0.11)):
+        cache.get_or_fetch(lat, lon, "Hourly", ["Temperature"], "2025-05-01T00:00", "2025-05-01T23:00", fetcher(calls))
+    assert len(calls) == 1
+    # Fetched for the cell centre, not the first coordinates asked for
+    assert calls[0][:2] == forecast_cache.cell_centre(grid_cell(51.501, -0.128))
+
+def test_a_wider_request_fetches_the_superset(cache):
+    calls = []
+    cache.get_or_fetch(51.5, -0.13, "Hourly", ["Temperature"], "2025-05-01T00:00", "2025-05-01T23:00", fetcher(calls))
+    dataframe = cache.get_or_fetch(51.5, -0.13, "Hourly", ["Rain"], "2025-05-01T12:00", "2025-05-02T11:00",
+                                   fetcher(calls))
+    assert calls[1][2:] == (["Temperature", "Rain"], "2025-05-01T00:00", "2025-05-02T11:00")
+    assert list(dataframe.columns) == ["Date", "Rain"] and len(dataframe) == 24
+    # Both earlier requests are now answered without fetching
+    cache.get_or_fetch(51.5, -0.13, "Hourly", ["Temperature"], "2025-05-01T00:00", "2025-05-01T23:00", fetcher(calls))
+    assert len(calls) == 2
+
+def test_entries_expire_when_the_next_model_run_is_out(cache, clock):
+    calls = []
+    fetch = fetcher(calls)
+    cache.get_or_fetch(51.5, -0.13, "Hourly", ["Temperature"], "2025-05-01T00:00", "2025-05-01T23:00", fetch)
+    clock[0] += run_expiry("Hourly", clock[0]) - 1
+    cache.get_or_fetch(51.5, -0.13, "Hourly", ["Temperature"], "2025-05-01T00:00", "2025-05-01T23:00", fetch)
+    assert len(calls) == 1
+    clock[0] += 2
+    assert not cache.contains(51.5, -0.13, "Hourly", ["Temperature"], "2025-05-01T00:00", "2025-05-01T23:00")
+    cache.get_or_fetch(51.5, -0.13, "Hourly", ["Temperature"], "2025-05-01T00:00", "2025-05-01T23:00", fetch)
+    assert len(calls) == 2
+
+def test_current_entries_have_no_window(cache):
+    current = pd.DataFrame({"Temperature": [7.0], "Wind Speed": [3.0]})
+    cache.put(51.5, -0.13, "Current", ["Temperature", "Wind Speed"], None, None, current)
+    assert cache.get(51.5, -0.13, "Current", ["Wind Speed"]).to_dict("list") == {"Wind Speed": [3.0]}
+
+def test_least_recently_used_entries_are_evicted(clock):
+    cache = ForecastCache(max_entries=2)
+    for lat in (10, 20, 30):
+        cache.put(lat, 0, "Current", ["Temperature"], None, None, pd.DataFrame({"Temperature": [float(lat)]}))
+    assert cache.get(10, 0, "Current", ["Temperature"]) is None
+    assert cache.get(30, 0, "Current", ["Temperature"]) is not None
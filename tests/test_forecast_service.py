@@ -0,0 +1,67 @@
+import threading
+
+import pytest
+import requests
+
+import forecast_data
+from forecast_service import ForecastService, parse_forecast_request
+
+MAPPING = forecast_data.load_mapping()
+
+@pytest.mark.parametrize("body", [
+    {"graph": "Hourly", "locations": 5},
+    {"graph": "Hourly", "locations": "51.5,-0.13"},
+    {"graph": "Hourly", "locations": [5]},
+    {"graph": "Hourly", "locations": [[51.5]]},
+    {"graph": "Hourly", "locations": [[51.5, -0.13, 0]]},
+    {"graph": "Hourly", "locations": [["north", "west"]]},
+    {"graph": "Hourly", "locations": [[None, 1]]},
+    {"graph": "Hourly", "locations": [[91, 0]]},
+    {"graph": "Hourly", "locations": []},
+    {"graph": "Hourly", "data": 5, "locations": [[51.5, -0.13]]},
+    {"graph": "Hourly", "data": "Temperature", "locations": [[51.5, -0.13]]},
+    {"graph": ["Hourly"], "locations": [[51.5, -0.13]]},
+    {"graph": "Hourly", "locations": [[51.5, -0.13]]},
+    {"graph": "Hourly", "locations": [[51.5, -0.13]], "start": 5, "end": 6},
+    {"graph": "Daily", "locations": [[51.5, -0.13]], "start": "2025-05-02", "end": "2025-05-01"},
+])
+def test_invalid_requests_raise_value_error(body):
+    with pytest.raises(ValueError):
+        parse_forecast_request(body, MAPPING)
+
+def test_valid_request_defaults_to_every_variable():
+    graph_type, data, cities, start, end = parse_forecast_request(
+        {"graph": "Current", "locations": [[51.5, "-0.13"]]}, MAPPING)
+    assert (graph_type, cities, start, end) == ("Current", [[51.5, -0.13]], None, None)
+    assert data == forecast_data.choices(MAPPING, "Current")
+
+@pytest.fixture
+def service():
+    server = ForecastService(port=0, workers=2, mapping=MAPPING, prefetch=False)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+def test_bad_requests_get_a_json_400(service):
+    response = requests.post(f"{service.base_url}/forecast", json={"graph": "Hourly", "locations": 5}, timeout=5)
+    assert response.status_code == 400
+    assert "locations" in response.json()["error"]
+
+def test_unexpected_errors_get_a_json_500(service, monkeypatch):
+    def broken(*args):
+        raise KeyError("boom")
+    monkeypatch.setattr(service, "get_forecasts", broken)
+    response = requests.post(f"{service.base_url}/forecast", json={"graph": "Current", "locations": [[1, 2]]},
+                             timeout=5)
+    assert response.status_code == 500
+    assert response.json() == {"error": "Internal error: KeyError"}
+
+def test_upstream_errors_get_a_json_502(service, monkeypatch):
+    def unreachable(*args):
+        raise requests.ConnectionError("unreachable")
+    monkeypatch.setattr(service, "get_forecasts", unreachable)
+    response = requests.post(f"{service.base_url}/forecast", json={"graph": "Current", "locations": [[1, 2]]},
+                             timeout=5)
+    assert response.status_code == 502
+    assert response.json()["error"].startswith("Upstream request failed")
@@ -0,0 +1,43 @@
+import socket, threading
+
+import pytest
+import requests
+
+import groq_client
+from groq_client import GroqClient
+
+@pytest.fixture
+def client():
+    client = GroqClient(http2=False)
+    client._backoff = lambda retry: None
+    return client
+
+def test_failures_to_connect_are_retried(client):
+    # Nothing listens on a port that was just freed, so every attempt is refused before anything is sent
+    with socket.socket() as free:
+        free.bind(("127.0.0.1", 0))
+        port = free.getsockname()[1]
+    with pytest.raises(requests.ConnectionError) as error:
+        client.post(f"http://127.0.0.1:{port}/", {}, {})
+    assert groq_client._not_sent(error.value)
+    assert len(client.attempts()) == groq_client.RETRIES + 1
+
+def test_connections_dropped_after_sending_are_not_retried(client):
+    # The server reads the request and closes the connection without answering, like a stale kept-alive socket
+    received = []
+    server = socket.socket()
+    server.bind(("127.0.0.1", 0))
+    server.listen()
+    def serve():
+        while True:
+            connection, _ = server.accept()
+            received.append(connection.recv(65536))
+            connection.close()
+    threading.Thread(target=serve, daemon=True).start()
+
+    with pytest.raises(requests.ConnectionError) as error:
+        client.post(f"http://127.0.0.1:{server.getsockname()[1]}/", {}, {})
+    server.close()
+    assert not groq_client._not_sent(error.value)
+    assert len(client.attempts()) == 1
+    assert len(received) == 1
@@ -0,0 +1,103 @@
+import threading, time
+
+import pytest
+
+from rate_limiter import RateLimiter, TokenBucket, parse_duration
+from shared_backend import SQLiteBackend
+
+@pytest.mark.parametrize("value, seconds", [
+    ("7.66s", 7.66), ("2m59.56s", 179.56), ("120ms", 0.12), ("1h2m", 3720), ("30", 30), (None, 0), ("", 0)
+])
+def test_parse_duration(value, seconds):
+    assert parse_duration(value) == pytest.approx(seconds)
+
+def test_bucket_refills_at_its_rate_up_to_capacity():
+    bucket = TokenBucket(60, per_seconds=60)
+    start = bucket.updated
+    bucket.take(60, start)
+    assert bucket.wait_time(1, start) == pytest.approx(1)
+    assert bucket.wait_time(10, start + 4) == pytest.approx(6)
+    assert bucket.wait_time(1, start + 1000) == 0
+    assert bucket.tokens == 60
+
+def test_bucket_never_waits_for_more_than_its_capacity():
+    bucket = TokenBucket(10, per_seconds=10)
+    bucket.take(10, bucket.updated)
+    # A request bigger than the bucket only waits for a full bucket rather than forever
+    assert bucket.wait_time(50, bucket.updated) == pytest.approx(10)
+
+def test_bucket_sync_follows_the_response_headers():
+    bucket = TokenBucket(12000)
+    bucket.sync(limit=6000, remaining=1000, reset_seconds=10, now=bucket.updated)
+    assert (bucket.capacity, bucket.tokens) == (6000, 1000)
+    assert bucket.rate == pytest.approx(500)
+    assert bucket.wait_time(2000, bucket.updated + 1) == pytest.approx(1)
+
+def test_router_prefers_the_first_model_then_falls_back():
+    limiter = RateLimiter({"big": (2, 1000), "small": (5, 1000)}, max_queue_wait=0)
+    assert [limiter.acquire(10) for _ in range(3)] == ["big", "big", "small"]
+    assert limiter.preview() == "small"
+
+def test_requests_without_room_in_a_model_go_to_the_next():
+    limiter = RateLimiter({"big": (10, 100), "small": (10, 1000)}, max_queue_wait=0)
+    assert limiter.acquire(60) == "big"
+    assert limiter.acquire(50) == "small"
+    assert limiter.acquire(40) == "big"
+
+def test_acquire_gives_up_after_the_queue_wait():
+    limiter = RateLimiter({"only": (1, 1000)}, max_queue_wait=0.2)
+    assert limiter.acquire(1) == "only"
+    started = time.monotonic()
+    assert limiter.acquire(1) is None
+    assert 0.15 <= time.monotonic() - started < 2
+
+def test_blocked_models_are_skipped():
+    limiter = RateLimiter({"big": (10, 1000), "small": (10, 1000)}, max_queue_wait=0)
+    limiter.block("big", 60)
+    assert limiter.acquire(1) == "small"
+
+def test_update_applies_headers_and_retry_after():
+    limiter = RateLimiter({"big": (10, 1000), "small": (10, 1000)}, max_queue_wait=0)
+    limiter.update("big", {"x-ratelimit-limit-tokens": "1000", "x-ratelimit-remaining-tokens": "0",
+                           "x-ratelimit-reset-tokens": "30s"})
+    assert limiter.acquire(10) == "small"
+    limiter.update("small", {"retry-after": "60"})
+    assert limiter.acquire(10) is None
+
+def refill(limiter, model):
+    # Give the model room for one more request and wake the waiters
+    with limiter._condition:
+        limiter._models[model].requests.tokens = 1.0
+        limiter._condition.notify_all()
+
+def test_queue_serves_the_session_served_least_recently_first():
+    limiter = RateLimiter({"only": (1, 1000)}, max_queue_wait=10)
+    assert limiter.acquire(1, "busy") == "only"
+
+    served = []
+    def wait(session):
+        limiter.acquire(1, session)
+        served.append(session)
+
+    # "busy" queues before "idle", but was served more recently so "idle" goes first
+    waiters = [threading.Thread(target=wait, args=(session,)) for session in ("busy", "idle")]
+    for waiter in waiters:
+        waiter.start()
+        time.sleep(0.1)
+    refill(limiter, "only")
+    for _ in range(50):
+        if served:
+            break
+        time.sleep(0.02)
+    refill(limiter, "only")
+    for waiter in waiters:
+        waiter.join(5)
+    assert served == ["idle", "busy"]
+
+def test_limiters_on_one_backend_share_their_buckets(tmp_path):
+    backend = SQLiteBackend(tmp_path / "state.db")
+    first, second = (RateLimiter({"only": (2, 1000)}, max_queue_wait=0, backend=backend) for _ in range(2))
+    assert first.acquire(1) == "only"
+    assert second.acquire(1) == "only"
+    assert first.acquire(1) is None
+    assert second.acquire(1) is None
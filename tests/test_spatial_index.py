@@ -0,0 +1,68 @@
+import numpy as np
+import pytest
+
+from conftest import make_gazetteer
+from spatial_index import SpatialIndex, haversine
+
+@pytest.fixture(scope="module")
+def random_gazetteer(tmp_path_factory):
+    # Cities scattered over the globe, plus clusters at the poles and either side of the antimeridian
+    rng = np.random.default_rng(7)
+    lats = np.concatenate([np.degrees(np.arcsin(rng.uniform(-1, 1, 1500))), rng.uniform(85, 90, 50),
+                           rng.uniform(-90, -85, 50), rng.uniform(-5, 5, 100)])
+    lons = np.concatenate([rng.uniform(-180, 180, 1600), rng.uniform(-180, 180, 50),
+                           np.where(rng.random(100) < 0.5, rng.uniform(179, 180, 100), rng.uniform(-180, -179, 100))])
+    cities = [(f"City{pos}", "ZZ", float(lat), float(lon), pos) for pos, (lat, lon) in enumerate(zip(lats, lons))]
+    return make_gazetteer(tmp_path_factory.mktemp("gazetteer"), cities)
+
+def brute_force(cities, lat, lon, k):
+    distances = haversine(lat, lon, cities.lat, cities.lon)
+    return np.sort(distances)[:k]
+
+@pytest.mark.parametrize("cell_size", [1.0, 5.0])
+def test_nearest_matches_a_brute_force_search(random_gazetteer, cell_size):
+    index = SpatialIndex(random_gazetteer, cell_size)
+    rng = np.random.default_rng(11)
+    queries = [(float(lat), float(lon)) for lat, lon in zip(rng.uniform(-90, 90, 60), rng.uniform(-180, 180, 60))]
+    queries += [(89.99, 0.0), (-89.99, 120.0), (0.0, 179.99), (0.0, -179.99), (90.0, 180.0)]
+    for lat, lon in queries:
+        found = [distance for _, distance in index.nearest(lat, lon, k=5)]
+        np.testing.assert_allclose(found, brute_force(random_gazetteer, lat, lon, 5), rtol=1e-9)
+
+def test_nearest_is_sorted_and_returns_rows(random_gazetteer):
+    index = SpatialIndex(random_gazetteer)
+    results = index.nearest(51.5, -0.13, k=10)
+    distances = [distance for _, distance in results]
+    assert distances == sorted(distances)
+    for row, distance in results:
+        assert distance == pytest.approx(float(haversine(51.5, -0.13, random_gazetteer.lat[row], random_gazetteer.lon[row])))
+
+def test_nearest_crosses_the_antimeridian(tmp_path):
+    cities = make_gazetteer(tmp_path, [("East", "ZZ", 0.0, 179.95, 1), ("Far", "ZZ", 0.0, 170.0, 1)])
+    index = SpatialIndex(cities)
+    row, distance = index.nearest(0.0, -179.95, k=1)[0]
+    assert cities.name(row) == "East"
+    assert distance < 12
+
+def test_k_larger_than_the_gazetteer_returns_every_city(tmp_path):
+    cities = make_gazetteer(tmp_path, [("A", "ZZ", 10.0, 10.0, 1), ("B", "ZZ", -60.0, -100.0, 1)])
+    assert [cities.name(row) for row, _ in SpatialIndex(cities).nearest(10.0, 11.0, k=5)] == ["A", "B"]
+
+@pytest.mark.parametrize("cell_size", [1.0, 2.5])
+def test_unsearched_bound_never_exceeds_the_distance_to_an_unsearched_cell(cell_size):
+    # Any point outside the rings 0..r around the query cell must be at least the bound away
+    index = SpatialIndex(type("Empty", (), {"lat": np.empty(0), "lon": np.empty(0)})(), cell_size)
+    rng = np.random.default_rng(3)
+    for _ in range(150):
+        lat, lon = rng.uniform(-89, 89), rng.uniform(-180, 180)
+        r = int(rng.integers(0, 6))
+        lat_idx, lon_idx = (int(idx) for idx in index._cell_of(lat, lon))
+        searched = set()
+        for ring in range(r + 1):
+            searched.update(index._ring(lat_idx, lon_idx, ring).tolist())
+
+        others_lat, others_lon = rng.uniform(-90, 90, 2000), rng.uniform(-180, 180, 2000)
+        outside = ~np.isin(index._cell_id(*index._cell_of(others_lat, others_lon)), list(searched))
+        if outside.any():
+            nearest_outside = haversine(lat, lon, others_lat[outside], others_lon[outside]).min()
+            assert index._unsearched_bound(lat, r) <= nearest_outside + 1e-6
@@ -0,0 +1,52 @@
+"""
+The purpose of this python file is to look up the rows of a fetched dataset by time without scanning the DataFrame.
+
+The dates are kept as a sorted DatetimeIndex, so a point in time is found with a binary search, and each calendar
+day is mapped to its first row, so a day is found with one dictionary lookup. It is built once per fetch and kept
+with the dataset, so date pickers and other point-in-time widgets don't recompute .dt.date over the whole column
+on every rerun.
+"""
+
+import numpy as np
+import pandas as pd
+
+class TimeIndex:
+    def __init__(self, dates):
+        dates = pd.DatetimeIndex(dates)
+        # Row positions in date order (the API returns dates in order, so this is almost always the identity)
+        self._rows = np.argsort(dates.asi8, kind='stable')
+        self.dates = dates[self._rows]
+        days = self.dates.normalize()
+        first_of_day = np.flatnonzero(np.r_[True, days[1:] != days[:-1]])
+        self._day_rows = dict(zip(days[first_of_day].date, self._rows[first_of_day].tolist()))
+
+    def __len__(self):
+        return len(self.dates)
+
+    @property
+    def first(self):
+        return self.dates[0]
+
+    @property
+    def last(self):
+        return self.dates[-1]
+
+    @property
+    def first_day(self):
+        return self.first.date()
+
+    @property
+    def last_day(self):
+        return self.last.date()
+
+    def row_at(self, timestamp):
+        # Row of the exact date/time (None if there isn't one)
+        timestamp = pd.Timestamp(timestamp)
+        position = self.dates.searchsorted(timestamp)
+        if position < len(self.dates) and self.dates[position] == timestamp:
+            return int(self._rows[position])
+        return None
+
+    def row_on(self, day):
+        # First row of a calendar day (None if the day isn't in the data)
+        return self._day_rows.get(day)
@@ -1,16 +1,34 @@
+import os
 import openmeteo_requests
+import numpy as np
+import fetch_pool
+from metrics import metrics
 import pandas as pd
-import requests_cache
+import requests
 from retry_requests import retry
 
-# Setup a session with caching and retry on error to improve speed of grabbing data
-cache_session = requests_cache.CachedSession('.cache', expire_after=3600)
-retry_session = retry(cache_session, retries=5, backoff_factor=0.2)
+# Setup a session with retry on error to improve reliability of grabbing data
+# Caching is done per weather model grid cell by forecast_cache rather than per request URL
+retry_session = retry(requests.Session(), retries=5, backoff_factor=0.2)
+
+def count_retries(response, *args, **kwargs):
+    # urllib3 keeps the history of the retries it made on the final response
+    history = getattr(getattr(response.raw, "retries", None), "history", ())
+    metrics.increment("open_meteo.retries", len(history))
+    if not response.ok:
+        metrics.increment(f"open_meteo.status_{response.status_code}")
+
+retry_session.hooks["response"].append(count_retries)
 openmeteo = openmeteo_requests.Client(session=retry_session)
 
+# Can be pointed elsewhere (e.g. the benchmarks' replay server) with the OPEN_METEO_URL environment variable
+URL = os.environ.get("OPEN_METEO_URL", "https://api.open-meteo.com/v1/forecast")
+# Maximum number of locations sent in one multi-location request (keeps the URL a sensible length)
+BATCH_SIZE = 50
+
 # Configures the parameters sent to API according to what is chosen in dashboard
-def set_config(call_API=False, **kwargs):
-    url = "https://api.open-meteo.com/v1/forecast"
+def build_params(**kwargs):
+    # Latitude/longitude can either be single values or lists for a multi-location request
     params = {
         "latitude": kwargs['latitude'],
         "longitude": kwargs['longitude'],
@@ -28,12 +46,40 @@ def set_config(call_API=False, **kwargs):
         params['end_hour'] = kwargs['datetime_end']
     else:
         params['current'] = kwargs['current']
-    
+
+    return params
+
+def set_config(call_API=False, **kwargs):
+    params = build_params(**kwargs)
+
     if call_API:
         # Get first location from API call
-        response = (openmeteo.weather_api(url, params=params))[0]
+        with metrics.span("open_meteo.request", locations=1):
+            response = (openmeteo.weather_api(URL, params=params))[0]
         return response
 
+# Same as set_config but for many locations at once
+# 'locations' is a list of (latitude, longitude) pairs and one response is returned per location, in the same order
+def set_batch_config(locations, call_API=False, batch_size=BATCH_SIZE, **kwargs):
+    batches = [locations[pos:pos+batch_size] for pos in range(0, len(locations), batch_size)]
+    batch_params = [build_params(latitude=[lat for lat, _ in batch], longitude=[long for _, long in batch], **kwargs)
+                    for batch in batches]
+
+    if call_API:
+        # Batches are requested concurrently on the fetch pool, then flattened back into location order
+        responses = []
+        with metrics.span("open_meteo.batch_request", locations=len(locations)):
+            for batch_responses in fetch_pool.map_ordered(lambda params: openmeteo.weather_api(URL, params=params), batch_params):
+                responses.extend(batch_responses)
+        return responses
+
+# One multi-location request sent on the calling thread, for callers that already run on the fetch pool
+# (set_batch_config would wait on the same pool from inside it)
+def get_batch(locations, **kwargs):
+    params = build_params(latitude=[lat for lat, _ in locations], longitude=[long for _, long in locations], **kwargs)
+    with metrics.span("open_meteo.batch_request", locations=len(locations)):
+        return openmeteo.weather_api(URL, params=params)
+
 # Process current data into DataFrame for graphs in dashboard
 def get_current_data(response, choices):
     current = response.Current()
@@ -46,44 +92,45 @@ def get_current_data(response, choices):
     
     return pd.DataFrame(data, index=[0])
 
+# Creates a Pandas DatetimeIndex for timed data, shared by every variable of the response
+def get_time_index(variables, response):
+    return pd.date_range(
+        start=pd.to_datetime(variables.Time() + response.UtcOffsetSeconds(), unit="s", utc=True),
+        end=pd.to_datetime(variables.TimeEnd() + response.UtcOffsetSeconds(), unit="s", utc=True),
+        freq=pd.Timedelta(seconds=variables.Interval()),
+        inclusive="left"
+    )
+
+# Builds the DataFrame from one float32 2D block instead of a dictionary of separately allocated columns
+# ValuesAsNumpy() is a view straight onto the FlatBuffers response, so each variable is copied once into the block
+# Values are kept unrounded - rounding is left to the graphs/metrics when they're displayed
+def build_dataframe(time_index, columns, values):
+    block = np.empty((len(columns), len(time_index)), dtype=np.float32)
+    for pos, variable_values in enumerate(values):
+        block[pos] = variable_values
+    
+    # The transpose is a view, which pandas stores as a single block without copying it again
+    dataframe = pd.DataFrame(block.T, columns=columns, copy=False)
+    dataframe.insert(0, "Date", time_index)
+    return dataframe
+
 # Process hourly data into DataFrame for graphs in dashboard
 def get_hourly_data(response, choices):
     hourly = response.Hourly()
-    
-    # Creates a Pandas DatetimeIndex for timed data
-    data = {"Date": pd.date_range(
-        start=pd.to_datetime(hourly.Time() + response.UtcOffsetSeconds(), unit="s", utc=True),
-        end=pd.to_datetime(hourly.TimeEnd() + response.UtcOffsetSeconds(), unit="s", utc=True),
-        freq=pd.Timedelta(seconds=hourly.Interval()),
-        inclusive="left"
-    )}
-    
-    for pos, data_name in enumerate(choices):
-        data[data_name] = hourly.Variables(pos).ValuesAsNumpy().round(2)
-    
-    return pd.DataFrame(data)
+    values = (hourly.Variables(pos).ValuesAsNumpy() for pos in range(len(choices)))
+    return build_dataframe(get_time_index(hourly, response), list(choices), values)
 
 # Process daily data into DataFrame for graphs in dashboard
 def get_daily_data(response, choices):
     daily = response.Daily()
     
-    data = {"Date": pd.date_range(
-        start=pd.to_datetime(daily.Time() + response.UtcOffsetSeconds(), unit="s", utc=True),
-        end=pd.to_datetime(daily.TimeEnd() + response.UtcOffsetSeconds(), unit="s", utc=True),
-        freq=pd.Timedelta(seconds=daily.Interval()),
-        inclusive="left"
-    )}
-    
-    # To account for the list nature of Precipitation Sum, I account for their pos and adjust the pos if it occurs in the choices list
-    pos = 0
+    # To account for the list nature of Precipitation Sum, it is expanded into its 3 columns (and 3 response variables)
+    columns = []
     for data_name in choices:
         if data_name == "Precipitation Sum":
-            data['Rain Sum'] = daily.Variables(pos).ValuesAsNumpy().round(2)
-            data['Showers Sum'] = daily.Variables(pos+1).ValuesAsNumpy().round(2)
-            data['Snowfall Sum'] = daily.Variables(pos+2).ValuesAsNumpy().round(2)
-            pos += 3
+            columns.extend(['Rain Sum', 'Showers Sum', 'Snowfall Sum'])
         else:
-            data[data_name] = daily.Variables(pos).ValuesAsNumpy().round(2)
-            pos += 1
+            columns.append(data_name)
     
-    return pd.DataFrame(data)
\ No newline at end of file
+    values = (daily.Variables(pos).ValuesAsNumpy() for pos in range(len(columns)))
+    return build_dataframe(get_time_index(daily, response), columns, values)